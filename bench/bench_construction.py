@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+'''micro-benchmark of ExchangeRateParse construction cost
+
+Compares parsing ISO 4217 xml (done on every construction before currency
+index was introduced) with construction using process-wide currency index.
+
+usage: python bench/bench_construction.py [number]
+'''
+
+import sys
+import timeit
+from importlib.resources import files
+
+from exchrate import config
+from exchrate.exrateparse import ExchangeRateParse
+
+params = ('NBU-json', ('2016-12-01', '2016-12-31'), 'USD', 'UAH')
+
+
+def old_construction():
+    '''previous construction cost: sources config and xml parsed every time'''
+    config.ExchangeRateSource().get_source_config(params[0])
+    s = files('exchrate').joinpath('data').joinpath('iso_4217.xml').read_text()
+    config._parse_ccy_xml(s)
+
+
+def bench(name, stmt, number, setup='pass'):
+    '''prints per call time of stmt'''
+    total = min(timeit.repeat(stmt, setup, number=number, repeat=5))
+    print('{:<32} {:>12.2f} us/call'.format(name, total / number * 1e6))
+    return total
+
+
+def main(number=1000):
+    bench(
+        'first get_ccy_index() (json)',
+        config.get_ccy_index,
+        1,
+        config.get_ccy_index.cache_clear,
+    )
+    old = bench('xml parse + sources config', old_construction, number // 10 or 1)
+    new = bench('ExchangeRateParse(...)', lambda: ExchangeRateParse(*params), number)
+    print('speedup: {:.0f}x'.format(old / (number // 10 or 1) / (new / number)))
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:2]))
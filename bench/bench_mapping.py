@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+'''throughput benchmark of response mapping
+
+Maps sample NBU (all currencies) and Fixer payloads from bench/data with
+previous object_hook based mapping and with mappers module (standard json
+and orjson if it is installed). Prints rows mapped per second.
+
+usage: python bench/bench_mapping.py [number]
+'''
+
+import json
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+from exchrate import config, mappers
+
+DATA = Path(__file__).parent / 'data'
+CCY_CODES = config.get_ccy_index().num_codes
+
+
+def legacy_nbu(payload, source_id, ccy_codes):
+    '''previous NBU mapping: object_hook with strptime for every object'''
+
+    def json_object_hook(r):
+        return mappers.Exrate(
+            source_id,
+            datetime.strptime(r['exchangedate'], '%d.%m.%Y').date().isoformat(),
+            980,
+            r['r030'],
+            r['rate'],
+        )
+
+    return [exrate for exrate in json.loads(payload, object_hook=json_object_hook)]
+
+
+def legacy_fixer(payload, source_id, ccy_codes):
+    '''previous Fixer mapping (with items() instead of Python 2 iteritems())'''
+
+    def json_object_hook(r):
+        rates = r.get('rates', None)
+        if rates is not None:
+            return [
+                mappers.Exrate(
+                    source_id,
+                    datetime.strptime(r['date'], '%Y-%m-%d').date().isoformat(),
+                    ccy_codes[cur],
+                    ccy_codes[r['base']],
+                    rate,
+                )
+                for cur, rate in rates.items()
+            ]
+        return r
+
+    return json.loads(payload, object_hook=json_object_hook)
+
+
+def bench(name, mapper, payload, number):
+    '''prints rows per second mapped by mapper'''
+    rows = len(mapper(payload, 1, CCY_CODES))
+    total = min(
+        timeit.repeat(lambda: mapper(payload, 1, CCY_CODES), number=number, repeat=5)
+    )
+    print('{:<28} {:>12,.0f} rows/s'.format(name, rows * number / total))
+
+
+def main(number=2000):
+    decoders = [('json', json.loads)]
+    if mappers.orjson is not None:
+        decoders.append(('orjson', mappers.orjson.loads))
+
+    for source, payload_file, legacy, mapper in (
+        ('nbu', 'nbu_all_20161201.json', legacy_nbu, mappers.map_nbu_gov_ua),
+        ('fixer', 'fixer_20161201.json', legacy_fixer, mappers.map_ecb_fixer),
+    ):
+        payload = (DATA / payload_file).read_text()
+        bench('{} legacy object_hook'.format(source), legacy, payload, number)
+        for decoder_name, decoder in decoders:
+            mappers.loads = decoder
+            bench(
+                '{} mappers ({})'.format(source, decoder_name), mapper, payload, number
+            )
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,143 @@
+'''offline stand-in for NBU and Fixer exchange rate endpoints
+
+FakeUpstream generates synthetic responses in format of NBU and Fixer APIs
+for any date and currency, with configurable latency, jitter and error rate.
+It is used through httpx.MockTransport, so no network or server is needed:
+
+    upstream = FakeUpstream(latency=0.02, jitter=0.01, error_rate=0.01)
+    client = RateClient(transport=upstream.transport())
+'''
+
+import asyncio
+import json
+import random
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from exchrate import config
+
+# currencies included into generated responses
+CURRENCIES = ('USD', 'EUR', 'GBP', 'PLN', 'CHF', 'JPY', 'CNY', 'CAD', 'SEK', 'NOK')
+
+
+def synthetic_rate(exdate, code):
+    '''returns deterministic pseudo rate for date and currency'''
+    return round(1 + zlib.crc32('{}{}'.format(exdate, code).encode()) % 40000 / 1000, 4)
+
+
+class FakeUpstream:
+    '''Synthetic NBU and Fixer endpoints
+
+    Constructor
+    FakeUpstream(latency, jitter, error_rate, error_status, seed)
+
+    latency -- mean response latency in seconds
+    jitter -- maximum random deviation from latency in seconds
+    error_rate -- share of requests answered with error_status
+    error_status -- HTTP status of failed requests (e.g. 429 or 503)
+    seed -- seed of random generator
+
+    Per request latencies are collected in `latencies` attribute
+    '''
+
+    def __init__(
+        self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, seed=1
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.num_codes = config.get_ccy_index().num_codes
+        self.latencies = []
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def transport(self):
+        '''returns httpx.MockTransport answering with this upstream'''
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request):
+        '''answers httpx request like NBU or Fixer WS'''
+        started = time.perf_counter()
+        self.requests += 1
+        delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        if delay:
+            await asyncio.sleep(delay)
+        if self.random.random() < self.error_rate:
+            response = httpx.Response(self.error_status, text='error')
+        else:
+            url = urlsplit(str(request.url))
+            query = parse_qs(url.query)
+            if url.netloc == 'bank.gov.ua':
+                body = self.nbu_body(query)
+            else:
+                body = self.fixer_body(url.path, query)
+            self.bytes_sent += len(body)
+            response = httpx.Response(200, text=body)
+        self.latencies.append(time.perf_counter() - started)
+        return response
+
+    def nbu_body(self, query):
+        '''returns NBU JSON for date (or start and end of period) and
+        optional valcode
+        '''
+        if 'start' in query:
+            start, end = (
+                datetime.strptime(query[k][0], '%Y%m%d').date()
+                for k in ('start', 'end')
+            )
+            dates = [start + timedelta(i) for i in range((end - start).days + 1)]
+        else:
+            dates = [datetime.strptime(query['date'][0], '%Y%m%d').date()]
+        valcode = query.get('valcode', [None])[0]
+        return json.dumps(
+            [
+                {
+                    'r030': self.num_codes[cc],
+                    'txt': cc,
+                    'rate': synthetic_rate(exdate, cc),
+                    'cc': cc,
+                    'exchangedate': exdate.strftime('%d.%m.%Y'),
+                }
+                for exdate in dates
+                for cc in CURRENCIES
+                if valcode in (None, cc)
+            ]
+        )
+
+    def fixer_body(self, path, query):
+        '''returns Fixer JSON for date in path (or timeseries of start_date
+        to end_date) and base/symbols
+        '''
+        base = query.get('base', ['EUR'])[0]
+        symbols = query.get('symbols', [','.join(CURRENCIES)])[0].split(',')
+        if path.strip('/') == 'timeseries':
+            start, end = (
+                date.fromisoformat(query[k][0]) for k in ('start_date', 'end_date')
+            )
+            dates = [
+                (start + timedelta(i)).isoformat()
+                for i in range((end - start).days + 1)
+            ]
+            return json.dumps(
+                {
+                    'base': base,
+                    'rates': {
+                        d: {cc: synthetic_rate(d, base + cc) for cc in symbols}
+                        for d in dates
+                    },
+                }
+            )
+        exdate = path.strip('/')
+        return json.dumps(
+            {
+                'base': base,
+                'date': exdate,
+                'rates': {cc: synthetic_rate(exdate, base + cc) for cc in symbols},
+            }
+        )
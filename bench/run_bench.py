@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+'''offline end-to-end benchmark of ExchangeRateParse.get_exch_rate()
+
+Runs get_exch_rate() for date ranges from one day to 20 years against
+FakeUpstream (see fakeapi.py) and measures:
+    requests/s, p50/p99 upstream latency, mapped rows/s, peak memory and
+    end-to-end time
+
+Results are printed and can be saved to JSON file and compared with
+previous run:
+    python bench/run_bench.py --latency 0.005 --output new.json --compare old.json
+'''
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from fakeapi import FakeUpstream
+
+from exchrate.client import RateClient
+from exchrate.exrateparse import ExchangeRateParse
+
+# scenario name: number of days
+RANGES = {'1d': 1, '1m': 30, '1y': 365, '5y': 5 * 365, '20y': 20 * 365}
+
+
+class TimedParse(ExchangeRateParse):
+    '''parser collecting time spent in mapping responses'''
+
+    map_time = 0.0
+
+    def _map_response(self, response, mapper=None):
+        started = time.perf_counter()
+        try:
+            return super()._map_response(response, mapper)
+        finally:
+            self.map_time += time.perf_counter() - started
+
+
+def percentile(values, pct):
+    '''returns percentile of values (nearest rank)'''
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1)]
+
+
+def run_scenario(source, days, upstream_args):
+    '''runs single get_exch_rate() call and returns dict of metrics'''
+    upstream = FakeUpstream(**upstream_args)
+    client = RateClient(transport=upstream.transport())
+    end = date(2016, 12, 31)
+    dates = ((end - timedelta(days - 1)).isoformat(), end.isoformat())
+    e = TimedParse(source, dates, 'USD', 'UAH', cache=False, client=client)
+    if source == 'ECB-Fixer':
+        e.basecur, e.localcur = 'EUR', 'USD'
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = e.get_exch_rate()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    client.close()
+
+    return {
+        'source': source,
+        'days': days,
+        'requests': upstream.requests,
+        'rows': len(rows),
+        'bytes': upstream.bytes_sent,
+        'elapsed_s': elapsed,
+        'requests_per_s': upstream.requests / elapsed,
+        'latency_p50_ms': percentile(upstream.latencies, 50) * 1000,
+        'latency_p99_ms': percentile(upstream.latencies, 99) * 1000,
+        'map_rows_per_s': len(rows) / e.map_time if e.map_time else 0.0,
+        'peak_memory_kb': peak / 1024,
+    }
+
+
+def compare(results, baseline):
+    '''prints relative change of elapsed time against baseline results'''
+    old = {(r['source'], r['days']): r for r in baseline['results']}
+    print('\ncomparison with baseline (elapsed, rows/s mapping):')
+    for r in results:
+        b = old.get((r['source'], r['days']))
+        if b is None:
+            continue
+        print(
+            '{:<10} {:>6}d  elapsed {:+7.1%}  map {:+7.1%}'.format(
+                r['source'],
+                r['days'],
+                r['elapsed_s'] / b['elapsed_s'] - 1,
+                (r['map_rows_per_s'] / b['map_rows_per_s'] - 1)
+                if b['map_rows_per_s']
+                else 0.0,
+            )
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sources', default='NBU-json,ECB-Fixer')
+    parser.add_argument('--ranges', default=','.join(RANGES))
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--output', help='path to save results as JSON')
+    parser.add_argument('--compare', help='path to JSON results of previous run')
+    args = parser.parse_args(argv)
+
+    upstream_args = {
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'error_rate': args.error_rate,
+        'error_status': args.error_status,
+    }
+    results = []
+    header = '{:<10} {:>6} {:>8} {:>9} {:>10} {:>8} {:>8} {:>11} {:>9}'
+    print(
+        header.format(
+            'source',
+            'days',
+            'requests',
+            'elapsed',
+            'req/s',
+            'p50ms',
+            'p99ms',
+            'map rows/s',
+            'peak KB',
+        )
+    )
+    for source in args.sources.split(','):
+        for name in args.ranges.split(','):
+            r = run_scenario(source, RANGES[name], upstream_args)
+            results.append(r)
+            print(
+                '{source:<10} {days:>6} {requests:>8} {elapsed_s:>9.3f} '
+                '{requests_per_s:>10.0f} {latency_p50_ms:>8.2f} '
+                '{latency_p99_ms:>8.2f} {map_rows_per_s:>11.0f} '
+                '{peak_memory_kb:>9.0f}'.format(**r)
+            )
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'upstream': upstream_args,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return report
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
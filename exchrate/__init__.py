@@ -1,2 +1,16 @@
-# import ExchangeRateParse class for using directly from package
-from .exrateparse import ExchangeRateParse as ExchangeRateParse
+# ExchangeRateParse class for using directly from package. It is imported on
+# first access, so importing package (e.g. for config or rate stores) does not
+# import exrateparse and its dependencies
+__all__ = ['ExchangeRateParse']
+
+
+def __getattr__(name):
+    if name == 'ExchangeRateParse':
+        from .exrateparse import ExchangeRateParse
+
+        return ExchangeRateParse
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
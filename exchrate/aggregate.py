@@ -0,0 +1,339 @@
+'''
+Module has precomputed aggregates over exchange rate series.
+
+RateAggregates keeps single series (source, base currency, local currency)
+of rates sorted by date together with:
+    - prefix sums of rates, so sum (and average) of rows is difference of
+    two prefix sums
+    - sparse tables of minimums and maximums (level k keeps extremum of 2**k
+    consecutive rows), so extremum of any rows is taken from two
+    overlapping blocks
+    - calendar index: number of rows before every day and prefix sums of
+    rate in force on every day, so dates are translated to rows without
+    search and time weighted averages are answered directly
+Count, average, minimum, maximum and time weighted average of any date
+window are answered in O(1):
+    agg = RateAggregates(e.get_exch_rate())
+    agg.aggregate('2016-01-01', '2016-03-31')
+    list(agg.periods('quarter'))
+
+Build takes O(n log n) for sparse tables and O(days) for calendar index.
+New rows after last date are appended in O(log n) each, rows for earlier
+dates rebuild aggregates from first changed row on. Prefix sums are kept in
+float64, so averages of up to millions of rates lose no more than about
+1e-12 relative to exact average.
+
+AggregateStore wraps rate store, so rows received by ExchangeRateParse
+(fetched from source or read from store) are added to aggregates of their
+series as they arrive:
+    store = AggregateStore(SQLiteRateStore('rates.db'))
+    e = ExchangeRateParse('NBU-json', dates, 'USD', 'UAH', store=store)
+    e.get_exch_rate()
+    store.aggregates(1, 840, 980).average('2016-12-01', '2016-12-31')
+'''
+
+import threading
+from array import array
+from collections import namedtuple
+from datetime import date
+
+from .rateseries import RateSeries, _to_ordinal
+
+# aggregates of date window, all values except count are None for empty
+# window:
+#   count -- number of rates published
+#   average -- mean of rates published
+#   minimum, maximum -- extremes of rates published
+#   time_average -- mean of rates in force on every day of window (rate
+#       published last is in force on days without publication)
+Aggregate = namedtuple('Aggregate', 'count,average,minimum,maximum,time_average')
+
+# months starting periods of frequency
+PERIOD_MONTHS = {'month': 1, 'quarter': 3, 'year': 12}
+
+
+class RateAggregates:
+    '''Aggregates of exchange rate series answered in O(1)
+
+    Constructor
+    RateAggregates(rates)
+
+    rates -- rateseries.RateSeries or iterable of rows with fields of
+        ExchangeRateParse.EXRATE_TEMPLATE of single series (same sourceid,
+        basecur and localcur)
+
+    Series is extended with update(rows). For getting aggregates of date
+    window (dates are inclusive, whole series if omitted) use methods:
+        count(), average(), minimum(), maximum(), time_average(),
+        aggregate(), periods(freq)
+    '''
+
+    def __init__(self, rates=()):
+        # (sourceid, basecur, localcur) of series
+        self.key = None
+        self._reset()
+        self.update(rates)
+
+    def _reset(self):
+        self.ordinals = array('i')
+        self.rates = array('d')
+        self._sum = array('d', [0.0])
+        # sparse tables, level 0 are rates themselves
+        self._mins = [self.rates]
+        self._maxs = [self.rates]
+        # calendar index from first date: _before[k] is number of rows before
+        # day first + k, _day_sum[k] is sum of rates in force on days before it
+        self.first = None
+        self._before = array('i')
+        self._day_sum = array('d')
+
+    def __len__(self):
+        return len(self.rates)
+
+    def update(self, rows):
+        '''adds rows to series, rates of known dates are replaced
+        Returns: number of rows added or changed
+
+        Positional arguments:
+            rows -- rateseries.RateSeries or iterable of rows of same series
+        '''
+        new = {}
+        for key, ordinal, rate in _iter_rows(rows):
+            if self.key is None:
+                self.key = key
+            elif key != self.key:
+                raise ValueError(
+                    'Rows of several series: {} and {}'.format(self.key, key)
+                )
+            if self._rate_of(ordinal) != rate:
+                new[ordinal] = rate
+        if not new:
+            return 0
+
+        start = self._position(min(new))
+        tail = dict(zip(self.ordinals[start:], self.rates[start:], strict=True))
+        tail.update(new)
+        self._truncate(start)
+        for ordinal in sorted(tail):
+            self._append(ordinal, tail[ordinal])
+        return len(new)
+
+    def _rate_of(self, ordinal):
+        '''returns rate of date ordinal or None if it is missing'''
+        i = self._position(ordinal)
+        if i < len(self.ordinals) and self.ordinals[i] == ordinal:
+            return self.rates[i]
+        return None
+
+    def _position(self, ordinal):
+        '''returns number of rows before date ordinal'''
+        if self.first is None or ordinal <= self.first:
+            return 0
+        if ordinal - self.first >= len(self._before):
+            return len(self.rates)
+        return self._before[ordinal - self.first]
+
+    def _truncate(self, n):
+        '''drops rows from position n on together with their aggregates'''
+        if n == 0:
+            self._reset()
+            return
+        del self.ordinals[n:]
+        del self.rates[n:]
+        del self._sum[n + 1 :]
+        for tables in (self._mins, self._maxs):
+            for k in range(len(tables) - 1, 0, -1):
+                del tables[k][max(0, n - (1 << k) + 1) :]
+                if not tables[k]:
+                    tables.pop()
+        days = self.ordinals[-1] - self.first + 2
+        del self._before[days:]
+        del self._day_sum[days:]
+
+    def _append(self, ordinal, rate):
+        '''adds row after last one, O(log n) plus days since last row'''
+        n = len(self.rates)
+        if n == 0:
+            self.first = ordinal
+            self._before.extend((0, 1))
+            self._day_sum.extend((0.0, rate))
+        else:
+            last_rate = self.rates[-1]
+            for _ in range(ordinal - self.ordinals[-1] - 1):
+                self._before.append(n)
+                self._day_sum.append(self._day_sum[-1] + last_rate)
+            self._before.append(n + 1)
+            self._day_sum.append(self._day_sum[-1] + rate)
+
+        self.ordinals.append(ordinal)
+        self.rates.append(rate)
+        self._sum.append(self._sum[-1] + rate)
+        n += 1
+        # new block of every level ends at new row
+        k = 1
+        while 1 << k <= n:
+            i, half = n - (1 << k), 1 << (k - 1)
+            for tables, pick in ((self._mins, min), (self._maxs, max)):
+                if k == len(tables):
+                    tables.append(array('d'))
+                tables[k].append(pick(tables[k - 1][i], tables[k - 1][i + half]))
+            k += 1
+
+    def _rows(self, date_from, date_to):
+        '''returns (start, stop) positions of rows of date window'''
+        start = 0 if date_from is None else self._position(_to_ordinal(date_from))
+        if date_to is None:
+            return start, len(self.rates)
+        return start, self._position(_to_ordinal(date_to) + 1)
+
+    def _extremum(self, tables, pick, date_from, date_to):
+        start, stop = self._rows(date_from, date_to)
+        if start >= stop:
+            return None
+        k = (stop - start).bit_length() - 1
+        return pick(tables[k][start], tables[k][stop - (1 << k)])
+
+    def count(self, date_from=None, date_to=None):
+        '''returns number of rates published in date window'''
+        start, stop = self._rows(date_from, date_to)
+        return max(0, stop - start)
+
+    def average(self, date_from=None, date_to=None):
+        '''returns mean of rates published in date window or None'''
+        start, stop = self._rows(date_from, date_to)
+        if start >= stop:
+            return None
+        return (self._sum[stop] - self._sum[start]) / (stop - start)
+
+    def minimum(self, date_from=None, date_to=None):
+        '''returns minimum of rates published in date window or None'''
+        return self._extremum(self._mins, min, date_from, date_to)
+
+    def maximum(self, date_from=None, date_to=None):
+        '''returns maximum of rates published in date window or None'''
+        return self._extremum(self._maxs, max, date_from, date_to)
+
+    def time_average(self, date_from=None, date_to=None):
+        '''returns mean of rates in force on every day of date window (rate
+        published last is in force on following days without publication).
+        Days before first and after last date of series are not counted
+        '''
+        if self.first is None:
+            return None
+        last = self.ordinals[-1]
+        start = self.first if date_from is None else _to_ordinal(date_from)
+        stop = last if date_to is None else _to_ordinal(date_to)
+        start, stop = max(start, self.first), min(stop, last)
+        if start > stop:
+            return None
+        days = self._day_sum
+        return (days[stop - self.first + 1] - days[start - self.first]) / (
+            stop - start + 1
+        )
+
+    def aggregate(self, date_from=None, date_to=None):
+        '''returns Aggregate namedtuple of date window'''
+        return Aggregate(
+            self.count(date_from, date_to),
+            self.average(date_from, date_to),
+            self.minimum(date_from, date_to),
+            self.maximum(date_from, date_to),
+            self.time_average(date_from, date_to),
+        )
+
+    def periods(self, freq='month'):
+        '''yields (first date, last date, Aggregate) of every calendar period
+        of series
+
+        Keyword arguments:
+            freq -- 'month', 'quarter' or 'year'
+        '''
+        months = PERIOD_MONTHS[freq]
+        if self.first is None:
+            return
+        start = date.fromordinal(self.first)
+        start = date(start.year, start.month - (start.month - 1) % months, 1)
+        last = self.ordinals[-1]
+        while start.toordinal() <= last:
+            month = start.month - 1 + months
+            end = date(start.year + month // 12, month % 12 + 1, 1)
+            yield (
+                start.isoformat(),
+                date.fromordinal(end.toordinal() - 1).isoformat(),
+                self.aggregate(start.toordinal(), end.toordinal() - 1),
+            )
+            start = end
+
+
+class AggregateStore:
+    '''Rate store wrapper keeping aggregates of every series received
+
+    Constructor
+    AggregateStore(store)
+
+    store -- wrapped rate store (e.g. ratestore.SQLiteRateStore). If None
+        then nothing is stored, rows are only aggregated
+
+    Has same lookup methods as rate stores, rows passing through them are
+    added to aggregates of their series:
+        get_many(sourceid, basecur, localcur, exdates)
+        put_many(sourceid, basecur, localcur, rows_by_date)
+
+    For getting aggregates of series use method:
+        aggregates(sourceid, basecur, localcur)
+    '''
+
+    def __init__(self, store=None):
+        self.store = store
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def get_many(self, sourceid, basecur, localcur, exdates):
+        '''returns dict with exdate: list of row tuples found in store'''
+        if self.store is None:
+            return {}
+        result = self.store.get_many(sourceid, basecur, localcur, exdates)
+        self._add(result)
+        return result
+
+    def put_many(self, sourceid, basecur, localcur, rows_by_date):
+        '''saves rows received for requested dates and aggregates them'''
+        if self.store is not None:
+            self.store.put_many(sourceid, basecur, localcur, rows_by_date)
+        self._add(rows_by_date)
+
+    def aggregates(self, sourceid, basecur, localcur):
+        '''returns RateAggregates of series (rate of 1 basecur in localcur,
+        ISO 4217 numeric codes)
+        '''
+        with self._lock:
+            return self._series.setdefault(
+                (sourceid, basecur, localcur), RateAggregates()
+            )
+
+    def _add(self, rows_by_date):
+        '''adds rows to aggregates of their series'''
+        by_series = {}
+        for rows in rows_by_date.values():
+            for row in rows:
+                by_series.setdefault((row[0], row[3], row[2]), []).append(row)
+        with self._lock:
+            for key, rows in by_series.items():
+                self._series.setdefault(key, RateAggregates()).update(rows)
+
+
+def _iter_rows(rows):
+    '''yields ((sourceid, basecur, localcur), date ordinal, rate) of rows'''
+    if isinstance(rows, RateSeries):
+        for sourceid, ordinal, localcur, basecur, rate in zip(
+            rows.sourceid,
+            rows.exdate,
+            rows.localcur,
+            rows.basecur,
+            rows.exrate,
+            strict=True,
+        ):
+            yield (sourceid, basecur, localcur), ordinal, rate
+        return
+    for sourceid, exdate, localcur, basecur, rate in rows:
+        yield (sourceid, basecur, localcur), _to_ordinal(exdate), rate
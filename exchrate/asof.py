@@ -0,0 +1,232 @@
+'''
+Module has as-of index of exchange rate series.
+
+Sources do not publish new rates on non-working days. AsOfIndex keeps
+published rates of single (source, localcur, basecur) series in sorted typed
+arrays and answers "as-of" lookup (latest rate on or before date) by binary
+search. Index also knows which dates have no publication of their own:
+    - rest weekdays of source (config 'rest_weekdays')
+    - dates before today which were requested and returned no rate
+    (holidays). Today and future dates can still be published, so they are
+    never remembered as dates without publication
+Date is covered by as-of value if every date after latest published date up
+to it has no publication. ExchangeRateParse(asof=True) does not request
+covered dates (see plan()) and answers them with as-of rate.
+
+Sparse series can be expanded to dense daily RateSeries in memory:
+    index = AsOfIndex(1, 980, 840, rest_weekdays={5, 6})
+    index.add(e.get_exch_rate())
+    daily = index.densify('2016-12-01', '2016-12-31')
+'''
+
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+
+from .mappers import Exrate
+from .rateseries import RateSeries, _to_ordinal
+
+
+class AsOfIndex:
+    '''Sorted index of published rates of single series with as-of lookup
+
+    Constructor
+    AsOfIndex(sourceid, localcur, basecur, rest_weekdays)
+
+    sourceid -- internal id of exchange rate source
+    localcur, basecur -- ISO 4217 numeric currency codes of series
+    rest_weekdays -- weekdays (date.weekday()) source does not publish on
+
+    Dates are ISO date strings, datetime.date or date ordinals.
+
+    For adding received rows use method:
+        add(rows, checked)
+
+    For getting latest rate on or before date use methods:
+        asof(exdate), get_rate(exdate), get_row(exdate)
+
+    For planning requests use methods:
+        covers(exdate), plan(dates)
+
+    For expanding index to daily series use method:
+        densify(date_from, date_to)
+
+    Index is thread-safe: updates and lookups are serialized by lock.
+    '''
+
+    def __init__(self, sourceid, localcur, basecur, rest_weekdays=()):
+        self.sourceid = sourceid
+        self.localcur = localcur
+        self.basecur = basecur
+        self.rest_weekdays = frozenset(rest_weekdays)
+        # ordinals of published dates and their rates
+        self.exdate = array('i')
+        self.exrate = array('d')
+        # ordinals of checked dates without publication
+        self.empty = array('i')
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.exdate)
+
+    def add(self, rows, checked=()):
+        '''adds rows of series (other series rows are skipped)
+
+        Positional arguments:
+            rows -- rows with fields of EXRATE_TEMPLATE or RateSeries
+
+        Keyword arguments:
+            checked -- dates requested from source. Ones before today
+                without row of series are remembered as dates without
+                publication
+        '''
+        new = {
+            _to_ordinal(r.exdate): r.exrate
+            for r in rows
+            if r.localcur == self.localcur and r.basecur == self.basecur
+        }
+        checked = [_to_ordinal(d) for d in checked]
+        with self._lock:
+            self._add(new, checked)
+
+    def _add(self, new, checked):
+        '''merges new rates {ordinal: rate} and checked ordinals (lock held)'''
+        if new:
+            ordinals = sorted(new)
+            if not self.exdate or ordinals[0] > self.exdate[-1]:
+                # usual case: newer dates are appended
+                self.exdate.extend(ordinals)
+                self.exrate.extend(new[o] for o in ordinals)
+            else:
+                merged = dict(zip(self.exdate, self.exrate, strict=True))
+                merged.update(new)
+                ordinals = sorted(merged)
+                self.exdate = array('i', ordinals)
+                self.exrate = array('d', (merged[o] for o in ordinals))
+
+        today = date.today().toordinal()
+        for ordinal in checked:
+            if ordinal in new or ordinal >= today:
+                continue
+            i = bisect_left(self.empty, ordinal)
+            if i == len(self.empty) or self.empty[i] != ordinal:
+                insort(self.empty, ordinal)
+
+    def asof(self, exdate):
+        '''returns (date ordinal, rate) of latest publication on or before
+        date or None
+        '''
+        ordinal = _to_ordinal(exdate)
+        with self._lock:
+            return self._asof(ordinal)
+
+    def _asof(self, ordinal):
+        '''asof() of date ordinal (lock held)'''
+        i = bisect_right(self.exdate, ordinal) - 1
+        if i < 0:
+            return None
+        return self.exdate[i], self.exrate[i]
+
+    def get_rate(self, exdate):
+        '''returns latest rate on or before date or None'''
+        found = self.asof(exdate)
+        return None if found is None else found[1]
+
+    def get_row(self, exdate):
+        '''returns row with latest rate on or before date (and requested
+        date) or None
+        '''
+        rate = self.get_rate(exdate)
+        if rate is None:
+            return None
+        if not isinstance(exdate, str):
+            exdate = date.fromordinal(_to_ordinal(exdate)).isoformat()
+        return Exrate(self.sourceid, exdate, self.localcur, self.basecur, rate)
+
+    def covers(self, exdate):
+        '''returns True if rate of date is known to be as-of value: there is
+        publication on or before date and no publication can follow it
+        '''
+        ordinal = _to_ordinal(exdate)
+        with self._lock:
+            return self._covers(ordinal)
+
+    def _covers(self, ordinal):
+        '''covers() of date ordinal (lock held)'''
+        found = self._asof(ordinal)
+        if found is None:
+            return False
+        for day in range(found[0] + 1, ordinal + 1):
+            if date.fromordinal(day).weekday() in self.rest_weekdays:
+                continue
+            i = bisect_left(self.empty, day)
+            if i == len(self.empty) or self.empty[i] != day:
+                return False
+        return True
+
+    def plan(self, dates):
+        '''returns dates which have to be requested from source. Covered
+        dates are skipped as well as rest weekdays following date which is
+        requested (they get as-of value from its response)
+        '''
+        known = set()
+        requested = []
+        for exdate in sorted(dates, key=_to_ordinal):
+            ordinal = _to_ordinal(exdate)
+            if not self.covers(ordinal) and not (
+                ordinal - 1 in known
+                and date.fromordinal(ordinal).weekday() in self.rest_weekdays
+            ):
+                requested.append(exdate)
+            known.add(ordinal)
+        return requested
+
+    def densify(self, date_from, date_to):
+        '''returns RateSeries with row for every day from date_from to date_to
+        with as-of rate (days before first publication are skipped)
+        '''
+        start, end = _to_ordinal(date_from), _to_ordinal(date_to)
+        with self._lock:
+            return self._densify(start, end)
+
+    def _densify(self, start, end):
+        '''densify() of date ordinals (lock held)'''
+        i = bisect_right(self.exdate, start) - 1
+        if i < 0:
+            if not self.exdate:
+                return RateSeries()
+            i, start = 0, max(start, self.exdate[0])
+        ordinals = array('i', range(start, end + 1))
+        rates = array('d')
+        last = len(self.exdate) - 1
+        for day in ordinals:
+            while i < last and self.exdate[i + 1] <= day:
+                i += 1
+            rates.append(self.exrate[i])
+        n = len(ordinals)
+        return RateSeries(
+            array('H', [self.sourceid]) * n,
+            ordinals,
+            array('h', [self.localcur]) * n,
+            array('h', [self.basecur]) * n,
+            rates,
+        )
+
+
+# (sourceid, basecur, localcur): AsOfIndex shared within process
+_shared_indexes = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_index(sourceid, basecur, localcur, rest_weekdays=()):
+    '''returns AsOfIndex of series shared within process (created on first
+    call). Arguments are ordered as rate store key
+    '''
+    with _shared_lock:
+        index = _shared_indexes.get((sourceid, basecur, localcur))
+        if index is None:
+            index = _shared_indexes[sourceid, basecur, localcur] = AsOfIndex(
+                sourceid, localcur, basecur, rest_weekdays
+            )
+        return index
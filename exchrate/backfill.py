@@ -0,0 +1,294 @@
+'''
+Module has resumable bulk backfill of historical exchange rates.
+
+Backfill splits (source, currencies, date range) into chunks of chunk_days
+dates. If source supports all currency requests (config 'url_all') then all
+currencies share single request per date, otherwise every currency has its
+own chunks. After every chunk checkpoint file is updated, so interrupted run
+started again with same checkpoint resumes from chunks which are not done
+(and dates which failed).
+
+If source supports window requests (config 'url_range') then chunks of
+single currency are requested by windows of consecutive dates instead of
+one request per date.
+
+Fetching and mapping are overlapped: while responses of next chunks are
+requested, received chunks are mapped in process pool by functions of
+mappers module (config 'field_mapper' or 'range_mapper' without leading
+underscore), so mapping of large backfills scales across cores.
+
+    b = Backfill('NBU-json', ['USD', 'EUR'], '1999-01-01', '2019-12-31',
+                 checkpoint_path='backfill.json', store=SQLiteRateStore('r.db'))
+    b.run()
+'''
+
+import asyncio
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from . import config, mappers
+from .exrateparse import ExchangeRateParse, get_api_responses
+
+# progress of backfill passed to progress callback
+BackfillProgress = namedtuple(
+    'BackfillProgress', 'exratesrc,chunks_done,chunks_total,rows,elapsed,rows_per_s'
+)
+
+# chunk of backfill: basecur is None for all currency requests
+Chunk = namedtuple('Chunk', 'basecur,date_from,date_to')
+
+
+class Backfill:
+    '''Resumable chunked backfill of exchange rates
+
+    Constructor
+    Backfill(exratesrc, basecurs, date_from, date_to, localcur, chunk_days,
+        checkpoint_path, processes, prefetch, sink, store, progress, client)
+
+    exratesrc -- exchange rate source code
+    basecurs -- ISO 4217 literal codes of base currencies
+    date_from, date_to -- ISO dates of backfilled range (inclusive)
+    localcur -- ISO 4217 literal code of local currency
+    chunk_days -- number of dates in chunk
+    checkpoint_path -- optional path to JSON checkpoint file
+    processes -- number of mapping processes (os.cpu_count() if None, 0 for
+        mapping in current process)
+    prefetch -- number of fetched chunks waiting for mapping
+    sink -- optional callable sink(rows) receiving mapped rows of chunk
+    store -- optional rate store (e.g. ratestore.SQLiteRateStore)
+    progress -- optional callable progress(BackfillProgress) called after
+        every chunk
+    client -- client.RateClient used for requests
+
+    For running backfill use method run() or coroutine arun().
+    Both return BackfillProgress of finished run
+    '''
+
+    def __init__(
+        self,
+        exratesrc,
+        basecurs,
+        date_from,
+        date_to,
+        localcur='UAH',
+        chunk_days=31,
+        checkpoint_path=None,
+        processes=None,
+        prefetch=2,
+        sink=None,
+        store=None,
+        progress=None,
+        client=None,
+    ):
+        self.basecurs = list(dict.fromkeys(basecurs))
+        self.date_from = date_from
+        self.date_to = date_to
+        self.chunk_days = chunk_days
+        self.checkpoint_path = checkpoint_path
+        self.processes = processes
+        self.prefetch = prefetch
+        self.sink = sink
+        self.progress = progress
+        # parser is used for building urls and saving rows to store
+        self._parse = ExchangeRateParse(
+            exratesrc,
+            (date_from, date_to),
+            self.basecurs[0],
+            localcur,
+            store=store,
+            cache=False,
+            client=client,
+        )
+        self._source_config = self._parse._source_config
+        self._mapper = _get_mapper(self._source_config['field_mapper'])
+        self._range_mapper = _get_mapper(self._source_config.get('range_mapper'))
+        self.checkpoint = self._load_checkpoint()
+
+    @property
+    def exratesrc(self):
+        return self._parse.exratesrc
+
+    def chunks(self):
+        '''returns list of all chunks of backfill'''
+        shared = self._source_config.get('url_all') and len(self.basecurs) > 1
+        basecurs = [None] if shared else self.basecurs
+        start, end = (date.fromisoformat(d) for d in (self.date_from, self.date_to))
+        chunks = []
+        while start <= end:
+            chunk_end = min(end, start + timedelta(self.chunk_days - 1))
+            chunks.extend(
+                Chunk(cur, start.isoformat(), chunk_end.isoformat()) for cur in basecurs
+            )
+            start = chunk_end + timedelta(1)
+        return chunks
+
+    def run(self):
+        '''runs backfill synchronously'''
+        return self._parse._get_client().run_sync(self.arun())
+
+    async def arun(self):
+        '''runs backfill: fetches, maps and saves chunks which are not done'''
+        chunks = self.chunks()
+        todo = [c for c in chunks if self._chunk_key(c) not in self.checkpoint['done']]
+        self._started, self._rows = time.monotonic(), 0
+        self._chunks_total, self._chunks_done = len(chunks), len(chunks) - len(todo)
+
+        queue = asyncio.Queue(maxsize=self.prefetch)
+        producer = asyncio.ensure_future(self._fetch_chunks(todo, queue))
+        pool = ProcessPoolExecutor(self.processes) if self.processes != 0 else None
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                chunk, requests, payloads = item
+                # windows are mapped by range mapper, single dates by field mapper
+                mapper_list = [
+                    self._range_mapper if r.window else self._mapper for r in requests
+                ]
+                args = (mapper_list, payloads, self._source_config['id'])
+                if pool is None:
+                    mapped = _map_payloads(*args)
+                else:
+                    mapped = await loop.run_in_executor(pool, _map_payloads, *args)
+                self._save_chunk(chunk, requests, payloads, mapped)
+            await producer
+        finally:
+            producer.cancel()
+            if pool is not None:
+                pool.shutdown()
+        return self._get_progress()
+
+    async def _fetch_chunks(self, chunks, queue):
+        '''fetches responses of chunks and puts them to queue with requests
+        planned by parser (see ExchangeRateParse._plan_requests())
+        '''
+        for chunk in chunks:
+            requests = self._parse._plan_requests(
+                self._chunk_dates(chunk), chunk.basecur, url_all=chunk.basecur is None
+            )
+            payloads = await get_api_responses(
+                [r.url for r in requests],
+                self._source_config['max_connections'],
+                keep_failed=True,
+                client=self._parse._get_client(),
+            )
+            await queue.put((chunk, requests, payloads))
+        await queue.put(None)
+
+    def _chunk_dates(self, chunk):
+        '''returns ISO dates of chunk (only failed ones if chunk is resumed)'''
+        failed = self.checkpoint['failed'].get(self._chunk_key(chunk))
+        if failed is not None:
+            return failed
+        return list(self._parse.split_dates((chunk.date_from, chunk.date_to)))
+
+    def _split_chunk(self, chunk, requests, payloads, mapped):
+        '''splits mapped rows of chunk between base currencies
+        Returns: (dict with basecur: dict with ISO date: rows, list of all
+        rows, list of failed ISO dates)
+        '''
+        basecurs = self.basecurs if chunk.basecur is None else [chunk.basecur]
+        num_codes = {self._parse._ccy_codes.get(cur, -1): cur for cur in basecurs}
+        rows_by_cur = {cur: {} for cur in basecurs}
+        failed = []
+        rows = []
+        for request, payload, payload_rows in zip(
+            requests, payloads, mapped, strict=True
+        ):
+            if payload is None:
+                failed.extend(request.dates)
+                continue
+            for cur in basecurs:
+                rows_by_cur[cur].update((d, []) for d in request.dates)
+            for d, date_rows in self._parse._group_rows(request, payload_rows).items():
+                for r in date_rows:
+                    cur = num_codes.get(r.basecur, chunk.basecur)
+                    if cur in rows_by_cur:
+                        rows_by_cur[cur][d].append(r)
+                        rows.append(r)
+        return rows_by_cur, rows, failed
+
+    def _save_chunk(self, chunk, requests, payloads, mapped):
+        '''passes mapped rows to sink and store and updates checkpoint'''
+        rows_by_cur, rows, failed = self._split_chunk(chunk, requests, payloads, mapped)
+        for cur, rows_by_date in rows_by_cur.items():
+            self._parse._put_stored(rows_by_date, cur)
+        if self.sink is not None and rows:
+            self.sink(rows)
+
+        key = self._chunk_key(chunk)
+        if failed:
+            self.checkpoint['failed'][key] = failed
+        else:
+            self.checkpoint['failed'].pop(key, None)
+            self.checkpoint['done'].append(key)
+            self._chunks_done += 1
+        self._rows += len(rows)
+        self._save_checkpoint()
+        if self.progress is not None:
+            self.progress(self._get_progress())
+
+    def _get_progress(self):
+        elapsed = time.monotonic() - self._started
+        return BackfillProgress(
+            self.exratesrc,
+            self._chunks_done,
+            self._chunks_total,
+            self._rows,
+            elapsed,
+            self._rows / elapsed if elapsed else 0.0,
+        )
+
+    def _chunk_key(self, chunk):
+        '''returns string key of chunk used in checkpoint file, e.g.
+        '1:EUR,USD/UAH:2015-01-01:2015-01-31' (source id, sorted base
+        currencies / local currency, date range), so chunks of other source
+        or currencies are not taken as done
+        '''
+        basecurs = self.basecurs if chunk.basecur is None else [chunk.basecur]
+        return '{}:{}/{}:{}:{}'.format(
+            self._source_config['id'],
+            ','.join(sorted(basecurs)),
+            self._parse.localcur,
+            chunk.date_from,
+            chunk.date_to,
+        )
+
+    def _load_checkpoint(self):
+        '''returns checkpoint dict loaded from checkpoint file'''
+        checkpoint = {'done': [], 'failed': {}}
+        if self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                checkpoint.update(json.load(f))
+        return checkpoint
+
+    def _save_checkpoint(self):
+        '''saves checkpoint to checkpoint file atomically'''
+        if self.checkpoint_path is None:
+            return
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+
+def _get_mapper(name):
+    '''returns mappers module function for config mapper method name'''
+    return name and getattr(mappers, name.lstrip('_'))
+
+
+def _map_payloads(mapper_list, payloads, source_id):
+    '''maps payloads of chunk (run in worker process)
+    Returns: list with list of rows for every payload (empty for failed ones)
+    '''
+    ccy_codes = config.get_ccy_index().num_codes
+    return [
+        [] if payload is None else mapper(payload, source_id, ccy_codes)
+        for mapper, payload in zip(mapper_list, payloads, strict=True)
+    ]
@@ -0,0 +1,247 @@
+'''
+Module has batch runs fetching many exchange rate series in one process.
+
+Job spec lists series with date ranges, one job per line:
+    # SOURCE:BASECUR:LOCALCUR DATE_FROM [DATE_TO]
+    NBU-json:USD:UAH 2016-01-01 2016-12-31
+    {"source": "ECB-Fixer", "basecur": "EUR", "localcur": "USD",
+     "date_from": "2016-01-01", "date_to": "2016-12-31"}
+Lines starting with '{' are JSON objects (written on single line), blank
+lines and comments are skipped.
+
+BatchRun runs all jobs concurrently in one event loop over shared pooled
+client, so requests to every source host are limited by its scheduler (see
+client and scheduler modules) instead of every series starting own process
+with own client. Ranges are fetched in chunks of chunk_days dates and rows of
+every chunk are passed to sink as soon as it is received, in date order
+within series:
+    jobs = parse_jobs(open('jobs.txt'))
+    with StreamSink('jsonl', output_dir='rates') as sink:
+        result = asyncio.run(BatchRun(jobs, sink).run())
+'''
+
+import asyncio
+import csv
+import inspect
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+from . import config, instrument
+from .exrateparse import ExchangeRateParse
+
+# series with date range fetched by batch run
+Job = namedtuple('Job', 'exratesrc,basecur,localcur,date_from,date_to')
+
+# result of batch run:
+#   jobs -- number of jobs run
+#   rows -- number of rows passed to sink
+#   requests, bytes -- requests made to sources and bytes received
+#   failed -- dict with Job: list of ISO dates which could not be received
+#   elapsed -- seconds run took
+BatchResult = namedtuple('BatchResult', 'jobs,rows,requests,bytes,failed,elapsed')
+
+
+def parse_jobs(lines):
+    '''returns list of Job parsed from job spec lines (see module docstring)
+    Raises ValueError with line number for invalid line
+    '''
+    jobs = []
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            jobs.append(_parse_job(line))
+        except (ValueError, TypeError, KeyError) as exc:
+            raise ValueError(
+                'Invalid job spec on line {}: {}'.format(lineno, line)
+            ) from exc
+    return jobs
+
+
+def _parse_job(line):
+    '''returns Job from single job spec line'''
+    if line.startswith('{'):
+        spec = json.loads(line)
+        job = Job(
+            spec['source'],
+            spec['basecur'],
+            spec.get('localcur', 'UAH'),
+            spec['date_from'],
+            spec.get('date_to', spec['date_from']),
+        )
+    else:
+        series, *dates = line.split()
+        if len(dates) not in (1, 2):
+            raise ValueError('expected DATE_FROM [DATE_TO]')
+        job = Job(*series.split(':'), dates[0], dates[-1])
+    if not config.get_source_config(job.exratesrc):
+        raise ValueError('unknown source {}'.format(job.exratesrc))
+    if date.fromisoformat(job.date_from) > date.fromisoformat(job.date_to):
+        raise ValueError('date range is reversed')
+    return job
+
+
+class BatchRun:
+    '''Concurrent run of batch jobs
+
+    Constructor
+    BatchRun(jobs, sink, chunk_days, **kwargs)
+
+    jobs -- iterable of Job (or (exratesrc, basecur, localcur, date_from,
+        date_to) tuples)
+    sink -- callable sink(job, rows) receiving rows of every chunk of job.
+        Can be coroutine function
+    chunk_days -- number of dates requested by single ExchangeRateParse
+    kwargs -- other ExchangeRateParse constructor arguments (client, store,
+        cache)
+
+    For running all jobs use coroutine:
+        run()
+    '''
+
+    def __init__(self, jobs, sink, chunk_days=365, **kwargs):
+        self.jobs = [Job(*job) for job in jobs]
+        self.sink = sink
+        self.chunk_days = chunk_days
+        self.parse_kwargs = kwargs
+        self.requests = self.bytes = 0
+
+    async def run(self):
+        '''runs all jobs concurrently
+        Returns: BatchResult namedtuple
+        '''
+        self.requests = self.bytes = 0
+        started = time.perf_counter()
+        instrument.add_hook(self._count)
+        try:
+            results = await asyncio.gather(*(self._run_job(job) for job in self.jobs))
+        finally:
+            instrument.remove_hook(self._count)
+        return BatchResult(
+            len(self.jobs),
+            sum(rows for rows, _ in results),
+            self.requests,
+            self.bytes,
+            {
+                job: failed
+                for job, (_, failed) in zip(self.jobs, results, strict=True)
+                if failed
+            },
+            time.perf_counter() - started,
+        )
+
+    async def _run_job(self, job):
+        '''fetches job range chunk by chunk and passes rows to sink
+        Returns: (number of rows, list of failed dates)
+        '''
+        rows, failed = 0, []
+        for chunk in _split_range(job.date_from, job.date_to, self.chunk_days):
+            e = ExchangeRateParse(
+                job.exratesrc, chunk, job.basecur, job.localcur, **self.parse_kwargs
+            )
+            chunk_rows = await e.aget_exch_rate()
+            failed.extend(e._last_failed)
+            rows += len(chunk_rows)
+            result = self.sink(job, chunk_rows)
+            if inspect.isawaitable(result):
+                await result
+        return rows, failed
+
+    def _count(self, event):
+        '''instrumentation hook counting requests and bytes received'''
+        if event.kind != 'count':
+            return
+        if event.name == 'requests':
+            self.requests += event.value
+        elif event.name == 'bytes':
+            self.bytes += event.value
+
+
+def _split_range(date_from, date_to, days):
+    '''yields (date_from, date_to) ISO date ranges of at most days dates'''
+    start, end = date.fromisoformat(date_from), date.fromisoformat(date_to)
+    while start <= end:
+        stop = min(end, start + timedelta(days - 1))
+        yield start.isoformat(), stop.isoformat()
+        start = stop + timedelta(1)
+
+
+class StreamSink:
+    '''Sink writing rows of batch jobs as CSV or JSON Lines
+
+    Constructor
+    StreamSink(fmt, output, output_dir)
+
+    fmt -- 'csv' or 'jsonl'
+    output -- file all series are written to (stdout if None)
+    output_dir -- directory every series is written to own file named
+        SOURCE_BASECUR_LOCALCUR.csv (or .jsonl). Overrides output
+
+    Rows have source, base currency, local currency (literal codes), date and
+    rate. Files are flushed after every chunk, so output can be followed
+    while batch is running. Use as context manager or call close()
+    '''
+
+    FORMATS = ('csv', 'jsonl')
+    # keys of JSON Lines objects
+    FIELDS = ('source', 'basecur', 'localcur', 'date', 'rate')
+
+    def __init__(self, fmt='csv', output=None, output_dir=None):
+        if fmt not in self.FORMATS:
+            raise ValueError('Unknown output format {}'.format(fmt))
+        self.fmt = fmt
+        self.output = output
+        self.output_dir = output_dir
+        # path: open file
+        self._files = {}
+
+    def __call__(self, job, rows):
+        f = self._get_file(job)
+        records = (
+            (job.exratesrc, job.basecur, job.localcur, r.exdate, r.exrate) for r in rows
+        )
+        if self.fmt == 'csv':
+            csv.writer(f).writerows(records)
+        else:
+            f.writelines(
+                json.dumps(dict(zip(self.FIELDS, rec, strict=True))) + '\n'
+                for rec in records
+            )
+        f.flush()
+
+    def _get_file(self, job):
+        '''returns file rows of job are written to'''
+        if self.output_dir is not None:
+            path = os.path.join(
+                self.output_dir,
+                '{}_{}_{}.{}'.format(
+                    job.exratesrc, job.basecur, job.localcur, self.fmt
+                ),
+            )
+        elif self.output is not None:
+            path = self.output
+        else:
+            return sys.stdout
+        f = self._files.get(path)
+        if f is None:
+            if self.output_dir is not None:
+                os.makedirs(self.output_dir, exist_ok=True)
+            f = self._files[path] = open(path, 'w', newline='')
+        return f
+
+    def close(self):
+        '''closes files written'''
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,29 +1,255 @@
 import csv
 import datetime as dt
-import io
+import sys
 
 import click
 
 import exchrate
 
 
-@click.command()
+class DefaultGroup(click.Group):
+    '''click group which runs default command if no command name is given,
+    so `exchrate DATE_FROM DATE_TO` keeps working
+    '''
+
+    default_command = 'rates'
+
+    def parse_args(self, ctx, args):
+        # group options are flags, command name is first other argument
+        i = next((i for i, arg in enumerate(args) if not arg.startswith('-')), None)
+        if i is not None and args[i] not in self.commands:
+            args.insert(i, self.default_command)
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultGroup)
+@click.option('--stats', is_flag=True, help='Print request and mapping statistics')
+@click.pass_context
+def cli(ctx, stats):
+    '''Exchange rates parser'''
+    if stats:
+        from .instrument import StatsCollector
+
+        collector = ctx.with_resource(StatsCollector())
+        ctx.call_on_close(lambda: click.echo(collector.summary(), err=True))
+
+
+@cli.command()
 @click.argument('date_from', type=click.DateTime())
 @click.argument('date_to', type=click.DateTime())
-def cli(date_from: dt.datetime, date_to: dt.datetime):
+@click.option('--store', help='SQLite file rates are read from and saved to')
+def rates(date_from: dt.datetime, date_to: dt.datetime, store):
+    '''Print USD/UAH NBU rates for dates range as CSV'''
+    if store is not None:
+        from .ratestore import SQLiteRateStore
+
+        store = SQLiteRateStore(store)
     e = exchrate.ExchangeRateParse(
         'NBU-json',
         (date_from.date().isoformat(), date_to.date().isoformat()),
         'USD',
         'UAH',
+        store=store,
     )
-    rates = e.get_exch_rate()
-    out = io.StringIO()
+    # rows are written as soon as responses arrive
+    out = sys.stdout
     writer = csv.writer(out)
-    rows = [['date', 'rate']]
-    rows.extend([[row.exdate, row.exrate] for row in rates])
-    writer.writerows(rows)
-    click.echo(out.getvalue())
+    writer.writerow(['date', 'rate'])
+    for row in e.iter_exch_rate(ordered=True):
+        writer.writerow([row.exdate, row.exrate])
+        out.flush()
+
+
+@cli.command()
+@click.option(
+    '--series',
+    'series',
+    multiple=True,
+    required=True,
+    help='Series to poll as SOURCE:BASECUR:LOCALCUR, e.g. NBU-json:USD:UAH',
+)
+@click.option('--state', help='JSON file with series watermarks')
+@click.option('--output', help='CSV file new rows are appended to (stdout if omitted)')
+@click.option('--cadence', type=float, default=3600, help='Seconds between polls')
+@click.option('--start-date', type=click.DateTime(), help='First date of new series')
+@click.option('--once', is_flag=True, help='Poll once and exit')
+def poll(series, state, output, cadence, start_date, once):
+    '''Keep series up to date by polling dates after their watermarks'''
+    import asyncio
+
+    from .daemon import RatePoller, Series, csv_sink
+
+    try:
+        series = [Series(*s.split(':')) for s in series]
+    except TypeError as exc:
+        raise click.BadParameter('expected SOURCE:BASECUR:LOCALCUR') from exc
+
+    if output is None:
+        writer = csv.writer(sys.stdout)
+
+        def sink(s, rows):
+            writer.writerows(
+                (s.exratesrc, s.basecur, s.localcur, r.exdate, r.exrate) for r in rows
+            )
+            sys.stdout.flush()
+    else:
+        sink = csv_sink(output)
+
+    poller = RatePoller(
+        series,
+        sink,
+        state_path=state,
+        cadence=cadence,
+        start_date=start_date and start_date.date().isoformat(),
+    )
+    asyncio.run(poller.poll() if once else poller.run())
+
+
+@cli.command()
+@click.argument('source')
+@click.argument('date_from', type=click.DateTime())
+@click.argument('date_to', type=click.DateTime())
+@click.option(
+    '--currency', 'currencies', multiple=True, required=True, help='Base currency'
+)
+@click.option('--local-currency', default='UAH', show_default=True)
+@click.option('--checkpoint', help='JSON checkpoint file of resumable run')
+@click.option('--store', help='SQLite file rows are saved to')
+@click.option('--output', help='CSV file rows are appended to')
+@click.option('--chunk-days', type=int, default=31, show_default=True)
+@click.option('--processes', type=int, help='Mapping processes (0 maps in-process)')
+def backfill(
+    source,
+    date_from,
+    date_to,
+    currencies,
+    local_currency,
+    checkpoint,
+    store,
+    output,
+    chunk_days,
+    processes,
+):
+    '''Backfill historical rates of SOURCE in chunks, resuming from checkpoint'''
+    from .backfill import Backfill
+    from .config import get_ccy_index
+    from .ratestore import SQLiteRateStore
+
+    sink = None
+    if output is not None:
+        # rows have numeric codes, CSV has literal ones like poll command
+        num_codes = get_ccy_index().num_codes
+        ccy = {num_codes.get(c, -1): c for c in (*currencies, local_currency)}
+
+        def sink(rows):
+            with open(output, 'a', newline='') as f:
+                csv.writer(f).writerows(
+                    (
+                        source,
+                        ccy.get(r.basecur),
+                        ccy.get(r.localcur),
+                        r.exdate,
+                        r.exrate,
+                    )
+                    for r in rows
+                )
+
+    def progress(p):
+        click.echo(
+            f'{p.exratesrc}: {p.chunks_done}/{p.chunks_total} chunks, '
+            f'{p.rows} rows, {p.rows_per_s:.0f} rows/s',
+            err=True,
+        )
+
+    b = Backfill(
+        source,
+        currencies,
+        date_from.date().isoformat(),
+        date_to.date().isoformat(),
+        local_currency,
+        chunk_days=chunk_days,
+        checkpoint_path=checkpoint,
+        processes=processes,
+        sink=sink,
+        store=store and SQLiteRateStore(store),
+        progress=progress,
+    )
+    result = b.run()
+    if result.chunks_done < result.chunks_total:
+        raise click.ClickException(
+            f'{result.chunks_total - result.chunks_done} chunks have failed dates, '
+            'run again with same checkpoint to retry them'
+        )
+
+
+@cli.command()
+@click.argument('spec', type=click.File('r'), default='-')
+@click.option(
+    '--format',
+    'fmt',
+    type=click.Choice(['csv', 'jsonl']),
+    default='csv',
+    show_default=True,
+)
+@click.option('--output', help='File all series are written to (stdout if omitted)')
+@click.option('--output-dir', help='Directory every series is written to own file')
+@click.option('--chunk-days', type=int, default=365, show_default=True)
+@click.option('--store', help='SQLite file fetched rates are saved to')
+def batch(spec, fmt, output, output_dir, chunk_days, store):
+    '''Fetch all series listed in job SPEC file (stdin if omitted), one
+    SOURCE:BASECUR:LOCALCUR DATE_FROM [DATE_TO] job per line
+    '''
+    import asyncio
+
+    from .batch import BatchRun, StreamSink, parse_jobs
+    from .ratestore import SQLiteRateStore
+
+    try:
+        jobs = parse_jobs(spec)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc), param_hint='SPEC') from exc
+
+    with StreamSink(fmt, output, output_dir) as sink:
+        run = BatchRun(
+            jobs, sink, chunk_days=chunk_days, store=store and SQLiteRateStore(store)
+        )
+        result = asyncio.run(run.run())
+
+    elapsed = max(result.elapsed, 1e-6)
+    click.echo(
+        f'{result.jobs} series, {result.rows} rows, {result.requests} requests, '
+        f'{result.bytes} bytes in {result.elapsed:.2f}s: '
+        f'{result.rows / elapsed:.0f} rows/s, '
+        f'{result.requests / elapsed:.1f} requests/s',
+        err=True,
+    )
+    if result.failed:
+        for job, dates in result.failed.items():
+            click.echo(
+                f'{job.exratesrc}:{job.basecur}:{job.localcur}: '
+                f'{len(dates)} dates failed',
+                err=True,
+            )
+        raise click.ClickException(f'{len(result.failed)} series have failed dates')
+
+
+@cli.command()
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', type=int, default=8080, show_default=True)
+@click.option('--store', help='SQLite file fetched rates are saved to')
+def serve(host, port, store):
+    '''Serve rate and conversion queries over HTTP from in-memory index'''
+    import asyncio
+
+    from .ratestore import SQLiteRateStore
+    from .server import RateServer
+
+    server = RateServer(host, port, store=store and SQLiteRateStore(store))
+    click.echo(f'Serving on http://{host}:{port}', err=True)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == '__main__':
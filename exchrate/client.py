@@ -0,0 +1,243 @@
+'''
+Module has long-lived HTTP client used for requests to exchange rate sources.
+
+RateClient keeps pooled httpx.AsyncClient with keep-alive connections (and
+HTTP/2 if `h2` package is installed), so TLS handshakes are not repeated for
+every get_exch_rate() call. Single client is shared by all ExchangeRateParse
+instances unless other client is passed to constructor:
+    client = RateClient(max_per_host=5)
+    e = ExchangeRateParse('NBU-json', dates, 'USD', 'UAH', client=client)
+
+httpx.AsyncClient can be used only within event loop it was created in, so
+RateClient keeps one pool per running loop. Synchronous calls are run in
+background event loop thread owned by RateClient, which makes sync API
+usable from code already running inside event loop.
+
+Requests to every source host are made through scheduler.RequestScheduler
+which adapts concurrency to upstream health and retries failed requests.
+
+Concurrent requests of same url are coalesced (single-flight): only first
+caller makes request and others await its response, whatever event loop or
+thread they run in. Number of coalesced calls is counted in `coalesced`.
+'''
+
+import asyncio
+import concurrent.futures
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+
+from .scheduler import RequestScheduler
+
+
+class RateClient:
+    '''Pooled HTTP client shared by ExchangeRateParse instances
+
+    Constructor
+    RateClient(timeout, max_connections, max_keepalive_connections,
+        max_per_host, http2, transport, retries, backoff, deadline)
+
+    timeout -- request timeout in seconds
+    max_connections -- maximum number of connections in pool
+    max_keepalive_connections -- number of idle connections kept alive
+    max_per_host -- maximum number of concurrent requests to single host
+    http2 -- use HTTP/2 if True. If None then HTTP/2 is used when `h2`
+        package is installed
+    transport -- optional httpx async transport (e.g. httpx.MockTransport)
+    retries -- number of retries of failed requests
+    backoff -- base delay of exponential backoff between retries in seconds
+    deadline -- maximum duration of single get_api_responses() call in
+        seconds. Failed requests are not retried after it
+
+    For making requests use coroutine:
+        get(url)
+
+    For getting request scheduler of source host use method:
+        get_scheduler(url, max_connections)
+
+    For sharing single request between concurrent callers use coroutine:
+        get_coalesced(url, fetch)
+
+    For running coroutine from synchronous code use method:
+        run_sync(coro)
+    '''
+
+    def __init__(
+        self,
+        timeout=10,
+        max_connections=100,
+        max_keepalive_connections=20,
+        max_per_host=10,
+        http2=None,
+        transport=None,
+        retries=3,
+        backoff=0.25,
+        deadline=None,
+    ):
+        if http2 is None:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                http2 = False
+            else:
+                http2 = True
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self._client_kwargs = {
+            'timeout': timeout,
+            'limits': httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+            'http2': http2,
+            'transport': transport,
+        }
+        # httpx client, per host semaphores and schedulers for every event loop
+        self._pools = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        # url: concurrent.futures.Future of request in flight
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self.flights = self.coalesced = 0
+
+    def _pool(self):
+        '''returns (httpx.AsyncClient, host semaphores, host schedulers) for
+        running loop
+        '''
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None:
+            pool = (httpx.AsyncClient(**self._client_kwargs), {}, {})
+            self._pools[loop] = pool
+        return pool
+
+    async def get(self, url, timeout=None):
+        '''makes GET request using connection pool of running loop
+        Returns: httpx.Response
+
+        Keyword arguments:
+            timeout -- request timeout in seconds (client timeout if None)
+        '''
+        client, host_sems, _ = self._pool()
+        host = urlsplit(url).netloc
+        sem = host_sems.get(host)
+        if sem is None:
+            sem = host_sems[host] = asyncio.Semaphore(self.max_per_host)
+        async with sem:
+            if timeout is None:
+                return await client.get(url)
+            return await client.get(
+                url, timeout=min(timeout, self._client_kwargs['timeout'])
+            )
+
+    def get_scheduler(self, url, max_connections):
+        '''returns RequestScheduler of url host for running loop
+
+        Positional arguments:
+            url -- request url
+            max_connections -- initial concurrency limit of new scheduler
+        '''
+        schedulers = self._pool()[2]
+        host = urlsplit(url).netloc
+        scheduler = schedulers.get(host)
+        if scheduler is None:
+            scheduler = schedulers[host] = RequestScheduler(
+                max_connections, retries=self.retries, backoff=self.backoff
+            )
+        return scheduler
+
+    async def get_coalesced(self, url, fetch):
+        '''returns result of fetch() shared by all concurrent callers of url
+
+        Positional arguments:
+            url -- key of request (final source url)
+            fetch -- coroutine function making request
+
+        If caller making request is cancelled then one of waiting callers
+        makes request instead
+        '''
+        while True:
+            with self._inflight_lock:
+                flight = self._inflight.get(url)
+                if flight is None:
+                    flight = self._inflight[url] = concurrent.futures.Future()
+                    self.flights += 1
+                    leader = True
+                else:
+                    self.coalesced += 1
+                    leader = False
+
+            if leader:
+                return await self._lead_flight(url, flight, fetch)
+            try:
+                # shield keeps shared future alive if this caller is cancelled
+                return await asyncio.shield(asyncio.wrap_future(flight))
+            except _FlightCancelled:
+                continue
+
+    async def _lead_flight(self, url, flight, fetch):
+        '''makes request and shares its result with other callers'''
+        try:
+            result = await fetch()
+        except asyncio.CancelledError:
+            flight.set_exception(_FlightCancelled())
+            raise
+        except Exception as exc:
+            flight.set_exception(exc)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                del self._inflight[url]
+
+    def run_sync(self, coro):
+        '''runs coroutine in background event loop and returns its result'''
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name='exchrate-client', daemon=True
+                )
+                self._thread.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def aclose(self):
+        '''closes connection pool of running loop'''
+        pool = self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool[0].aclose()
+
+    def close(self):
+        '''closes connection pool of background loop and stops it'''
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join()
+            loop.close()
+
+
+class _FlightCancelled(Exception):
+    '''raised to callers waiting for request whose leader was cancelled'''
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_default_client():
+    '''returns RateClient shared within process (created on first call)'''
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = RateClient()
+        return _default_client
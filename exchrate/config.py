@@ -2,11 +2,22 @@
 '''All settings are instantiated here:
 ISO currency codes dict
 Exchange Rate sources
+
+Currency codes and sources config are loaded once per process by
+get_ccy_index() and get_source_config() functions. Currency index is read
+from compact package data file 'data/iso_4217.json' which is built from
+'data/iso_4217.xml' by build_ccy_index_file(). Modules needed for reading
+data files (importlib.resources, XML parser, urllib) are imported on first
+use, so importing config is cheap
 '''
 
-import urllib as http
-import xml.etree.ElementTree as xml
-from importlib.resources import files
+import functools
+import json
+from collections import namedtuple
+from types import MappingProxyType
+
+# immutable lookups between ISO 4217 character and numeric codes
+CurrencyIndex = namedtuple('CurrencyIndex', 'num_codes,char_codes')
 
 
 class CurrencyCode:
@@ -27,29 +38,22 @@ class CurrencyCode:
         self._ccy_codes = {}
 
         try:
-            s = files("exchrate").joinpath('data').joinpath('iso_4217.xml').read_text()
+            # package data file is parsed once per process
+            self._ccy_codes = _package_ccy_table()
         except OSError:
+            from urllib.request import urlopen
+
             # try to load from website
             url = 'http://www.currency-iso.org/dam/downloads/lists/list_one.xml'
-            s = http.urlopen(url).read()
+            s = urlopen(url).read()
 
             # try to save to file if provided
             if filename is not None:
-                with open(filename, 'w') as f:
+                with open(filename, 'wb') as f:
                     f.write(s)
 
-        if s:
-            # build dict using comprehension
-            self._ccy_codes = {
-                ccy_entry[2].text: {
-                    'cntry_name': ccy_entry[0].text,
-                    'ccy_name': ccy_entry[1].text,
-                    'ccy_code': int(ccy_entry[3].text),
-                    'ccy_units': ccy_entry[4].text,
-                }
-                for ccy_entry in xml.fromstring(s).iter('CcyNtry')
-                if len(ccy_entry) == 5
-            }
+            if s:
+                self._ccy_codes = _parse_ccy_xml(s)
 
     def get_ccy_num_code(self, ccy_char_code):
         '''returns currency ISO 4217 numeric code by character code'''
@@ -72,17 +76,93 @@ class CurrencyCode:
         return self._ccy_codes.get(ccy_char_code, {})
 
 
+def _parse_ccy_xml(s):
+    '''builds dict of currency info by character code from ISO 4217 xml'''
+    import xml.etree.ElementTree as xml
+
+    return {
+        ccy_entry[2].text: {
+            'cntry_name': ccy_entry[0].text,
+            'ccy_name': ccy_entry[1].text,
+            'ccy_code': int(ccy_entry[3].text),
+            'ccy_units': ccy_entry[4].text,
+        }
+        for ccy_entry in xml.fromstring(s).iter('CcyNtry')
+        if len(ccy_entry) == 5
+    }
+
+
+@functools.cache
+def _package_ccy_table():
+    '''parses package data file 'data/iso_4217.xml' once per process'''
+    from importlib.resources import files
+
+    return _parse_ccy_xml(
+        files('exchrate').joinpath('data').joinpath('iso_4217.xml').read_text()
+    )
+
+
+@functools.cache
+def get_ccy_index():
+    '''returns CurrencyIndex namedtuple with read-only mappings:
+        num_codes -- character code: numeric code
+        char_codes -- numeric code: character code
+
+    Index is built once per process from compact package data file
+    'data/iso_4217.json'. If it is missing then ISO 4217 xml is parsed
+    '''
+    from importlib.resources import files
+
+    try:
+        num_codes = json.loads(
+            files('exchrate').joinpath('data').joinpath('iso_4217.json').read_text()
+        )
+    except OSError:
+        num_codes = CurrencyCode().get_ccy_codes()
+    return CurrencyIndex(
+        MappingProxyType(num_codes),
+        MappingProxyType({v: k for k, v in num_codes.items()}),
+    )
+
+
+def build_ccy_index_file(filename):
+    '''writes character code: numeric code pairs from ISO 4217 xml to json
+    file used by get_ccy_index(). Run after updating 'data/iso_4217.xml'
+
+    Positional arguments:
+        filename -- path to output json file
+    '''
+    num_codes = dict(sorted(CurrencyCode().get_ccy_codes().items()))
+    with open(filename, 'w') as f:
+        json.dump(num_codes, f, separators=(',', ':'))
+        f.write('\n')
+
+
 class ExchangeRateSource:
     '''dictionary containing information about supported sources.
     Config fields:
         key -- string key used for lookup in python
         id -- integer identifier. used in database table
         url -- string representation of source url (contains formatting points)
+        url_all -- optional url returning rates of all currencies for a date.
+            Used for multi currency requests
+        url_range -- optional url returning rates of date window (contains
+            {date_from} and {date_to} formatting points)
+        range_mapper -- method name for generating output from JSON of
+            url_range response
+        max_window -- maximum number of dates in single url_range request
+        min_window -- shortest run of consecutive dates requested by url_range.
+            Shorter runs are requested per date (concurrently)
         dateformat -- format of date used for constructing source URL
         datapoints -- set of mandatory field names in JSON response (for
             informational purpose only)
-        max_connections -- number of concurrent requests to be made to WS
+        max_connections -- initial number of concurrent requests to be made to WS
+            (adapted by scheduler.RequestScheduler)
         field_mapper -- method name for generating output from JSON
+        rest_weekdays -- weekdays (date.weekday()) source publishes no new
+            rates on. Used by as-of index (see asof module)
+        localcurs -- optional local currencies source publishes rates in.
+            Any local currency if missing
     '''
 
     def __init__(self):
@@ -95,19 +175,36 @@ class ExchangeRateSource:
                 'url': 'https://bank.gov.ua/NBUStatService/v1/'
                 + 'statdirectory/exchange?'
                 + 'date={exdate}&valcode={basecur}&json',
+                'url_all': 'https://bank.gov.ua/NBUStatService/v1/'
+                + 'statdirectory/exchange?date={exdate}&json',
+                'url_range': 'https://bank.gov.ua/NBU_Exchange/exchange_site?'
+                + 'start={date_from}&end={date_to}&valcode={basecur}'
+                + '&sort=exchangedate&order=asc&json',
+                'range_mapper': '_map_nbu_gov_ua_range',
+                'max_window': 365,
+                'min_window': 7,
                 'dateformat': '%Y%m%d',
                 'datapoints': {'r030', 'rate', 'exchangedate'},
                 'max_connections': 5,
                 'field_mapper': '_map_nbu_gov_ua',
+                'rest_weekdays': (5, 6),
+                'localcurs': ('UAH',),
             },
             'ECB-Fixer': {
                 'id': 2,
                 'url': 'https://api.fixer.io/'
                 + '{exdate}?base={basecur}&symbols={localcur}',
+                'url_range': 'https://api.fixer.io/timeseries?'
+                + 'start_date={date_from}&end_date={date_to}'
+                + '&base={basecur}&symbols={localcur}',
+                'range_mapper': '_map_ecb_fixer_timeseries',
+                'max_window': 365,
+                'min_window': 2,
                 'dateformat': '%Y-%m-%d',
                 'datapoints': {'base', 'date', 'rates'},
                 'max_connections': 10,
                 'field_mapper': '_map_ecb_fixer',
+                'rest_weekdays': (5, 6),
             },
         }
 
@@ -115,3 +212,29 @@ class ExchangeRateSource:
         '''returns dict containing information for provided source'''
 
         return self._exrate_sources.get(exratesrc, {})
+
+    def get_pair_sources(self, basecur, localcur):
+        '''returns codes of sources publishing rates of currency pair'''
+        return [
+            code
+            for code, source in self._exrate_sources.items()
+            if basecur != localcur and localcur in source.get('localcurs', (localcur,))
+        ]
+
+
+@functools.cache
+def _exrate_sources():
+    '''returns ExchangeRateSource instance shared within process'''
+    return ExchangeRateSource()
+
+
+def get_source_config(exratesrc):
+    '''returns dict containing information for provided source
+    Sources config is built once per process
+    '''
+    return _exrate_sources().get_source_config(exratesrc)
+
+
+def get_pair_sources(basecur, localcur):
+    '''returns codes of sources publishing rates of currency pair'''
+    return _exrate_sources().get_pair_sources(basecur, localcur)
@@ -0,0 +1,182 @@
+'''
+Module has bulk currency conversion engine. Requires NumPy
+(`pip install exchrate[numpy]`).
+
+RateConverter keeps dense (date x currency) table of rates against local
+currency of the source (e.g. 980/UAH for NBU) built from RateSeries or rows
+of get_exch_rate(). Conversion of arrays of amounts, dates and currency codes
+is made by single vectorized lookup into the table. Pairs where neither
+currency is local currency are triangulated through it:
+    amount_to = amount_from * rate(from -> local) / rate(to -> local)
+
+Rows without rate for the date or currency are not dropped: their result
+amount is NaN and their positions are returned in `missing` array.
+
+    conv = RateConverter.fetch('NBU-json', ('2016-12-01', '2016-12-31'),
+                               ['USD', 'EUR'])
+    result = conv.convert(amounts, dates, 'EUR', 'USD')
+'''
+
+from collections import namedtuple
+
+import numpy as np
+
+from . import config
+from .rateseries import _EPOCH_ORDINAL, RateSeries
+
+# result of conversion:
+#   amounts -- converted amounts (NaN if rate is missing)
+#   rates -- rates applied to amounts (NaN if rate is missing)
+#   missing -- positions of rows which could not be converted
+ConversionResult = namedtuple('ConversionResult', 'amounts,rates,missing')
+
+
+class RateConverter:
+    '''Vectorized currency converter
+
+    Constructor
+    RateConverter(rates)
+
+    rates -- rateseries.RateSeries or iterable of rows with fields of
+        ExchangeRateParse.EXRATE_TEMPLATE. All rows must have same local
+        currency (1 basecur = exrate localcur)
+
+    For converting amounts use method:
+        convert(amounts, dates, from_ccy, to_ccy)
+    '''
+
+    def __init__(self, rates):
+        # table has row for every day from first date of rates
+        self.localcur, ordinals, self.ccy_codes, self.table = _rate_table(
+            rates, daily=True
+        )
+        self.first_ordinal = int(ordinals[0]) if len(ordinals) else 0
+
+    @classmethod
+    def fetch(cls, exratesrc, exratedate, currencies, localcur='UAH', **kwargs):
+        '''fetches rates of currencies through ExchangeRateParse and returns
+        converter built from them
+
+        Positional arguments:
+            exratesrc -- exchange rate source code
+            exratedate -- dates (or date range) to fetch rates for
+            currencies -- ISO 4217 literal codes of currencies
+
+        Keyword arguments:
+            localcur -- ISO 4217 literal code of local currency
+            kwargs -- other ExchangeRateParse constructor arguments
+        '''
+        from .exrateparse import ExchangeRateParse
+
+        currencies = [cur for cur in currencies if cur != localcur]
+        e = ExchangeRateParse(exratesrc, exratedate, None, localcur, **kwargs)
+        return cls(e.get_multi_exch_rate(currencies, as_series=True))
+
+    def convert(self, amounts, dates, from_ccy, to_ccy):
+        '''converts amounts from one currency to another
+        Returns: ConversionResult namedtuple of arrays
+
+        Positional arguments (arrays or scalars broadcast together):
+            amounts -- amounts in from_ccy
+            dates -- dates of rates: ISO date strings, datetime.date,
+                numpy datetime64 or date ordinals
+            from_ccy -- ISO 4217 numeric or literal codes of amounts currency
+            to_ccy -- ISO 4217 numeric or literal codes of target currency
+        '''
+        amounts, ordinals = np.broadcast_arrays(
+            np.asarray(amounts, dtype=np.float64), _to_ordinals(dates)
+        )
+        rates = self.get_rates(ordinals, from_ccy, to_ccy)
+        return ConversionResult(amounts * rates, rates, np.flatnonzero(np.isnan(rates)))
+
+    def get_rates(self, dates, from_ccy, to_ccy):
+        '''returns array of rates: 1 from_ccy = rate to_ccy
+        Rates which are missing are NaN
+        '''
+        ordinals = _to_ordinals(dates)
+        rate_from = self._lookup(ordinals, from_ccy)
+        rate_to = self._lookup(ordinals, to_ccy)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return rate_from / rate_to
+
+    def _lookup(self, ordinals, ccy):
+        '''returns rates against local currency for dates and currencies'''
+        codes = _to_num_codes(ccy)
+        ordinals, codes = np.broadcast_arrays(ordinals, codes)
+        if not self.table.size:
+            return np.full(ordinals.shape, np.nan)
+
+        days = ordinals - self.first_ordinal
+        cols = np.searchsorted(self.ccy_codes, codes)
+        cols_clipped = np.minimum(cols, len(self.ccy_codes) - 1)
+        days_clipped = np.clip(days, 0, len(self.table) - 1)
+        found = (
+            (self.ccy_codes[cols_clipped] == codes)
+            & (days >= 0)
+            & (days < len(self.table))
+        )
+        return np.where(found, self.table[days_clipped, cols_clipped], np.nan)
+
+
+def _rate_table(rates, daily=False):
+    '''builds dense (date x currency) table of rates against local currency
+    Returns: (localcur, ordinals, ccy_codes, table), where ordinals and
+        ccy_codes are sorted positions of table rows and columns. Column of
+        local currency is all ones, missing rates are NaN
+
+    Positional arguments:
+        rates -- rateseries.RateSeries or iterable of rows with fields of
+            ExchangeRateParse.EXRATE_TEMPLATE with same local currency
+
+    Keyword arguments:
+        daily -- if True then table has row for every day between first and
+            last date, otherwise only for dates of rates
+    '''
+    if not isinstance(rates, RateSeries):
+        rates = RateSeries.from_rows(rates)
+    localcurs = set(rates.localcur)
+    if len(localcurs) > 1:
+        raise ValueError('Rates against several local currencies: {}'.format(localcurs))
+    localcur = localcurs.pop() if localcurs else None
+
+    columns = rates.to_numpy()
+    exdates = np.frombuffer(rates.exdate, dtype='i').astype(np.int64)
+    if daily:
+        first = int(exdates.min()) if len(rates) else 0
+        ndays = int(exdates.max()) - first + 1 if len(rates) else 0
+        ordinals, rows = np.arange(first, first + ndays), exdates - first
+    else:
+        ordinals, rows = np.unique(exdates, return_inverse=True)
+
+    ccy_codes = np.unique(np.append(columns['basecur'], localcur or 0).astype(np.int64))
+    table = np.full((len(ordinals), len(ccy_codes)), np.nan)
+    table[rows, np.searchsorted(ccy_codes, columns['basecur'])] = columns['exrate']
+    if localcur is not None:
+        table[:, np.searchsorted(ccy_codes, localcur)] = 1.0
+    return localcur, ordinals, ccy_codes, table
+
+
+def _to_ordinals(dates):
+    '''converts dates (ISO strings, datetime.date, datetime64 or ordinals)
+    to numpy array of date ordinals
+    '''
+    dates = np.asarray(dates)
+    if np.issubdtype(dates.dtype, np.integer):
+        return dates.astype(np.int64)
+    if not np.issubdtype(dates.dtype, np.datetime64):
+        dates = dates.astype('datetime64[D]')
+    return dates.astype('datetime64[D]').astype(np.int64) + _EPOCH_ORDINAL
+
+
+def _to_num_codes(ccy):
+    '''converts ISO 4217 literal or numeric codes to array of numeric codes
+    Unknown literal codes are converted to -1
+    '''
+    ccy = np.asarray(ccy)
+    if np.issubdtype(ccy.dtype, np.integer):
+        return ccy.astype(np.int64)
+    num_codes = config.get_ccy_index().num_codes
+    uniq, inverse = np.unique(ccy, return_inverse=True)
+    return np.array([num_codes.get(c, -1) for c in uniq.tolist()], np.int64)[
+        inverse
+    ].reshape(ccy.shape)
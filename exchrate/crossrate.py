@@ -0,0 +1,143 @@
+'''
+Module has cross-rate matrices of all currency pairs. Requires NumPy
+(`pip install exchrate[numpy]`).
+
+CrossRates keeps dense (date x currency) table of rates against local
+currency of the source (e.g. 980/UAH for NBU), which single all currency
+request per date returns. Cross-rate matrix of date is built from table row
+by one vectorized outer division:
+    matrix[i, j] = rate(ccy_i -> local) / rate(ccy_j -> local)
+so 1 unit of currency ccy_codes[i] costs matrix[i, j] units of currency
+ccy_codes[j]. Matrices of date range are stacked into (dates x N x N) array.
+Positions of currencies in matrices are given by sorted ISO 4217 numeric
+codes (ccy_codes), rate of single pair is looked up in O(1) without building
+matrix:
+    cross = CrossRates.fetch('NBU-json', ('2016-12-01', '2016-12-31'))
+    cross.rate('2016-12-01', 'EUR', 'USD')
+    cross.matrix('2016-12-01')  # N x N array
+    cross.stack()  # dates x N x N array
+
+Precision. Rates against local currency (column of local currency) are
+exactly the values published upstream, diagonal is exactly 1. Inverse and
+cross rates are results of single float64 division of published values, so
+they carry no error beyond half unit in last place of float64 (relative
+1.1e-16) on top of upstream rounding: relative error of cross rate is at most
+sum of relative rounding errors of its two published legs (e.g. legs of
+about 25 published with 4 decimal places are exact to 2e-6 relative, so their
+cross rate is exact to 4e-6). Cross rates are not rounded to upstream number
+of decimal places. Rates missing for date or currency are NaN.
+'''
+
+from datetime import date
+
+import numpy as np
+
+from . import config
+from .convert import _rate_table
+from .rateseries import _to_ordinal
+
+
+class CrossRates:
+    '''Cross-rate matrices of currencies for dates
+
+    Constructor
+    CrossRates(rates)
+
+    rates -- rateseries.RateSeries or iterable of rows with fields of
+        ExchangeRateParse.EXRATE_TEMPLATE. All rows must have same local
+        currency (1 basecur = exrate localcur)
+
+    Attributes:
+        ccy_codes -- sorted ISO 4217 numeric codes, positions of currencies
+            in matrices
+        ordinals -- sorted date ordinals, positions of dates in stack
+        table -- (dates x currencies) rates against local currency
+
+    For getting cross rates use methods:
+        rate(exdate, base, quote), matrix(exdate), stack(date_from, date_to)
+    '''
+
+    def __init__(self, rates):
+        self.localcur, self.ordinals, self.ccy_codes, self.table = _rate_table(rates)
+
+        # O(1) lookups of positions by date ordinal and numeric code
+        self._date_pos = {o: i for i, o in enumerate(self.ordinals.tolist())}
+        self._ccy_pos = {c: i for i, c in enumerate(self.ccy_codes.tolist())}
+        self._num_codes = config.get_ccy_index().num_codes
+
+    @classmethod
+    def fetch(cls, exratesrc, exratedate, currencies=None, localcur='UAH', **kwargs):
+        '''fetches rates of currencies through ExchangeRateParse and returns
+        cross rates built from them. Source with 'url_all' in config is
+        requested once per date for all currencies
+
+        Positional arguments:
+            exratesrc -- exchange rate source code
+            exratedate -- dates (or date range) to fetch rates for
+
+        Keyword arguments:
+            currencies -- ISO 4217 literal codes of currencies. If None then
+                all currencies published by source
+            localcur -- ISO 4217 literal code of local currency
+            kwargs -- other ExchangeRateParse constructor arguments
+        '''
+        from .exrateparse import ExchangeRateParse
+
+        if currencies is not None:
+            currencies = [cur for cur in currencies if cur != localcur]
+        e = ExchangeRateParse(exratesrc, exratedate, None, localcur, **kwargs)
+        return cls(e.get_multi_exch_rate(currencies, as_series=True))
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def rate(self, exdate, base, quote):
+        '''returns cross rate: 1 base = rate quote (NaN if rate is missing)
+
+        Positional arguments:
+            exdate -- ISO date string, datetime.date or date ordinal
+            base, quote -- ISO 4217 literal or numeric currency codes
+        '''
+        row = self._row(exdate)
+        return float(row[self.position(base)] / row[self.position(quote)])
+
+    def matrix(self, exdate):
+        '''returns (N x N) cross-rate matrix of date:
+        1 ccy_codes[i] = matrix[i, j] ccy_codes[j]
+        '''
+        return _cross(self._row(exdate))
+
+    def stack(self, date_from=None, date_to=None):
+        '''returns (dates x N x N) cross-rate matrices of dates between
+        date_from and date_to (inclusive, all dates if None) and array of
+        their ordinals
+        '''
+        start = 0 if date_from is None else _to_ordinal(date_from)
+        stop = date.max.toordinal() if date_to is None else _to_ordinal(date_to)
+        lo, hi = np.searchsorted(self.ordinals, [start, stop + 1])
+        return _cross(self.table[lo:hi]), self.ordinals[lo:hi]
+
+    def _row(self, exdate):
+        '''returns table row of rates of date. Raises KeyError for date
+        without rates
+        '''
+        try:
+            return self.table[self._date_pos[_to_ordinal(exdate)]]
+        except KeyError:
+            raise KeyError('No rates for date {}'.format(exdate)) from None
+
+    def position(self, ccy):
+        '''returns position of currency (ISO 4217 literal or numeric code) in
+        matrices. Raises KeyError for currency without rates
+        '''
+        code = self._num_codes.get(ccy, -1) if isinstance(ccy, str) else ccy
+        try:
+            return self._ccy_pos[code]
+        except KeyError:
+            raise KeyError('No rates of currency {}'.format(ccy)) from None
+
+
+def _cross(table):
+    '''returns cross-rate matrices of rows of rates against local currency'''
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return table[..., :, None] / table[..., None, :]
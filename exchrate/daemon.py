@@ -0,0 +1,245 @@
+'''
+Module has polling daemon keeping exchange rate series up to date.
+
+RatePoller watches set of (source, basecur, localcur) series and keeps
+high-watermark date (latest date with received rates) for every series.
+Every poll requests only dates after watermark up to today and passes new
+rows to sink. Watermark is kept before first date which failed and never
+moves past yesterday, so failed dates and today (which may be published
+later) are requested again by next poll. Rows already passed to sink are
+not passed again by the same poller.
+
+Series of same source and local currency are polled together: if source
+supports all currency requests (config 'url_all') then single request per
+date is made for all of them (see get_multi_exch_rate()).
+
+All sources are polled concurrently in one event loop, each on its own
+cadence. Error of a group of series (e.g. source answering with malformed
+payload) is logged, watermarks of the group are kept and it is polled again
+on next cadence:
+    poller = RatePoller([Series('NBU-json', 'USD', 'UAH')], print,
+                        state_path='watermarks.json')
+    asyncio.run(poller.run())
+'''
+
+import asyncio
+import csv
+import json
+import logging
+import os
+from collections import namedtuple
+from datetime import date, timedelta
+
+from .exrateparse import ExchangeRateParse
+
+# series watched by poller
+Series = namedtuple('Series', 'exratesrc,basecur,localcur')
+
+# default seconds between polls of a source
+DEFAULT_CADENCE = 3600
+
+logger = logging.getLogger(__name__)
+
+
+class RatePoller:
+    '''Incremental poller of exchange rate series
+
+    Constructor
+    RatePoller(series, sink, state_path, cadence, start_date, **kwargs)
+
+    series -- iterable of Series (or (exratesrc, basecur, localcur) tuples)
+    sink -- callable sink(series, rows) receiving new rows of series. Can be
+        coroutine function
+    state_path -- optional path to JSON file with watermarks. Watermarks are
+        loaded on start and saved after every poll
+    cadence -- seconds between polls, or dict with source: seconds
+    start_date -- ISO date polled first for series without watermark
+        (today if None)
+    kwargs -- other ExchangeRateParse constructor arguments (client, store)
+
+    For polling once use coroutine:
+        poll()
+
+    For polling until stopped use coroutine:
+        run(stop_event)
+
+    Number of group polls which failed with error is kept in attribute:
+        errors
+    '''
+
+    def __init__(
+        self,
+        series,
+        sink,
+        state_path=None,
+        cadence=DEFAULT_CADENCE,
+        start_date=None,
+        **kwargs,
+    ):
+        self.series = [Series(*s) for s in series]
+        self.sink = sink
+        self.state_path = state_path
+        self.cadence = cadence
+        self.start_date = start_date
+        self.parse_kwargs = kwargs
+        self.watermarks = self._load_watermarks()
+        # series key: ISO dates after watermark already passed to sink
+        self._sent = {}
+        # number of failed polls of series groups
+        self.errors = 0
+
+    def get_cadence(self, exratesrc):
+        '''returns seconds between polls of source'''
+        if isinstance(self.cadence, dict):
+            return self.cadence.get(exratesrc, DEFAULT_CADENCE)
+        return self.cadence
+
+    async def poll(self, exratesrc=None):
+        '''polls dates after watermarks of all series (or series of source)
+        Returns: number of new rows passed to sink
+        '''
+        groups = {}
+        for s in self.series:
+            if exratesrc is None or s.exratesrc == exratesrc:
+                groups.setdefault((s.exratesrc, s.localcur), []).append(s)
+        counts = await asyncio.gather(
+            *(self._poll_group_logged(group) for group in groups.values())
+        )
+        self._save_watermarks()
+        return sum(counts)
+
+    async def run(self, stop_event=None):
+        '''polls every source on its cadence until stop_event is set'''
+        stop_event = stop_event or asyncio.Event()
+        await asyncio.gather(
+            *(
+                self._run_source(exratesrc, stop_event)
+                for exratesrc in dict.fromkeys(s.exratesrc for s in self.series)
+            )
+        )
+
+    async def _run_source(self, exratesrc, stop_event):
+        '''polls series of source until stop_event is set'''
+        while not stop_event.is_set():
+            await self.poll(exratesrc)
+            try:
+                await asyncio.wait_for(
+                    stop_event.wait(), timeout=self.get_cadence(exratesrc)
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll_group_logged(self, group):
+        '''polls group of series, errors are logged and counted
+        Returns: number of new rows (0 on error)
+        '''
+        try:
+            return await self._poll_group(group)
+        except Exception:
+            self.errors += 1
+            logger.exception(
+                'Poll of %s failed', ', '.join(_series_key(s) for s in group)
+            )
+            return 0
+
+    async def _poll_group(self, group):
+        '''polls series of same source and local currency together'''
+        today = date.today().isoformat()
+        starts = {s: self._next_date(s) for s in group}
+        pending = [s for s in group if starts[s] <= today]
+        if not pending:
+            return 0
+
+        exratesrc, localcur = pending[0].exratesrc, pending[0].localcur
+        e = ExchangeRateParse(
+            exratesrc,
+            (min(starts[s] for s in pending), today),
+            pending[0].basecur,
+            localcur,
+            **self.parse_kwargs,
+        )
+        if len(pending) > 1:
+            rows = await e.aget_multi_exch_rate([s.basecur for s in pending])
+        else:
+            rows = await e.aget_exch_rate()
+
+        num_codes = e._ccy_codes
+        count = 0
+        for s in pending:
+            key = _series_key(s)
+            basecur = num_codes.get(s.basecur, -1)
+            sent = self._sent.setdefault(key, set())
+            new_rows = [
+                r
+                for r in rows
+                if r.exdate >= starts[s]
+                and r.exdate not in sent
+                and (len(pending) == 1 or r.basecur == basecur)
+            ]
+            if new_rows:
+                result = self.sink(s, new_rows)
+                if asyncio.iscoroutine(result):
+                    await result
+                sent.update(r.exdate for r in new_rows)
+                count += len(new_rows)
+            self._advance_watermark(key, starts[s], e._last_failed)
+        return count
+
+    def _advance_watermark(self, key, start, failed):
+        '''moves watermark of series to latest date passed to sink, but before
+        first failed date and not past yesterday
+        '''
+        sent = self._sent[key]
+        if not sent:
+            return
+        limit = (date.today() - timedelta(1)).isoformat()
+        failed = [d for d in failed if d >= start]
+        if failed:
+            limit = min(
+                limit, (date.fromisoformat(min(failed)) - timedelta(1)).isoformat()
+            )
+        watermark = max((d for d in sent if d <= limit), default=None)
+        if watermark is not None and watermark > self.watermarks.get(key, ''):
+            self.watermarks[key] = watermark
+            sent.difference_update([d for d in sent if d <= watermark])
+
+    def _next_date(self, series):
+        '''returns ISO date following watermark of series'''
+        watermark = self.watermarks.get(_series_key(series))
+        if watermark is None:
+            return self.start_date or date.today().isoformat()
+        return (date.fromisoformat(watermark) + timedelta(1)).isoformat()
+
+    def _load_watermarks(self):
+        '''returns watermarks dict loaded from state file'''
+        if self.state_path is None or not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def _save_watermarks(self):
+        '''saves watermarks to state file atomically'''
+        if self.state_path is None:
+            return
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.watermarks, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+
+def _series_key(series):
+    '''returns string key of series used in watermarks file'''
+    return ':'.join(series)
+
+
+def csv_sink(path):
+    '''returns sink appending rows to CSV file at path'''
+
+    def sink(series, rows):
+        with open(path, 'a', newline='') as f:
+            csv.writer(f).writerows(
+                (series.exratesrc, series.basecur, series.localcur, r.exdate, r.exrate)
+                for r in rows
+            )
+
+    return sink
@@ -9,12 +9,24 @@ of named tuples. Currently following process is implemented:
     requires:
         - entry in config.ExchangeRateSource._exrate_sources (similar to
         existing)
-        - mapping function in ExchangeRateParse which maps output from API to
-        Python named tuple
+        - mapping function in mappers module which maps output from API to
+        Python named tuple and ExchangeRateParse method calling it
     4. If exchange rate source needs authentication than more changes to be
     made:
         - modifying _get_api_responses method to allow passing authentication
         data or object
+    5. Optional rate store (see ratestore module) can be passed to avoid
+    requesting dates which were already received before
+    6. Mapped rates are kept in process-wide in-memory cache (see ratecache
+    module), which is shared by all instances
+    7. Requests are made by pooled RateClient (see client module) shared by
+    all instances. Async API (aget_exch_rate etc.) can be awaited inside
+    running event loop, sync API is a wrapper around it
+    8. Fetch and map pipeline emits timing spans and counters to registered
+    hooks (see instrument module)
+    9. asyncio and client module (with httpx) are imported on first request,
+    so dates answered from rate cache or rate store by get_exch_rate() or
+    iter_exch_rate() are returned without importing them
 
     Class approach was selected for several reasons:
     - you can create multiple instances for different sources and set them
@@ -23,17 +35,23 @@ of named tuples. Currently following process is implemented:
     - you can create multiple instances with different set of parameters to
         run them concurrently (for example, NBU does not support multi currency
         request for multiple dates, which can be bypassed by spawning multiple
-        ExchangeRateParse objects)
+        ExchangeRateParse objects or by get_multi_exch_rate() which requests
+        all currencies for every date)
 '''
 
-import asyncio
-import json
-from collections import namedtuple
-from datetime import datetime, timedelta
+from collections import deque, namedtuple
+from datetime import date, datetime, timedelta
 
-import httpx
+from . import asof, config, instrument, mappers, ratecache
+from .rateseries import RateSeries
 
-from . import config
+# planned request to source:
+#   url -- request url
+#   dates -- ISO dates answered by response
+#   window -- True for window request (config 'url_range', mapped by
+#       'range_mapper'), False for single date request (mapped by
+#       'field_mapper')
+Request = namedtuple('Request', 'url,dates,window')
 
 
 class ExchangeRateParse:
@@ -48,13 +66,33 @@ class ExchangeRateParse:
     localcur -- ISO 4217 literal local currency code (1 basecur = x localcur)
     daysadd -- optional parameter used for unpacking dates sequence
     df -- dateformat of dates in exratedate
+    store -- optional rate store (e.g. ratestore.SQLiteRateStore). Only dates
+        missing in store are requested from source
+    cache -- in-memory rate cache. True (default) for cache shared by all
+        instances, False to disable or ratecache.RateCache instance
+    client -- client.RateClient used for requests. If None then client
+        shared by all instances is used
+    asof -- as-of index of series. True for index shared by all instances,
+        False (default) to disable or asof.AsOfIndex instance. Dates covered
+        by as-of value are not requested and dates without publication are
+        answered with latest rate on or before them
 
     For getting exchange rate for specified params use method:
-        get_exch_rate()
+        get_exch_rate() or coroutine aget_exch_rate()
+
+    For getting exchange rate rows as soon as responses arrive use iterator:
+        iter_exch_rate() or async iterator aiter_exch_rate()
+
+    For getting exchange rates of several base currencies use method:
+        get_multi_exch_rate(basecurs) or coroutine aget_multi_exch_rate(basecurs)
 
     Last result of get_exch_rate() is stored in following attribute:
         _last_result
 
+    ISO dates which could not be received (after retries) by last call are
+    stored in following attribute:
+        _last_failed
+
     For changing exchange rate source use method:
         set_source(exratesrc)
 
@@ -64,13 +102,27 @@ class ExchangeRateParse:
         basecur -- base currency
         daysadd -- days to be added to next date when unpacking dates
         df -- daterformat of dates in exratedate
+        store -- rate store used for already received dates
+        cache -- in-memory rate cache or None
+        client -- client.RateClient used for requests
+        asof -- as-of index, True or False
     '''
 
     # result output template
-    EXRATE_TEMPLATE = namedtuple('Exrate', 'sourceid,exdate,localcur,basecur,exrate')
+    EXRATE_TEMPLATE = mappers.Exrate
 
     def __init__(
-        self, exratesrc, exratedate, basecur, localcur, daysadd=1, df='%Y-%m-%d'
+        self,
+        exratesrc,
+        exratedate,
+        basecur,
+        localcur,
+        daysadd=1,
+        df='%Y-%m-%d',
+        store=None,
+        cache=True,
+        client=None,
+        asof=False,
     ):
         self.set_source(exratesrc)
         self.exratedate = exratedate
@@ -78,13 +130,24 @@ class ExchangeRateParse:
         self.basecur = basecur
         self.daysadd = daysadd
         self.df = df
-        # read ISO 4217 currency codes mapping
-        self._ccy_codes = config.CurrencyCode().get_ccy_codes()
+        self.store = store
+        if cache is True:
+            cache = ratecache.shared_cache
+        self.cache = None if cache is False else cache
+        self.client = client
+        self.asof = asof
+        # ISO 4217 currency codes mapping shared within process
+        self._ccy_codes = config.get_ccy_index().num_codes
         self._last_result = []
+        self._last_failed = []
 
-    def _get_api_responses(self, urls, max_connections=10):
-        return asyncio.get_event_loop().run_until_complete(
-            get_api_responses(urls, max_connections)
+    def _get_client(self):
+        '''returns RateClient of instance or client shared within process'''
+        return self.client or _get_default_client()
+
+    async def _get_api_responses(self, urls, max_connections=10, keep_failed=False):
+        return await get_api_responses(
+            urls, max_connections, keep_failed, self._get_client()
         )
 
     def set_source(self, exratesrc):
@@ -95,14 +158,30 @@ class ExchangeRateParse:
         '''
 
         # read source config
-        tmp = config.ExchangeRateSource().get_source_config(exratesrc)
+        tmp = config.get_source_config(exratesrc)
         if not tmp:
             raise UnknownSourceError(
                 'Unsupported source provided: {}'.format(exratesrc)
             )
         self._source_config, self.exratesrc = (tmp, exratesrc)
 
-    def get_exch_rate(self):
+    def get_exch_rate(self, as_series=False):
+        '''Get currency exchange rate from selected source, date(s)
+        Returns: list of namedtuple instances with exchange rates
+
+        Synchronous wrapper around aget_exch_rate(). If all dates are found
+        in rate cache or rate store then client is not used
+        '''
+        dates = list(self.split_dates(self.exratedate, self.df, daysadd=self.daysadd))
+        rows_by_date, missing, index = planned = self._plan_rows(dates)
+        if missing:
+            return self._get_client().run_sync(
+                self._aget_exch_rate(dates, planned, as_series)
+            )
+        rows_by_date = self._fill_asof(dates, rows_by_date, index)
+        return self._set_result(dates, rows_by_date, as_series)
+
+    async def aget_exch_rate(self, as_series=False):
         '''Get currency exchange rate from selected source, date(s)
         Returns: list of namedtuple instances with exchange rates
 
@@ -112,102 +191,655 @@ class ExchangeRateParse:
             curfrom -- base currency 3 digit ISO 4217 code
             curto -- local currency 3 digit ISO 4217 code
             exrate -- exchange rate between base and local currency
+
+        Keyword arguments:
+            as_series -- if True then rateseries.RateSeries with columns of
+                same fields is returned instead of list
+        '''
+
+        dates = list(self.split_dates(self.exratedate, self.df, daysadd=self.daysadd))
+        return await self._aget_exch_rate(dates, self._plan_rows(dates), as_series)
+
+    async def _aget_exch_rate(self, dates, planned, as_series):
+        '''fetches dates planned by _plan_rows() and sets result'''
+        rows_by_date = await self._get_rows(dates, planned)
+        return self._set_result(dates, rows_by_date, as_series)
+
+    def _set_result(self, dates, rows_by_date, as_series):
+        '''merges stored and fetched rows in order of dates requested'''
+        self._last_result = [
+            exrate for d in dates for exrate in rows_by_date.get(d, ())
+        ]
+        if as_series:
+            self._last_result = RateSeries.from_rows(self._last_result)
+
+        return self._last_result
+
+    def _plan_rows(self, dates):
+        '''looks up ISO dates (and dates as-of index needs) in rate cache and
+        rate store
+        Returns: (dict with ISO date: rows found, list of dates to request,
+        as-of index or None)
+        '''
+        self._last_failed = []
+        index = self._get_asof_index()
+        planned = dates if index is None else index.plan(dates)
+        rows_by_date = self._get_stored(planned)
+        return rows_by_date, [d for d in planned if d not in rows_by_date], index
+
+    async def _get_rows(self, dates, planned=None):
+        '''returns dict with ISO date: rows for ISO dates. Dates which are not
+        known to rate cache or rate store are requested from source
+
+        Keyword arguments:
+            planned -- result of _plan_rows(dates) if dates were looked up
+        '''
+        rows_by_date, missing, index = planned or self._plan_rows(dates)
+        if missing:
+            # dates skipped by as-of plan can be covered by windows
+            skipped = [d for d in dates if d not in rows_by_date and d not in missing]
+            fetched = await self._fetch_missing(missing, gaps=skipped)
+            self._put_stored(fetched)
+            rows_by_date.update(fetched)
+        return self._fill_asof(dates, rows_by_date, index)
+
+    def _fill_asof(self, dates, rows_by_date, index):
+        '''adds rows of dates to as-of index and fills dates without
+        publication with as-of rows (see _asof_rows())
+        '''
+        if index is None:
+            return rows_by_date
+        self._add_asof(rows_by_date, index)
+        failed = set(self._last_failed)
+        for d in dates:
+            if not rows_by_date.get(d) and d not in failed:
+                rows = self._asof_rows(d, d in rows_by_date, index, failed)
+                if rows:
+                    rows_by_date[d] = rows
+        return rows_by_date
+
+    @staticmethod
+    def _add_asof(rows_by_date, index):
+        '''adds rows received for ISO dates to as-of index'''
+        if index is not None:
+            index.add(
+                (r for rows in rows_by_date.values() for r in rows),
+                checked=rows_by_date,
+            )
+
+    def _asof_rows(self, exdate, requested, index, failed):
+        '''returns list with as-of row of ISO date without own rows. Date
+        which was not requested (see AsOfIndex.plan()) and is not covered by
+        as-of value, because date it follows has failed, is added to failed
+        dates (and to failed set)
         '''
+        if not requested and not index.covers(exdate):
+            failed.add(exdate)
+            self._last_failed.append(exdate)
+            return []
+        # dates without publication get as-of row of requested date
+        row = index.get_row(exdate)
+        return [] if row is None else [row]
+
+    async def _fetch_missing(self, dates, basecur=None, gaps=()):
+        '''requests source for ISO dates: runs of consecutive dates by window
+        requests if source supports them (config 'url_range'), other dates
+        one request per date
+        Returns: dict with ISO date: list of rows for successful responses
 
-        # initiate dates generator
-        dates_gen = self.split_dates(
-            self.exratedate, self.df, self._source_config['dateformat'], self.daysadd
+        Keyword arguments:
+            basecur -- base currency requested, self.basecur if None
+            gaps -- ISO dates which are not needed, but can be part of window
+                (see _plan_windows()). They are not failed if window fails
+        '''
+        requests = self._plan_requests(dates, basecur, gaps=gaps)
+        needed = set(dates)
+        responses = await self._get_api_responses(
+            [r.url for r in requests],
+            self._source_config['max_connections'],
+            keep_failed=True,
         )
+        fetched = {}
+        for request, response in zip(requests, responses, strict=True):
+            if response is None:
+                self._last_failed.extend(d for d in request.dates if d in needed)
+                continue
+            fetched.update(
+                self._group_rows(
+                    request, self._map_response([response], self._get_mapper(request))
+                )
+            )
+        return fetched
+
+    def _plan_requests(self, dates, basecur=None, url_all=False, gaps=()):
+        '''plans requests of ISO dates: windows of consecutive dates (see
+        _plan_windows()) and other dates one request per date
+        Returns: list of Request namedtuples
+
+        Keyword arguments:
+            basecur -- base currency used in urls, self.basecur if None
+            url_all -- if True then every date is requested for all
+                currencies (config 'url_all'), windows are not used
+            gaps -- ISO dates windows can span (see _plan_windows())
+        '''
+        source = self._source_config
+        if url_all:
+            windows, single, url = [], list(dates), source['url_all']
+        else:
+            windows, single = self._plan_windows(dates, gaps)
+            url = source['url']
+        with instrument.span('build_urls', source=self.exratesrc, dates=len(dates)):
+            requests = [
+                Request(
+                    self._build_url(source['url_range'], w[0], basecur, date_to=w[-1]),
+                    w,
+                    True,
+                )
+                for w in windows
+            ]
+            requests.extend(
+                Request(self._build_url(url, d, basecur), [d], False) for d in single
+            )
+        return requests
+
+    def _get_mapper(self, request):
+        '''returns mapper method name of Request'''
+        source = self._source_config
+        return source['range_mapper'] if request.window else source['field_mapper']
+
+    @staticmethod
+    def _group_rows(request, rows):
+        '''returns dict with ISO date: rows for dates of Request. Rows of
+        single date response belong to requested date, rows of window
+        response to their own dates (rows of other dates are dropped)
+        '''
+        if not request.window:
+            return {request.dates[0]: rows}
+        rows_by_date = {d: [] for d in request.dates}
+        for exrate in rows:
+            if exrate.exdate in rows_by_date:
+                rows_by_date[exrate.exdate].append(exrate)
+        return rows_by_date
+
+    def _plan_windows(self, dates, gaps=()):
+        '''splits ISO dates into windows of consecutive dates (at most
+        max_window dates each) and dates requested one by one
+        Returns: (list of windows (lists of ISO dates), list of ISO dates)
 
-        # build api url list for dates provided
-        urls = (
-            self._source_config['url'].format(
-                exdate=d, localcur=self.localcur, basecur=self.basecur
+        Keyword arguments:
+            gaps -- ISO dates which are not needed, but join runs of dates
+                around them (e.g. rest days skipped by as-of plan). Windows
+                include gaps inside them, but never start or end with gap
+        '''
+        source = self._source_config
+        if not source.get('url_range'):
+            return [], list(dates)
+        min_window, max_window = source.get('min_window', 2), source['max_window']
+        gaps = set(gaps).difference(dates)
+        windows, single, run = [], [], []
+        for exdate in sorted(gaps.union(dates)) + [None]:
+            if exdate is not None and (
+                not run
+                or date.fromisoformat(exdate).toordinal()
+                == date.fromisoformat(run[-1]).toordinal() + 1
+            ):
+                run.append(exdate)
+                continue
+            run = _strip_gaps(run, gaps)
+            if len(run) < min_window:
+                single.extend(d for d in run if d not in gaps)
+            else:
+                for i in range(0, len(run), max_window):
+                    window = _strip_gaps(run[i : i + max_window], gaps)
+                    if window:
+                        windows.append(window)
+            run = [exdate]
+        return windows, single
+
+    def _get_asof_index(self, basecur=None):
+        '''returns as-of index of series or None if it is disabled'''
+        if self.asof is True:
+            return asof.get_shared_index(
+                *self._store_key(basecur),
+                self._source_config.get('rest_weekdays', ()),
             )
-            for d in dates_gen
+        return None if self.asof is False else self.asof
+
+    def iter_exch_rate(self, ordered=False, buffer_size=None):
+        '''Get currency exchange rate from selected source, date(s)
+        Returns: iterator of namedtuple instances (same as get_exch_rate())
+
+        Synchronous wrapper around aiter_exch_rate(). If all dates are found
+        in rate cache or rate store then client is not used
+        '''
+        dates = list(self.split_dates(self.exratedate, self.df, daysadd=self.daysadd))
+        rows_by_date, missing, index = planned = self._plan_rows(dates)
+        if not missing:
+            rows_by_date = self._fill_asof(dates, rows_by_date, index)
+            for d in dates:
+                yield from rows_by_date.get(d, ())
+            return
+
+        client = self._get_client()
+        agen = self._aiter_rows(dates, planned, ordered, buffer_size)
+        try:
+            while True:
+                try:
+                    yield client.run_sync(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            client.run_sync(agen.aclose())
+
+    def aiter_exch_rate(self, ordered=False, buffer_size=None):
+        '''Get currency exchange rate from selected source, date(s)
+        Returns: async iterator of namedtuple instances (same as
+        get_exch_rate()). Dates are requested as planned by get_exch_rate()
+        (windows, as-of plan), rows are mapped and yielded as soon as
+        response for their dates arrives, _last_result is not updated
+
+        Keyword arguments:
+            ordered -- if True then rows are yielded in order of dates,
+                otherwise in order of responses arrival (dates answered by
+                as-of value last)
+            buffer_size -- maximum number of requests sent but not yielded
+                yet. Defaults to twice max_connections of source
+        '''
+
+        dates = list(self.split_dates(self.exratedate, self.df, daysadd=self.daysadd))
+        return self._aiter_rows(dates, self._plan_rows(dates), ordered, buffer_size)
+
+    async def _aiter_rows(self, dates, planned, ordered, buffer_size):
+        '''yields rows of dates: stored rows and rows of requests planned for
+        missing dates as their responses arrive (see aiter_exch_rate())
+
+        Positional arguments:
+            dates -- ISO dates
+            planned -- result of _plan_rows(dates)
+        '''
+        rows_by_date, missing, index = planned
+        skipped = [d for d in dates if d not in rows_by_date and d not in missing]
+        queue = _RequestQueue(
+            self,
+            self._plan_requests(missing, gaps=skipped),
+            set(missing),
+            buffer_size or 2 * self._source_config['max_connections'],
+        )
+        self._add_asof(rows_by_date, index)
+        aiter_rows = self._aiter_ordered if ordered else self._aiter_unordered
+        try:
+            async for exrate in aiter_rows(dates, rows_by_date, queue, index):
+                yield exrate
+        finally:
+            queue.cancel()
+
+    async def _aiter_ordered(self, dates, rows_by_date, queue, index):
+        '''yields rows of dates in order of dates (see _aiter_rows())'''
+        # request position: [result, number of its dates not yielded]
+        results = {}
+        failed = set()
+        for d in dates:
+            i = queue.request_of.get(d)
+            if i is not None:
+                if i not in results:
+                    result = await queue.result(i)
+                    self._add_asof(result or {}, index)
+                    results[i] = [result, len(queue.requests[i].dates)]
+                result = results[i][0]
+                results[i][1] -= 1
+                if not results[i][1]:
+                    del results[i]
+                if result is None:
+                    continue
+                rows_by_date[d] = result[d]
+            queue.start()
+            for exrate in self._date_rows(d, rows_by_date, index, failed):
+                yield exrate
+
+    async def _aiter_unordered(self, dates, rows_by_date, queue, index):
+        '''yields rows of dates in order of responses arrival, dates without
+        own rows are yielded last (see _aiter_rows())
+        '''
+        deferred = []
+        for d in dates:
+            if rows_by_date.get(d):
+                for exrate in rows_by_date.pop(d):
+                    yield exrate
+            elif d not in queue.request_of:
+                deferred.append(d)
+        async for exrate in self._aiter_answered(queue, index, rows_by_date, deferred):
+            yield exrate
+
+        # as-of rows need all earlier dates received
+        failed = set()
+        for d in sorted(deferred):
+            for exrate in self._date_rows(d, rows_by_date, index, failed):
+                yield exrate
+
+    async def _aiter_answered(self, queue, index, rows_by_date, deferred):
+        '''yields rows of requests as they are answered. Dates of answered
+        requests without rows are marked in rows_by_date and added to
+        deferred dates
+        '''
+        while True:
+            answered = await queue.next_result()
+            if answered is None:
+                return
+            request, result = answered
+            if result is None:
+                continue
+            self._add_asof(result, index)
+            for d in request.dates:
+                for exrate in result[d]:
+                    yield exrate
+                if not result[d]:
+                    rows_by_date[d] = []
+                    deferred.append(d)
+
+    def _date_rows(self, exdate, rows_by_date, index, failed):
+        '''pops rows of ISO date from rows_by_date. Date without own rows gets
+        as-of row (see _asof_rows())
+        '''
+        requested = exdate in rows_by_date
+        rows = rows_by_date.pop(exdate, None)
+        if rows or index is None:
+            return rows or []
+        return self._asof_rows(exdate, requested, index, failed)
+
+    async def _fetch_request(self, request, needed, deadline=None):
+        '''requests source for Request and saves mapped rows to rate store
+        Returns: dict with ISO date: rows for dates of request or None if
+        response is unsuccessful (needed dates are added to failed dates)
+        '''
+        client = self._get_client()
+        response = await _get_api_response(
+            request.url,
+            client,
+            client.get_scheduler(request.url, self._source_config['max_connections']),
+            deadline,
+        )
+        if response is None or not response.is_success:
+            self._last_failed.extend(d for d in request.dates if d in needed)
+            return None
+        rows_by_date = self._group_rows(
+            request, self._map_response([response.text], self._get_mapper(request))
         )
+        self._put_stored(rows_by_date)
+        return rows_by_date
 
-        # collect responses
-        responses = self._get_api_responses(
-            urls, self._source_config['max_connections']
+    async def _fetch_date(self, exdate, deadline=None):
+        '''requests source for single ISO date and saves mapped rows
+        Returns: list of rows or None if response is unsuccessful
+        '''
+        request = Request(
+            self._build_url(self._source_config['url'], exdate), [exdate], False
         )
+        rows_by_date = await self._fetch_request(request, {exdate}, deadline)
+        return None if rows_by_date is None else rows_by_date[exdate]
+
+    def get_multi_exch_rate(self, basecurs, as_series=False):
+        '''Get exchange rates of several base currencies
+        Returns: list of namedtuple instances with exchange rates
+
+        Synchronous wrapper around aget_multi_exch_rate()
+        '''
+        return self._get_client().run_sync(
+            self.aget_multi_exch_rate(basecurs, as_series)
+        )
+
+    async def aget_multi_exch_rate(self, basecurs, as_series=False):
+        '''Get exchange rates of several base currencies for selected source,
+        date(s) and local currency.
+        Returns: list of namedtuple instances (same as get_exch_rate()) ordered
+        by date and then by basecurs order
+
+        If source config has 'url_all' then single request per date is made
+        for all currencies, otherwise every currency is requested separately
+
+        Positional arguments:
+            basecurs -- sequence of ISO 4217 literal base currency codes.
+                If None then rates of all currencies published by source are
+                requested (source config must have 'url_all')
+
+        Keyword arguments:
+            as_series -- if True then rateseries.RateSeries is returned
+        '''
+        if basecurs is None:
+            return await self._aget_all_exch_rate(as_series)
+
+        dates = list(self.split_dates(self.exratedate, self.df, daysadd=self.daysadd))
+        self._last_failed = []
+        basecurs = list(dict.fromkeys(basecurs))
+        stored = {cur: self._get_stored(dates, cur) for cur in basecurs}
+
+        url_all = self._source_config.get('url_all')
+        if url_all is not None:
+            # one request per date which is missing for any currency
+            missing = [d for d in dates if any(d not in stored[c] for c in basecurs)]
+            fetched = await self._fetch_dates(missing, url_all) if missing else {}
+            for cur, rows_by_date in self._split_by_currency(fetched, basecurs).items():
+                stored[cur].update(rows_by_date)
+                self._put_stored(rows_by_date, cur)
+        else:
+            import asyncio
+
+            # currencies are requested concurrently
+            await asyncio.gather(
+                *(self._fetch_currency(dates, stored[cur], cur) for cur in basecurs)
+            )
 
-        # map responses and return result
-        self._last_result = self._map_response(responses)
+        self._last_result = [
+            exrate
+            for d in dates
+            for cur in basecurs
+            for exrate in stored[cur].get(d, ())
+        ]
+        if as_series:
+            self._last_result = RateSeries.from_rows(self._last_result)
 
         return self._last_result
 
-    def _map_response(self, response):
-        '''call method according to exchange source'''
+    async def _fetch_currency(self, dates, stored, basecur):
+        '''requests dates missing in stored (dict with ISO date: rows) for
+        base currency, saves them to rate store and adds them to stored
+        '''
+        missing = [d for d in dates if d not in stored]
+        if missing:
+            fetched = await self._fetch_dates(
+                missing, self._source_config['url'], basecur
+            )
+            self._put_stored(fetched, basecur)
+            stored.update(fetched)
+
+    def _split_by_currency(self, fetched, basecurs):
+        '''splits all currency responses (dict with ISO date: rows) between
+        base currencies
+        Returns: dict with basecur: dict with ISO date: rows
+        '''
+        num_codes = {self._ccy_codes.get(cur, -1): cur for cur in basecurs}
+        by_cur = {cur: {d: [] for d in fetched} for cur in basecurs}
+        for d, rows in fetched.items():
+            for exrate in rows:
+                cur = num_codes.get(exrate.basecur)
+                if cur is not None:
+                    by_cur[cur][d].append(exrate)
+        return by_cur
+
+    async def _aget_all_exch_rate(self, as_series=False):
+        '''Get exchange rates of all currencies published by source with single
+        url_all request per date. Rows are saved to rate cache and rate store
+        of every currency, but are not looked up there, as set of currencies
+        published is not known in advance
+        '''
+        url_all = self._source_config.get('url_all')
+        if url_all is None:
+            raise ValueError('Source {} has no all currency url'.format(self.exratesrc))
+        dates = list(self.split_dates(self.exratedate, self.df, daysadd=self.daysadd))
+        self._last_failed = []
+        fetched = await self._fetch_dates(dates, url_all)
+
+        char_codes = config.get_ccy_index().char_codes
+        by_cur = {}
+        for d, rows in fetched.items():
+            for exrate in rows:
+                cur = char_codes.get(exrate.basecur)
+                by_cur.setdefault(cur, {}).setdefault(d, []).append(exrate)
+        for cur, rows_by_date in by_cur.items():
+            if cur is not None:
+                self._put_stored(rows_by_date, cur)
+
+        self._last_result = [r for d in dates for r in fetched.get(d, ())]
+        if as_series:
+            self._last_result = RateSeries.from_rows(self._last_result)
+        return self._last_result
+
+    async def _fetch_dates(self, dates, url, basecur=None):
+        '''requests source for ISO dates using url template
+        Returns: dict with ISO date: list of rows for successful responses
+
+        Positional arguments:
+            dates -- list of ISO dates
+            url -- url template from source config
+
+        Keyword arguments:
+            basecur -- base currency used in url, self.basecur if None
+        '''
+        with instrument.span('build_urls', source=self.exratesrc, dates=len(dates)):
+            urls = [self._build_url(url, d, basecur) for d in dates]
+
+        # collect responses, failed ones are None
+        responses = await self._get_api_responses(
+            urls, self._source_config['max_connections'], keep_failed=True
+        )
+
+        # map responses of each date separately to keep track of them
+        fetched = {
+            d: self._map_response([response])
+            for d, response in zip(dates, responses, strict=True)
+            if response is not None
+        }
+        self._last_failed.extend(
+            d for d in dates if d not in fetched and d not in self._last_failed
+        )
+        return fetched
+
+    def _build_url(self, url, exdate, basecur=None, date_to=None):
+        '''returns url for ISO date (or window of dates from exdate to
+        date_to) built from url template
+        '''
+        df = self._source_config['dateformat']
+        exdate = datetime.strptime(exdate, '%Y-%m-%d').strftime(df)
+        return url.format(
+            exdate=exdate,
+            date_from=exdate,
+            date_to=date_to and datetime.strptime(date_to, '%Y-%m-%d').strftime(df),
+            localcur=self.localcur,
+            basecur=basecur or self.basecur,
+        )
+
+    def _store_key(self, basecur=None):
+        '''returns (sourceid, basecur, localcur) key used in rate store'''
+        return (
+            self._source_config['id'],
+            self._ccy_codes.get(basecur or self.basecur, -1),
+            self._ccy_codes.get(self.localcur, -1),
+        )
+
+    def _get_stored(self, dates, basecur=None):
+        '''returns dict with ISO date: rows for dates found in rate cache
+        or rate store. Rows found in store only are put into cache
+        '''
+        key = self._store_key(basecur)
+        result = {} if self.cache is None else self.cache.get_many(*key, dates)
+        instrument.count('cache.hits', len(result), source=self.exratesrc)
+        if self.store is not None and len(result) < len(dates):
+            stored = {
+                d: [self.EXRATE_TEMPLATE._make(row) for row in rows]
+                for d, rows in self.store.get_many(
+                    *key, [d for d in dates if d not in result]
+                ).items()
+            }
+            if self.cache is not None and stored:
+                self.cache.put_many(*key, stored)
+            instrument.count('store.hits', len(stored), source=self.exratesrc)
+            result.update(stored)
+        return result
+
+    def _put_stored(self, rows_by_date, basecur=None):
+        '''saves rows received for ISO dates to rate cache and rate store'''
+        if not rows_by_date:
+            return
+        key = self._store_key(basecur)
+        if self.cache is not None:
+            self.cache.put_many(*key, rows_by_date)
+        if self.store is not None:
+            self.store.put_many(*key, rows_by_date)
+
+    def _map_response(self, response, mapper=None):
+        '''call method according to exchange source (or mapper method name)'''
 
         def map_not_found():
             raise ValueError('map function in config is not found')
 
-        return getattr(self, self._source_config['field_mapper'], map_not_found)(
-            response
+        mapper = getattr(
+            self, mapper or self._source_config['field_mapper'], map_not_found
         )
+        with instrument.span('map', source=self.exratesrc) as span:
+            rows = mapper(response)
+            span.set(rows=len(rows))
+        instrument.count('rows.mapped', len(rows), source=self.exratesrc)
+        return rows
 
     def _map_nbu_gov_ua(self, response):
         '''Maps json from NBU.gov.ua exchange rate source
-        Returns: list of OrderedDict instances with data
+        Returns: list of namedtuple instances with data
 
         Positional arguments (expected):
             responses -- response from NBU WS
         '''
         _source_id = self._source_config['id']
-
-        def json_object_hook(r):
-            '''json object hook for mapping NBU data'''
-
-            return self.EXRATE_TEMPLATE(
-                _source_id,
-                datetime.strptime(r['exchangedate'], '%d.%m.%Y').date().isoformat(),
-                980,
-                r['r030'],
-                r['rate'],
-            )
-
         return [
             exrate
             for _ in response
-            for exrate in json.loads(_, object_hook=json_object_hook)
-            if exrate
+            for exrate in mappers.map_nbu_gov_ua(_, _source_id, self._ccy_codes)
         ]
 
     def _map_ecb_fixer(self, response):
         '''Maps json from fixer.io exchange rate source
-        Returns: list of OrderedDict instances with data
+        Returns: list of namedtuple instances with data
 
         Positional arguments (expected):
             responses -- response from ECB WS
         '''
+        _source_id = self._source_config['id']
+        return [
+            exrate
+            for _ in response
+            for exrate in mappers.map_ecb_fixer(_, _source_id, self._ccy_codes)
+        ]
 
-        _source_id, _ccy_codes = (self._source_config['id'], self._ccy_codes)
-
-        def json_object_hook(r):
-            '''json object hook for mapping ECB Fixer data'''
-
-            rates = r.get('rates', None)
-            # Apply transform only if json is full
-            if rates is not None:
-                return [
-                    self.EXRATE_TEMPLATE(
-                        _source_id,
-                        datetime.strptime(r['date'], '%Y-%m-%d').date().isoformat(),
-                        _ccy_codes[cur],
-                        _ccy_codes[r['base']],
-                        rate,
-                    )
-                    for cur, rate in rates.iteritems()
-                ]
-            else:
-                return r
+    def _map_nbu_gov_ua_range(self, response):
+        '''Maps json from NBU.gov.ua period endpoint
+        Returns: list of namedtuple instances with data
+        '''
+        _source_id = self._source_config['id']
+        return [
+            exrate
+            for _ in response
+            for exrate in mappers.map_nbu_gov_ua_range(_, _source_id)
+        ]
 
+    def _map_ecb_fixer_timeseries(self, response):
+        '''Maps json from fixer.io timeseries endpoint
+        Returns: list of namedtuple instances with data
+        '''
+        _source_id = self._source_config['id']
         return [
             exrate
             for _ in response
-            for exrate in json.loads(_, object_hook=json_object_hook)
-            if exrate
+            for exrate in mappers.map_ecb_fixer_timeseries(
+                _, _source_id, self._ccy_codes
+            )
         ]
 
     @staticmethod
@@ -262,22 +894,153 @@ class UnknownSourceError(ValueError):
     pass
 
 
-async def _get_api_response(url, client, sem):
+def _get_default_client():
+    '''returns client shared within process. Client module (and httpx) is
+    imported on first call
+    '''
+    from . import client as rateclient
+
+    return rateclient.get_default_client()
+
+
+class _RequestQueue:
+    '''Requests of dates streamed by ExchangeRateParse._aiter_rows()
+
+    Constructor
+    _RequestQueue(parse, requests, needed, limit)
+
+    parse -- ExchangeRateParse requests are made by
+    requests -- list of Request namedtuples in order they are sent
+    needed -- set of ISO dates which are failed if their request fails
+    limit -- maximum number of requests sent but not consumed
+    '''
+
+    def __init__(self, parse, requests, needed, limit):
+        self.parse = parse
+        self.requests = requests
+        self.needed = needed
+        self.limit = limit
+        # ISO date: position of request answering it
+        self.request_of = {d: i for i, r in enumerate(requests) for d in r.dates}
+        self._unsent = deque(range(len(requests)))
+        # request position: task of request sent and not consumed
+        self._tasks = {}
+        self._deadline = None
+
+    def start(self, position=None):
+        '''sends requests up to limit (and request at position)'''
+        if position is not None and position in self._unsent:
+            self._unsent.remove(position)
+            self._send(position)
+        while self._unsent and len(self._tasks) < self.limit:
+            self._send(self._unsent.popleft())
+
+    def _send(self, position):
+        import asyncio
+
+        if not self._tasks and self._deadline is None:
+            self._deadline = _get_deadline(self.parse._get_client())
+        self._tasks[position] = asyncio.ensure_future(
+            self.parse._fetch_request(
+                self.requests[position], self.needed, self._deadline
+            )
+        )
+
+    async def result(self, position):
+        '''returns result of request at position (see
+        ExchangeRateParse._fetch_request()), request is consumed
+        '''
+        self.start(position)
+        return await self._tasks.pop(position)
+
+    async def next_result(self):
+        '''returns (Request, result) of next request answered or None if all
+        requests are consumed
+        '''
+        import asyncio
+
+        self.start()
+        if not self._tasks:
+            return None
+        done, _ = await asyncio.wait(
+            self._tasks.values(), return_when=asyncio.FIRST_COMPLETED
+        )
+        position = next(i for i, task in self._tasks.items() if task in done)
+        return self.requests[position], self._tasks.pop(position).result()
+
+    def cancel(self):
+        '''cancels requests which are not consumed'''
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._unsent.clear()
+
+
+def _strip_gaps(run, gaps):
+    '''returns run of ISO dates without gap dates at its start and end'''
+    start, stop = 0, len(run)
+    while start < stop and run[start] in gaps:
+        start += 1
+    while stop > start and run[stop - 1] in gaps:
+        stop -= 1
+    return run[start:stop]
+
+
+def _get_deadline(client):
+    '''returns event loop time when client deadline is reached or None'''
+    if client.deadline is None:
+        return None
+    import asyncio
+
+    return asyncio.get_running_loop().time() + client.deadline
+
+
+async def _get_api_response(url, client, scheduler, deadline=None):
     '''generates requests and make calls to API
 
     I/O function. Can be updated to use different http client
 
     Return type:
-        list with texts of responses
+        httpx.Response or None if request failed with exception
     '''
 
-    async with sem:
-        return await client.get(url)
+    # concurrent requests of same url are shared (see client.get_coalesced)
+    return await client.get_coalesced(
+        url, lambda: scheduler.request(client.get, url, deadline)
+    )
+
+
+async def get_api_responses(urls, max_connections=10, keep_failed=False, client=None):
+    '''makes concurrent calls to API for all urls
+
+    Requests are scheduled by adaptive scheduler of url host (see scheduler
+    module), which starts with max_connections concurrent requests and
+    retries failed ones
 
+    Keyword arguments:
+        max_connections -- initial number of concurrent requests
+        keep_failed -- if True then None is returned in place of unsuccessful
+            response, so result positions match urls
+        client -- client.RateClient used for requests. If None then client
+            shared within process is used
 
-async def get_api_responses(urls, max_connections=10):
-    sem = asyncio.Semaphore(max_connections)
-    async with httpx.AsyncClient(timeout=10) as client:
-        futures = [_get_api_response(url, client, sem) for url in urls]
-        responses = await asyncio.gather(*futures)
-    return [response.text for response in responses if response.is_success]
+    Return type:
+        list with texts of responses
+    '''
+    import asyncio
+
+    client = client or _get_default_client()
+    deadline = _get_deadline(client)
+    futures = [
+        _get_api_response(
+            url, client, client.get_scheduler(url, max_connections), deadline
+        )
+        for url in urls
+    ]
+    texts = [
+        response.text if response is not None and response.is_success else None
+        for response in await asyncio.gather(*futures)
+    ]
+    if keep_failed:
+        return texts
+    return [text for text in texts if text is not None]
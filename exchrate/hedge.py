@@ -0,0 +1,253 @@
+'''
+Module has hedged fetching of exchange rates from several sources.
+
+HedgedExchangeRateParse requests every date from primary source and, if no
+response arrives within latency budget (or primary fails), sends hedge
+request to next source covering the currency pair. First valid answer wins:
+it is mapped by field_mapper of its source and rows carry sourceid of that
+source. Requests still running are cancelled.
+
+Primary is picked by LatencyTracker, which keeps smoothed latency of every
+source, so sources are ranked by their recent latency. Latency budget is
+smoothed latency plus 4 times its smoothed deviation (about 95th percentile)
+unless fixed hedge_after is given:
+    e = HedgedExchangeRateParse(None, ('2016-12-01', '2016-12-31'), 'USD', 'EUR')
+    rows = e.get_exch_rate()
+'''
+
+import asyncio
+import time
+
+from . import config
+from .exrateparse import ExchangeRateParse, UnknownSourceError
+from .rateseries import RateSeries
+
+
+class LatencyTracker:
+    '''Per source latency statistics used for picking primary source
+
+    Constructor
+    LatencyTracker(default_latency, min_budget, alpha)
+
+    default_latency -- expected latency of source without statistics
+    min_budget -- minimum latency budget in seconds
+    alpha -- weight of new latency in smoothed values
+
+    Counters are available in attributes:
+        hedges -- number of hedge requests sent
+        wins -- dict with source: number of answers which won
+    '''
+
+    def __init__(self, default_latency=1.0, min_budget=0.05, alpha=0.2):
+        self.default_latency = default_latency
+        self.min_budget = min_budget
+        self.alpha = alpha
+        # source: (smoothed latency, smoothed absolute deviation)
+        self._stats = {}
+        self.hedges = 0
+        self.wins = {}
+
+    def record(self, exratesrc, latency, ok=True, censored=False):
+        '''adds latency of request to source. Failed requests count as twice
+        as slow as they took, so failing source is not kept as primary.
+        Latency of cancelled request (censored) is lower bound of real one, so
+        it only counts when it is over smoothed latency of source
+        '''
+        if not ok:
+            latency *= 2
+        stats = self._stats.get(exratesrc)
+        if censored and stats is not None:
+            latency = max(latency, stats[0])
+        if stats is None:
+            self._stats[exratesrc] = (latency, latency / 2)
+            return
+        mean, dev = stats
+        a = self.alpha
+        self._stats[exratesrc] = (
+            (1 - a) * mean + a * latency,
+            (1 - a) * dev + a * abs(latency - mean),
+        )
+
+    def expected(self, exratesrc):
+        '''returns smoothed latency of source'''
+        stats = self._stats.get(exratesrc)
+        return self.default_latency if stats is None else stats[0]
+
+    def budget(self, exratesrc):
+        '''returns seconds to wait for source before sending hedge request'''
+        stats = self._stats.get(exratesrc)
+        if stats is None:
+            return self.default_latency
+        return max(self.min_budget, stats[0] + 4 * stats[1])
+
+    def rank(self, exratesrcs):
+        '''returns sources ordered by expected latency (stable)'''
+        return sorted(exratesrcs, key=self.expected)
+
+
+# tracker shared by all hedged parsers within process
+shared_tracker = LatencyTracker()
+
+
+class HedgedExchangeRateParse:
+    '''Exchange rate parsing from several sources with hedged requests
+
+    Constructor
+    HedgedExchangeRateParse(exratesrcs, exratedate, basecur, localcur,
+        hedge_after, tracker, **kwargs)
+
+    exratesrcs -- source codes. If None then all sources publishing rates
+        of currency pair are used (config.get_pair_sources())
+    exratedate, basecur, localcur -- same as ExchangeRateParse arguments
+    hedge_after -- seconds to wait before hedge request. If None then
+        latency budget of primary source (see LatencyTracker) is used
+    tracker -- LatencyTracker. If None then tracker shared within process
+        is used
+    kwargs -- other ExchangeRateParse constructor arguments (daysadd, df,
+        store, cache, client)
+
+    For getting exchange rate use method:
+        get_exch_rate() or coroutine aget_exch_rate()
+
+    Last result and dates which could not be received are stored in:
+        _last_result, _last_failed
+    '''
+
+    def __init__(
+        self,
+        exratesrcs,
+        exratedate,
+        basecur,
+        localcur,
+        hedge_after=None,
+        tracker=None,
+        **kwargs,
+    ):
+        if exratesrcs is None:
+            exratesrcs = config.get_pair_sources(basecur, localcur)
+        if not exratesrcs:
+            raise UnknownSourceError(
+                'No source publishes {}/{} rates'.format(basecur, localcur)
+            )
+        self.parsers = {
+            src: ExchangeRateParse(src, exratedate, basecur, localcur, **kwargs)
+            for src in exratesrcs
+        }
+        self.exratedate = exratedate
+        self.hedge_after = hedge_after
+        self.tracker = shared_tracker if tracker is None else tracker
+        self._last_result = []
+        self._last_failed = []
+
+    def get_exch_rate(self, as_series=False):
+        '''Get currency exchange rate from fastest source
+        Returns: list of namedtuple instances with exchange rates
+
+        Synchronous wrapper around aget_exch_rate()
+        '''
+        parser = next(iter(self.parsers.values()))
+        return parser._get_client().run_sync(self.aget_exch_rate(as_series))
+
+    async def aget_exch_rate(self, as_series=False):
+        '''Get currency exchange rate from fastest source
+        Returns: list of namedtuple instances with exchange rates (same as
+        ExchangeRateParse.aget_exch_rate()), sourceid of every row is id of
+        source which answered
+        '''
+        first = next(iter(self.parsers.values()))
+        dates = list(
+            first.split_dates(self.exratedate, first.df, daysadd=first.daysadd)
+        )
+
+        # rates already known to any source are not requested
+        rows_by_date = {}
+        for src in self.tracker.rank(self.parsers):
+            missing = [d for d in dates if d not in rows_by_date]
+            if not missing:
+                break
+            rows_by_date.update(self.parsers[src]._get_stored(missing))
+
+        missing = [d for d in dates if d not in rows_by_date]
+        fetched = await asyncio.gather(*(self._fetch_hedged(d) for d in missing))
+        self._last_failed = [
+            d for d, rows in zip(missing, fetched, strict=True) if rows is None
+        ]
+        rows_by_date.update(
+            (d, rows)
+            for d, rows in zip(missing, fetched, strict=True)
+            if rows is not None
+        )
+
+        self._last_result = [r for d in dates for r in rows_by_date.get(d, ())]
+        if as_series:
+            self._last_result = RateSeries.from_rows(self._last_result)
+        return self._last_result
+
+    async def _fetch_hedged(self, exdate):
+        '''requests date from sources in order of expected latency, next
+        source is requested when budget of previous one is exceeded or it
+        fails
+        Returns: rows of first non-empty answer, [] if all answers are empty
+        or None if all requests failed
+        '''
+        ranked = self.tracker.rank(self.parsers)
+        pending = {}
+        result = None
+        try:
+            for i, src in enumerate(ranked):
+                if i:
+                    self.tracker.hedges += 1
+                pending[asyncio.ensure_future(self._timed_fetch(src, exdate))] = src
+                budget = self.hedge_after
+                if budget is None:
+                    budget = self.tracker.budget(src)
+                last = i == len(ranked) - 1
+                rows = await self._wait_answer(pending, None if last else budget)
+                if rows:
+                    return rows
+                if rows is not None:
+                    result = []
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _wait_answer(self, pending, timeout):
+        '''waits for first valid answer of pending requests (dict of task:
+        source) within timeout. Tasks finished are removed from pending
+        Returns: rows of valid answer, [] if answer is empty or None if
+        timeout is exceeded or requests failed
+        '''
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        result = None
+        while pending:
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=None if deadline is None else max(0, deadline - loop.time()),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                src = pending.pop(task)
+                rows = task.result()
+                if rows:
+                    self.tracker.wins[src] = self.tracker.wins.get(src, 0) + 1
+                    return rows
+                if rows is not None:
+                    result = []
+            if deadline is not None:
+                # budget is exceeded or answer is not valid, hedge now
+                break
+        return result
+
+    async def _timed_fetch(self, exratesrc, exdate):
+        '''requests date from source and records its latency'''
+        started = time.perf_counter()
+        try:
+            rows = await self.parsers[exratesrc]._fetch_date(exdate)
+        except asyncio.CancelledError:
+            # answer lost to other source, it took at least that long
+            self.tracker.record(exratesrc, time.perf_counter() - started, censored=True)
+            raise
+        self.tracker.record(exratesrc, time.perf_counter() - started, rows is not None)
+        return rows
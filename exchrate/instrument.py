@@ -0,0 +1,203 @@
+'''
+Module has instrumentation hooks of fetch and map pipeline.
+
+Hook is callable receiving Event named tuples:
+    name -- event name, e.g. 'http.request'
+    kind -- 'span' (value is duration in seconds) or 'count' (value is
+        increment of counter)
+    value -- duration or increment
+    attrs -- dict with event attributes (url, status, rows etc.)
+
+Events emitted by package:
+    spans: build_urls, scheduler.wait, http.request, map
+    counters: requests, bytes, retries, failed, cache.hits, store.hits,
+        rows.mapped
+
+Hooks are registered process-wide:
+    collector = StatsCollector()
+    with collector:
+        e.get_exch_rate()
+    print(collector.summary())
+
+While no hook is registered span() returns shared no-op span and count()
+returns immediately, so instrumentation costs one list truth test.
+'''
+
+import bisect
+import threading
+import time
+from collections import namedtuple
+
+# instrumentation event passed to hooks
+Event = namedtuple('Event', 'name,kind,value,attrs')
+
+# registered hooks
+hooks = []
+
+# upper bounds of latency histogram buckets in seconds (1us .. ~134s)
+BUCKETS = tuple(1e-6 * 2**i for i in range(28))
+
+
+def add_hook(hook):
+    '''registers hook receiving all events'''
+    hooks.append(hook)
+
+
+def remove_hook(hook):
+    '''unregisters hook'''
+    hooks.remove(hook)
+
+
+def emit(name, kind, value, **attrs):
+    '''passes event to registered hooks'''
+    event = Event(name, kind, value, attrs)
+    for hook in hooks:
+        hook(event)
+
+
+def count(name, value=1, **attrs):
+    '''increments counter by value'''
+    if hooks:
+        emit(name, 'count', value, **attrs)
+
+
+def span(name, **attrs):
+    '''returns context manager timing its block as span event
+    Attributes known at the end of block are added by span.set(**attrs)
+    '''
+    if not hooks:
+        return _NOOP_SPAN
+    return _Span(name, attrs)
+
+
+class _Span:
+    '''timing span emitted on exit'''
+
+    __slots__ = ('name', 'attrs', '_started')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        emit(self.name, 'span', time.perf_counter() - self._started, **self.attrs)
+
+
+class _NoopSpan:
+    '''span used while no hook is registered'''
+
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class StatsCollector:
+    '''In-process collector of counters and span latency histograms
+
+    Collector is a hook: register it with add_hook() or use it as context
+    manager. Collected values are available in attributes:
+        counters -- dict with counter name: total
+        spans -- dict with span name: list of counts per BUCKETS bucket
+        totals -- dict with span name: (count, total seconds, max seconds)
+
+    For getting approximate percentile of span latency use method:
+        percentile(name, q)
+
+    For getting text summary use method:
+        summary()
+
+    Events can be emitted from several threads (e.g. RateClient used from
+    thread pool), values are updated under lock.
+    '''
+
+    def __init__(self):
+        self.counters = {}
+        self.spans = {}
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            if event.kind == 'count':
+                self.counters[event.name] = (
+                    self.counters.get(event.name, 0) + event.value
+                )
+                return
+            buckets = self.spans.get(event.name)
+            if buckets is None:
+                buckets = self.spans[event.name] = [0] * (len(BUCKETS) + 1)
+            buckets[bisect.bisect_left(BUCKETS, event.value)] += 1
+            n, total, top = self.totals.get(event.name, (0, 0.0, 0.0))
+            self.totals[event.name] = (
+                n + 1,
+                total + event.value,
+                max(top, event.value),
+            )
+
+    def __enter__(self):
+        add_hook(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        remove_hook(self)
+
+    def percentile(self, name, q):
+        '''returns upper bound of bucket with q-th percentile of span latency
+        (maximum latency for last bucket) or None if span was not seen
+        '''
+        with self._lock:
+            buckets = self.spans.get(name)
+            if buckets is None:
+                return None
+            buckets = list(buckets)
+            top = self.totals[name][2]
+        rank = q / 100 * sum(buckets)
+        seen = 0
+        for i, n in enumerate(buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(BUCKETS[i] if i < len(BUCKETS) else top, top)
+        return top
+
+    def summary(self):
+        '''returns text summary of counters and span latencies'''
+        with self._lock:
+            counters = sorted(self.counters.items())
+            totals = dict(self.totals)
+        lines = ['{:<16} {:>12}'.format(name, value) for name, value in counters]
+        if totals:
+            lines.append(
+                '{:<16} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+                    'span', 'count', 'avg ms', 'p50 ms', 'p99 ms', 'max ms'
+                )
+            )
+        for name in sorted(totals):
+            n, total, top = totals[name]
+            lines.append(
+                '{:<16} {:>8} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+                    name,
+                    n,
+                    1000 * total / n,
+                    1000 * self.percentile(name, 50),
+                    1000 * self.percentile(name, 99),
+                    1000 * top,
+                )
+            )
+        return '\n'.join(lines)
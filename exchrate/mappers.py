@@ -0,0 +1,121 @@
+'''
+Module has functions mapping JSON responses of exchange rate sources into
+rows of Exrate named tuple (ExchangeRateParse.EXRATE_TEMPLATE).
+
+Mapping functions are plain module functions (so they can be sent to other
+processes) with same signature:
+    map_<source>(payload, source_id, ccy_codes)
+
+    payload -- JSON text (str or bytes) of single response
+    source_id -- internal id of exchange rate source
+    ccy_codes -- mapping of ISO 4217 literal: numeric codes
+
+Responses are decoded without object hooks and dates are parsed once per
+distinct value. If `orjson` package is installed then it is used for
+decoding JSON, otherwise standard json module is used.
+'''
+
+import functools
+import json
+from collections import namedtuple
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# result output template
+Exrate = namedtuple('Exrate', 'sourceid,exdate,localcur,basecur,exrate')
+
+# JSON decoder used for responses
+loads = json.loads if orjson is None else orjson.loads
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_date(value, df):
+    '''returns ISO date for date string in dateformat df (cached)'''
+    return datetime.strptime(value, df).date().isoformat()
+
+
+def map_nbu_gov_ua(payload, source_id, ccy_codes=None):
+    '''Maps json from NBU.gov.ua exchange rate source
+    Returns: list of Exrate rows. Local currency is always 980 (UAH)
+
+    Expected payload: list of objects with keys r030, rate, exchangedate
+    '''
+    _parse_date = parse_date
+    return [
+        Exrate(
+            source_id,
+            _parse_date(r['exchangedate'], '%d.%m.%Y'),
+            980,
+            r['r030'],
+            r['rate'],
+        )
+        for r in loads(payload)
+    ]
+
+
+def map_ecb_fixer(payload, source_id, ccy_codes):
+    '''Maps json from fixer.io exchange rate source
+    Returns: list of Exrate rows. Unknown currency codes are mapped to -1
+
+    Expected payload: object with keys base, date, rates (currency: rate)
+    '''
+    r = loads(payload)
+    rates = r.get('rates')
+    if rates is None:
+        return []
+    exdate = parse_date(r['date'], '%Y-%m-%d')
+    basecur = ccy_codes.get(r['base'], -1)
+    return [
+        Exrate(source_id, exdate, ccy_codes.get(cur, -1), basecur, rate)
+        for cur, rate in rates.items()
+    ]
+
+
+def map_nbu_gov_ua_range(payload, source_id, ccy_codes=None):
+    '''Maps json from NBU.gov.ua period (exchange_site) endpoint
+    Returns: list of Exrate rows. Local currency is always 980 (UAH)
+
+    Expected payload: list of objects with keys r030, exchangedate and
+    rate_per_unit (or rate of `units` of currency)
+    '''
+    _parse_date = parse_date
+    return [
+        Exrate(
+            source_id,
+            _parse_date(r['exchangedate'], '%d.%m.%Y'),
+            980,
+            r['r030'],
+            r['rate_per_unit']
+            if 'rate_per_unit' in r
+            else r['rate'] / r.get('units', 1),
+        )
+        for r in loads(payload)
+    ]
+
+
+def map_ecb_fixer_timeseries(payload, source_id, ccy_codes):
+    '''Maps json from fixer.io timeseries endpoint
+    Returns: list of Exrate rows. Unknown currency codes are mapped to -1
+
+    Expected payload: object with keys base, rates (date: {currency: rate})
+    '''
+    r = loads(payload)
+    rates = r.get('rates')
+    if rates is None:
+        return []
+    basecur = ccy_codes.get(r['base'], -1)
+    return [
+        Exrate(
+            source_id,
+            parse_date(exdate, '%Y-%m-%d'),
+            ccy_codes.get(cur, -1),
+            basecur,
+            rate,
+        )
+        for exdate, day_rates in rates.items()
+        for cur, rate in day_rates.items()
+    ]
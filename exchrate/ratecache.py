@@ -0,0 +1,113 @@
+'''
+Module has process-wide in-memory cache for mapped exchange rates.
+
+Cache is shared by all ExchangeRateParse instances (unless other cache is
+passed to constructor), so identical queries from different instances are
+answered without requests to source. Entries are kept per
+(source id, date, base currency, local currency) key:
+    - rates for today and future dates can still be changed by the source,
+    so they expire after `ttl` seconds
+    - rates for historical dates are kept until evicted as least recently
+    used when cache exceeds `maxsize` entries
+'''
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+
+class RateCache:
+    '''Bounded thread-safe LRU cache of mapped exchange rate rows
+
+    Constructor
+    RateCache(maxsize, ttl)
+
+    maxsize -- maximum number of (source, date, currency pair) entries
+    ttl -- seconds to keep entries for today and future dates
+
+    Has same lookup methods as rate stores:
+        get_many(sourceid, basecur, localcur, exdates)
+        put_many(sourceid, basecur, localcur, rows_by_date)
+
+    Counters are available in attributes and via stats():
+        hits, misses, evictions
+    '''
+
+    def __init__(self, maxsize=100000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, sourceid, basecur, localcur, exdates):
+        '''returns dict with exdate: tuple of rows for cached dates
+
+        Positional arguments:
+            sourceid -- internal id of exchange rate source
+            basecur -- requested base currency ISO 4217 numeric code
+            localcur -- requested local currency ISO 4217 numeric code
+            exdates -- iterable of ISO formatted dates
+        '''
+        result = {}
+        now = time.monotonic()
+        entries = self._entries
+        with self._lock:
+            for d in exdates:
+                key = (sourceid, d, basecur, localcur)
+                entry = entries.get(key)
+                if entry is None:
+                    self.misses += 1
+                elif entry[1] is not None and entry[1] <= now:
+                    del entries[key]
+                    self.misses += 1
+                else:
+                    entries.move_to_end(key)
+                    result[d] = entry[0]
+                    self.hits += 1
+        return result
+
+    def put_many(self, sourceid, basecur, localcur, rows_by_date):
+        '''caches rows received for requested dates
+
+        Positional arguments:
+            sourceid -- internal id of exchange rate source
+            basecur -- requested base currency ISO 4217 numeric code
+            localcur -- requested local currency ISO 4217 numeric code
+            rows_by_date -- dict with ISO date: list of rows received for it
+        '''
+        today = date.today().isoformat()
+        expires = time.monotonic() + self.ttl
+        entries = self._entries
+        with self._lock:
+            for d, rows in rows_by_date.items():
+                key = (sourceid, d, basecur, localcur)
+                entries[key] = (tuple(rows), expires if d >= today else None)
+                entries.move_to_end(key)
+            while len(entries) > self.maxsize:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        '''removes all entries and resets counters'''
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        '''returns dict with cache counters and size'''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+
+# cache shared by all ExchangeRateParse instances by default
+shared_cache = RateCache()
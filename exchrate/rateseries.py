@@ -0,0 +1,196 @@
+'''
+Module has columnar container for exchange rates.
+
+RateSeries keeps exchange rate rows in compact typed arrays instead of list
+of named tuples:
+    sourceid -- unsigned short
+    exdate -- date ordinal (datetime.date.toordinal()), int
+    localcur, basecur -- ISO 4217 numeric codes (-1 for unknown currency),
+        signed short
+    exrate -- double
+
+Row takes 18 bytes, while ExchangeRateParse.EXRATE_TEMPLATE named tuple with
+ISO date string and float takes more than 150 bytes. Rows are sorted by date,
+so lookup by date is binary search. Conversion to NumPy arrays does not copy
+data (NumPy is optional and imported only by to_numpy()).
+
+RateSeries is returned by ExchangeRateParse.get_exch_rate(as_series=True)
+'''
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+from .mappers import Exrate
+
+# ordinal of 1970-01-01 used for conversion to numpy datetime64
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# array typecodes of columns
+COLUMNS = (
+    ('sourceid', 'H'),
+    ('exdate', 'i'),
+    ('localcur', 'h'),
+    ('basecur', 'h'),
+    ('exrate', 'd'),
+)
+
+
+class RateSeries:
+    '''Columnar container of exchange rate rows sorted by date
+
+    Constructor
+    RateSeries(sourceid, exdate, localcur, basecur, exrate)
+
+    Arguments are array.array columns (or iterables converted to them) of
+    equal length. exdate column contains date ordinals sorted ascending.
+    Use RateSeries.from_rows(rows) to build series from get_exch_rate() rows
+
+    Supports len(), iteration and indexing:
+        series[i] -- row named tuple (same as get_exch_rate() rows)
+        series[i:j] -- RateSeries with rows from i to j
+    '''
+
+    __slots__ = tuple(name for name, _ in COLUMNS)
+
+    def __init__(self, sourceid=(), exdate=(), localcur=(), basecur=(), exrate=()):
+        columns = (sourceid, exdate, localcur, basecur, exrate)
+        for (name, typecode), column in zip(COLUMNS, columns, strict=True):
+            if not (isinstance(column, array) and column.typecode == typecode):
+                column = array(typecode, column)
+            setattr(self, name, column)
+        if len({len(getattr(self, name)) for name in self.__slots__}) > 1:
+            raise ValueError('RateSeries columns must have equal length')
+
+    @classmethod
+    def from_rows(cls, rows):
+        '''builds series from rows with fields of EXRATE_TEMPLATE
+        (sourceid, ISO date, localcur, basecur, exrate)
+        '''
+        ordinals = {}
+        columns = tuple(array(typecode) for _, typecode in COLUMNS)
+        for sourceid, exdate, localcur, basecur, exrate in sorted(
+            rows, key=lambda row: row[1]
+        ):
+            ordinal = ordinals.get(exdate)
+            if ordinal is None:
+                ordinal = ordinals[exdate] = date.fromisoformat(exdate).toordinal()
+            for column, value in zip(
+                columns, (sourceid, ordinal, localcur, basecur, exrate), strict=True
+            ):
+                column.append(value)
+        return cls(*columns)
+
+    def __len__(self):
+        return len(self.exrate)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                raise ValueError('RateSeries slice step is not supported')
+            return RateSeries(*(getattr(self, name)[index] for name in self.__slots__))
+        return Exrate(
+            self.sourceid[index],
+            date.fromordinal(self.exdate[index]).isoformat(),
+            self.localcur[index],
+            self.basecur[index],
+            self.exrate[index],
+        )
+
+    def __iter__(self):
+        return iter(self.to_rows())
+
+    def __eq__(self, other):
+        if not isinstance(other, RateSeries):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __repr__(self):
+        return '<RateSeries rows={}>'.format(len(self))
+
+    @property
+    def nbytes(self):
+        '''number of bytes taken by columns data'''
+        return sum(
+            len(column) * column.itemsize
+            for column in (getattr(self, name) for name in self.__slots__)
+        )
+
+    def _date_bounds(self, exdate):
+        '''returns (start, stop) positions of rows for ISO date or ordinal'''
+        exdate = _to_ordinal(exdate)
+        return (bisect_left(self.exdate, exdate), bisect_right(self.exdate, exdate))
+
+    def find(self, exdate):
+        '''returns RateSeries with rows for date
+
+        Positional arguments:
+            exdate -- ISO date string, datetime.date or date ordinal
+        '''
+        return self[slice(*self._date_bounds(exdate))]
+
+    def between(self, date_from, date_to):
+        '''returns RateSeries with rows for dates from date_from to date_to
+        inclusive (ISO date strings, datetime.date or date ordinals)
+        '''
+        return self[self._date_bounds(date_from)[0] : self._date_bounds(date_to)[1]]
+
+    def get_rate(self, exdate, basecur=None):
+        '''returns exchange rate for date or None if it is missing
+
+        Positional arguments:
+            exdate -- ISO date string, datetime.date or date ordinal
+
+        Keyword arguments:
+            basecur -- ISO 4217 numeric code of base currency. If None then
+                rate of first row for the date is returned
+        '''
+        start, stop = self._date_bounds(exdate)
+        for i in range(start, stop):
+            if basecur is None or self.basecur[i] == basecur:
+                return self.exrate[i]
+        return None
+
+    def to_rows(self):
+        '''returns list of row named tuples (same as get_exch_rate() rows)'''
+        isodates = {}
+        rows = []
+        for sourceid, ordinal, localcur, basecur, exrate in zip(
+            self.sourceid,
+            self.exdate,
+            self.localcur,
+            self.basecur,
+            self.exrate,
+            strict=True,
+        ):
+            exdate = isodates.get(ordinal)
+            if exdate is None:
+                exdate = isodates[ordinal] = date.fromordinal(ordinal).isoformat()
+            rows.append(Exrate(sourceid, exdate, localcur, basecur, exrate))
+        return rows
+
+    def to_numpy(self):
+        '''returns dict with column name: NumPy array
+
+        Arrays share memory with series columns except exdate which is
+        converted to datetime64[D]. Requires NumPy to be installed
+        '''
+        import numpy as np
+
+        columns = {
+            name: np.frombuffer(getattr(self, name), dtype=typecode)
+            for name, typecode in COLUMNS
+        }
+        columns['exdate'] = (columns['exdate'] - _EPOCH_ORDINAL).astype('datetime64[D]')
+        return columns
+
+
+def _to_ordinal(exdate):
+    '''converts ISO date string, datetime.date or ordinal to date ordinal'''
+    if isinstance(exdate, str):
+        return date.fromisoformat(exdate).toordinal()
+    if isinstance(exdate, date):
+        return exdate.toordinal()
+    return exdate
@@ -0,0 +1,433 @@
+'''
+Module has persistent storage for exchange rates already received from
+exchange rate sources.
+
+Rates are stored per (source id, date, base currency, local currency) key,
+where currencies are ISO 4217 numeric codes. Rows are kept under requested
+date and returned unchanged, also when source answered with rows of other
+date (e.g. rates of Friday for Saturday). Besides rows store keeps track
+of dates which were fetched completely, so empty responses (e.g. holidays)
+are not requested again. Only dates before today are marked as fetched since
+rate for current date can still be changed by the source.
+
+Store is used by ExchangeRateParse when passed as `store` argument:
+    store = SQLiteRateStore('rates.db')
+    e = ExchangeRateParse('NBU-json', dates, 'USD', 'UAH', store=store)
+
+MmapRateStore keeps rates in fixed-width binary file which is opened with
+mmap, so worker processes share single page-cached copy and nothing is
+parsed on startup.
+'''
+
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+from datetime import date
+
+try:
+    import fcntl
+except ImportError:  # no locking between processes on Windows
+    fcntl = None
+
+
+class SQLiteRateStore:
+    '''SQLite backed exchange rate store
+
+    Constructor
+    SQLiteRateStore(path)
+
+    path -- path to database file. In-memory database is used if omitted
+
+    Store can be shared between several ExchangeRateParse instances and
+    threads. Methods used by ExchangeRateParse:
+        get_many(sourceid, basecur, localcur, exdates)
+        put_many(sourceid, basecur, localcur, rows_by_date)
+    '''
+
+    _SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS exrate ('
+        ' sourceid INTEGER NOT NULL,'
+        ' exdate TEXT NOT NULL,'
+        ' reqbase INTEGER NOT NULL,'
+        ' reqlocal INTEGER NOT NULL,'
+        ' localcur INTEGER NOT NULL,'
+        ' basecur INTEGER NOT NULL,'
+        ' exrate REAL NOT NULL,'
+        ' rowdate TEXT,'
+        ' PRIMARY KEY (sourceid, reqbase, reqlocal, exdate, localcur, basecur))',
+        'CREATE TABLE IF NOT EXISTS fetched ('
+        ' sourceid INTEGER NOT NULL,'
+        ' exdate TEXT NOT NULL,'
+        ' reqbase INTEGER NOT NULL,'
+        ' reqlocal INTEGER NOT NULL,'
+        ' PRIMARY KEY (sourceid, reqbase, reqlocal, exdate))',
+    )
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            for stmt in self._SCHEMA:
+                self._conn.execute(stmt)
+            # databases created before rows kept own date
+            columns = {r[1] for r in self._conn.execute('PRAGMA table_info(exrate)')}
+            if 'rowdate' not in columns:
+                self._conn.execute('ALTER TABLE exrate ADD COLUMN rowdate TEXT')
+
+    def get_many(self, sourceid, basecur, localcur, exdates):
+        '''returns dict with exdate: list of row tuples for fetched dates
+
+        Positional arguments:
+            sourceid -- internal id of exchange rate source
+            basecur -- requested base currency ISO 4217 numeric code
+            localcur -- requested local currency ISO 4217 numeric code
+            exdates -- iterable of ISO formatted dates
+
+        Dates which were never fetched completely are missing in result.
+        Row tuples have fields of ExchangeRateParse.EXRATE_TEMPLATE
+        '''
+        exdates = list(exdates)
+        if not exdates:
+            return {}
+        key = (sourceid, basecur, localcur)
+        with self._lock:
+            fetched = self._select_in(
+                'SELECT exdate FROM fetched'
+                ' WHERE sourceid = ? AND reqbase = ? AND reqlocal = ?'
+                ' AND exdate IN ({})',
+                key,
+                exdates,
+            )
+            result = {row[0]: [] for row in fetched}
+            rows = self._select_in(
+                'SELECT exdate, sourceid, COALESCE(rowdate, exdate), localcur,'
+                ' basecur, exrate FROM exrate'
+                ' WHERE sourceid = ? AND reqbase = ? AND reqlocal = ?'
+                ' AND exdate IN ({})'
+                ' ORDER BY exdate',
+                key,
+                list(result),
+            )
+        for row in rows:
+            result[row[0]].append(row[1:])
+        return result
+
+    def put_many(self, sourceid, basecur, localcur, rows_by_date):
+        '''saves rows received for requested dates
+
+        Positional arguments:
+            sourceid -- internal id of exchange rate source
+            basecur -- requested base currency ISO 4217 numeric code
+            localcur -- requested local currency ISO 4217 numeric code
+            rows_by_date -- dict with ISO date: list of rows received for it
+        '''
+        today = date.today().isoformat()
+        key = (sourceid, basecur, localcur)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO exrate'
+                ' (sourceid, reqbase, reqlocal, exdate, localcur, basecur, exrate,'
+                ' rowdate) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    key + (d, row[2], row[3], row[4], row[1])
+                    for d, rows in rows_by_date.items()
+                    for row in rows
+                ),
+            )
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO fetched (sourceid, reqbase, reqlocal, exdate)'
+                ' VALUES (?, ?, ?, ?)',
+                (key + (d,) for d in rows_by_date if d < today),
+            )
+
+    def close(self):
+        '''closes database connection'''
+        with self._lock:
+            self._conn.close()
+
+    def _select_in(self, query, params, values, chunk=500):
+        '''runs query with IN clause in chunks to respect SQLite limits'''
+        result = []
+        for i in range(0, len(values), chunk):
+            part = values[i : i + chunk]
+            result.extend(
+                self._conn.execute(
+                    query.format(', '.join('?' * len(part))), params + tuple(part)
+                )
+            )
+        return result
+
+
+class MmapRateStore:
+    '''Memory-mapped binary exchange rate store
+
+    Constructor
+    MmapRateStore(path, max_tail)
+
+    path -- path to store file (created if missing)
+    max_tail -- number of appended records which triggers compaction
+
+    File has 16 bytes header (magic, number of records in sorted segment)
+    followed by sorted segment and tail of appended records. Record is 24
+    bytes:
+        key -- sourceid, reqbase, reqlocal (unsigned short), requested date
+            ordinal (unsigned int), localcur, basecur (unsigned short),
+            big-endian so byte order of keys is their sort order
+        shift -- days from requested date to date of row (signed short)
+        exrate -- little-endian double
+    Record with localcur and basecur 0 marks date as fetched. Only dates
+    before today are saved since rate for current date can still change.
+
+    Dates are found in sorted segment by binary search over mapped file
+    without copying it; tail records are indexed in memory. put_many()
+    appends records to tail and merges tail into sorted segment when it
+    grows over max_tail records. Store file replaced or extended by other
+    process is mapped again by next get_many() call.
+
+    Methods used by ExchangeRateParse (same as SQLiteRateStore):
+        get_many(sourceid, basecur, localcur, exdates)
+        put_many(sourceid, basecur, localcur, rows_by_date)
+    '''
+
+    MAGIC = b'EXRATE02'
+    _HEADER = struct.Struct('<8sQ')
+    _KEY = struct.Struct('>HHHI')
+    _RECORD = struct.Struct('>HHHIHHh8s')
+    _RATE = struct.Struct('<d')
+    _PREFIX_SIZE = _KEY.size
+    _KEY_SIZE = _KEY.size + 4
+
+    def __init__(self, path, max_tail=4096):
+        self.path = path
+        self.max_tail = max_tail
+        self._lock = threading.Lock()
+        self._file = self._mmap = None
+        self._file_id = None
+        self._sorted = 0
+        self._parsed = 0
+        # key prefix (sourceid, reqbase, reqlocal, ordinal): {(localcur,
+        # basecur): (shift, rate)} of tail records
+        self._tail = {}
+        with self._file_lock():
+            if not os.path.exists(self.path):
+                self._write_file(self.path, [])
+
+    def get_many(self, sourceid, basecur, localcur, exdates):
+        '''returns dict with exdate: list of row tuples for fetched dates
+
+        Positional arguments:
+            sourceid -- internal id of exchange rate source
+            basecur -- requested base currency ISO 4217 numeric code
+            localcur -- requested local currency ISO 4217 numeric code
+            exdates -- iterable of ISO formatted dates
+
+        Dates which were never fetched completely are missing in result.
+        Row tuples have fields of ExchangeRateParse.EXRATE_TEMPLATE
+        '''
+        result = {}
+        with self._lock:
+            self._refresh()
+            for exdate in exdates:
+                ordinal = date.fromisoformat(exdate).toordinal()
+                prefix = self._KEY.pack(
+                    sourceid, basecur & 0xFFFF, localcur & 0xFFFF, ordinal
+                )
+                found = self._find_sorted(prefix)
+                found.update(self._tail.get(prefix, ()))
+                if (0, 0) not in found:
+                    continue
+                del found[0, 0]
+                result[exdate] = [
+                    (
+                        sourceid,
+                        date.fromordinal(ordinal + shift).isoformat()
+                        if shift
+                        else exdate,
+                        _signed(cur[0]),
+                        _signed(cur[1]),
+                        rate,
+                    )
+                    for cur, (shift, rate) in sorted(found.items())
+                ]
+        return result
+
+    def put_many(self, sourceid, basecur, localcur, rows_by_date):
+        '''appends rows received for requested dates before today
+
+        Positional arguments:
+            sourceid -- internal id of exchange rate source
+            basecur -- requested base currency ISO 4217 numeric code
+            localcur -- requested local currency ISO 4217 numeric code
+            rows_by_date -- dict with ISO date: list of rows received for it
+        '''
+        today = date.today().isoformat()
+        key = (sourceid, basecur & 0xFFFF, localcur & 0xFFFF)
+        records = []
+        for exdate, rows in rows_by_date.items():
+            if exdate >= today:
+                continue
+            ordinal = date.fromisoformat(exdate).toordinal()
+            records.extend(
+                self._pack(
+                    *key,
+                    ordinal,
+                    row[2] & 0xFFFF,
+                    row[3] & 0xFFFF,
+                    date.fromisoformat(row[1]).toordinal() - ordinal,
+                    row[4],
+                )
+                for row in rows
+            )
+            # date is marked fetched after its rows, so reader of partially
+            # appended tail never takes missing rows as complete answer
+            records.append(self._pack(*key, ordinal, 0, 0, 0, 0.0))
+        if not records:
+            return
+        with self._lock, self._file_lock():
+            with open(self.path, 'ab') as f:
+                f.write(b''.join(records))
+            self._refresh()
+            if self._tail_count() > self.max_tail:
+                self._compact()
+
+    def compact(self):
+        '''merges appended records into sorted segment'''
+        with self._lock, self._file_lock():
+            self._refresh()
+            self._compact()
+
+    def close(self):
+        '''unmaps store file'''
+        with self._lock:
+            self._unmap()
+
+    @classmethod
+    def _pack(
+        cls, sourceid, reqbase, reqlocal, ordinal, localcur, basecur, shift, rate
+    ):
+        return cls._RECORD.pack(
+            sourceid,
+            reqbase,
+            reqlocal,
+            ordinal,
+            localcur,
+            basecur,
+            shift,
+            cls._RATE.pack(rate),
+        )
+
+    def _find_sorted(self, prefix):
+        '''returns {(localcur, basecur): (shift, rate)} of sorted segment
+        records with key prefix (binary search over mapped file)
+        '''
+        mm, size, start = self._mmap, self._RECORD.size, self._HEADER.size
+        n = len(prefix)
+        lo, hi = 0, self._sorted
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = start + mid * size
+            if mm[offset : offset + n] < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = {}
+        offset = start + lo * size
+        end = start + self._sorted * size
+        while offset < end and mm[offset : offset + n] == prefix:
+            *_, localcur, basecur, shift, rate = self._RECORD.unpack_from(mm, offset)
+            found[localcur, basecur] = shift, self._RATE.unpack(rate)[0]
+            offset += size
+        return found
+
+    def _refresh(self):
+        '''maps store file again if it was replaced or extended and indexes
+        new tail records
+        '''
+        stat = os.stat(self.path)
+        if (stat.st_dev, stat.st_ino) != self._file_id:
+            self._unmap()
+            self._file = open(self.path, 'rb')
+            self._file_id = (stat.st_dev, stat.st_ino)
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self._sorted = self._HEADER.unpack_from(self._mmap)
+            if magic != self.MAGIC:
+                raise ValueError('{} is not rate store file'.format(self.path))
+            self._parsed = self._HEADER.size + self._sorted * self._RECORD.size
+            self._tail = {}
+        elif stat.st_size > len(self._mmap):
+            self._mmap.close()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # only whole records (other process may be appending)
+        size, mm = self._RECORD.size, self._mmap
+        end = self._parsed + (len(mm) - self._parsed) // size * size
+        for offset in range(self._parsed, end, size):
+            prefix = mm[offset : offset + self._PREFIX_SIZE]
+            *_, localcur, basecur, shift, rate = self._RECORD.unpack_from(mm, offset)
+            self._tail.setdefault(prefix, {})[localcur, basecur] = (
+                shift,
+                self._RATE.unpack(rate)[0],
+            )
+        self._parsed = end
+
+    def _tail_count(self):
+        '''returns number of indexed tail records'''
+        start = self._HEADER.size + self._sorted * self._RECORD.size
+        return (self._parsed - start) // self._RECORD.size
+
+    def _compact(self):
+        '''rewrites store file with tail merged into sorted segment'''
+        size = self._RECORD.size
+        records = {}
+        data = self._mmap[self._HEADER.size : self._parsed]
+        # later records replace earlier ones with same key
+        for offset in range(0, len(data), size):
+            record = data[offset : offset + size]
+            records[record[: self._KEY_SIZE]] = record
+        tmp_path = self.path + '.tmp'
+        self._write_file(tmp_path, [records[k] for k in sorted(records)])
+        os.replace(tmp_path, self.path)
+        self._refresh()
+
+    def _write_file(self, path, records):
+        with open(path, 'wb') as f:
+            f.write(self._HEADER.pack(self.MAGIC, len(records)))
+            f.write(b''.join(records))
+
+    def _file_lock(self):
+        '''returns context manager locking store against other processes'''
+        return _FileLock(self.path + '.lock')
+
+    def _unmap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+        self._file = self._mmap = self._file_id = None
+
+
+class _FileLock:
+    '''exclusive lock of lock file (no-op without fcntl)'''
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+def _signed(code):
+    '''returns currency code saved as unsigned short (unknown codes are -1)'''
+    return -1 if code == 0xFFFF else code
@@ -0,0 +1,183 @@
+'''
+Module has request scheduler with adaptive concurrency limit used for
+requests to exchange rate sources.
+
+RequestScheduler replaces fixed semaphore of max_connections:
+    - concurrency limit grows by one per `limit` successful requests while
+    latency is healthy (below latency_factor * baseline latency)
+    - limit is halved on 429/5xx responses, timeouts and transport errors
+    (at most once per baseline latency interval)
+    - failed requests are retried with jittered exponential backoff (or after
+    Retry-After interval) until retries are exhausted or deadline is reached
+
+Schedulers are kept by RateClient per source host, so all ExchangeRateParse
+instances using the client share the same limit.
+'''
+
+import asyncio
+import random
+from collections import deque
+
+import httpx
+
+from . import instrument
+
+# statuses which mean upstream is overloaded and request can be retried
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RequestScheduler:
+    '''Adaptive concurrency limiter with retries
+
+    Constructor
+    RequestScheduler(max_connections, max_limit, retries, backoff,
+        max_backoff, latency_factor)
+
+    max_connections -- initial concurrency limit
+    max_limit -- maximum concurrency limit (2 * max_connections if None)
+    retries -- number of retries of failed request
+    backoff -- base delay of exponential backoff in seconds
+    max_backoff -- maximum delay between retries in seconds
+    latency_factor -- latency is healthy while it is below latency_factor
+        times baseline (lowest smoothed) latency
+
+    Counters are available in attributes:
+        requests, retried, throttled, failed
+    '''
+
+    def __init__(
+        self,
+        max_connections,
+        max_limit=None,
+        retries=3,
+        backoff=0.25,
+        max_backoff=10.0,
+        latency_factor=2.0,
+    ):
+        self.limit = float(max_connections)
+        self.max_limit = max_limit or 2 * max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.latency_factor = latency_factor
+        self.active = 0
+        self.requests = self.retried = self.throttled = self.failed = 0
+        self._waiters = deque()
+        self._latency = None
+        self._baseline = None
+        self._last_decrease = float('-inf')
+
+    async def request(self, get, url, deadline=None):
+        '''makes request with retries
+        Returns: httpx.Response or None if request failed with exception
+
+        Positional arguments:
+            get -- coroutine function making request: get(url, timeout)
+            url -- request url
+
+        Keyword arguments:
+            deadline -- event loop time after which request is not retried
+        '''
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            timeout = None if deadline is None else max(deadline - loop.time(), 0.001)
+            with instrument.span('scheduler.wait', limit=int(self.limit)):
+                await self._acquire()
+            started = loop.time()
+            try:
+                self.requests += 1
+                with instrument.span('http.request', url=url) as span:
+                    response = await get(url, timeout)
+                    span.set(status=response.status_code)
+            except (httpx.TimeoutException, httpx.TransportError):
+                response = None
+            finally:
+                self._release()
+            latency = loop.time() - started
+            if instrument.hooks:
+                self._count_response(url, response)
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                self._on_success(latency)
+                return response
+
+            self._on_overload(loop.time())
+            attempt += 1
+            delay = _retry_after(response)
+            if delay is None:
+                delay = random.uniform(
+                    0, min(self.max_backoff, self.backoff * 2**attempt)
+                )
+            if attempt > self.retries or (
+                deadline is not None and loop.time() + delay >= deadline
+            ):
+                self.failed += 1
+                instrument.count('failed', url=url)
+                return response
+            self.retried += 1
+            instrument.count('retries', url=url)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _count_response(url, response):
+        '''emits request counters of response (None if request failed)'''
+        instrument.count('requests', url=url)
+        if response is not None:
+            instrument.count('bytes', len(response.content), url=url)
+
+    async def _acquire(self):
+        '''waits until number of active requests is below limit'''
+        while self.active >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                else:
+                    self._wake()
+                raise
+        self.active += 1
+
+    def _release(self):
+        self.active -= 1
+        self._wake()
+
+    def _wake(self):
+        '''wakes waiters which can start request under current limit'''
+        free = int(self.limit) - self.active
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def _on_success(self, latency):
+        '''updates latency statistics and grows limit if latency is healthy'''
+        self._latency = (
+            latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+        )
+        if self._baseline is None or self._latency < self._baseline:
+            self._baseline = self._latency
+        if latency <= self.latency_factor * self._baseline:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    def _on_overload(self, now):
+        '''halves limit once per baseline latency interval'''
+        self.throttled += 1
+        if now - self._last_decrease >= (self._baseline or 0):
+            self.limit = max(1.0, self.limit / 2)
+            self._last_decrease = now
+
+
+def _retry_after(response):
+    '''returns Retry-After header of response in seconds or None'''
+    if response is None:
+        return None
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
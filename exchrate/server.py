@@ -0,0 +1,359 @@
+'''
+Module has local HTTP service answering exchange rate queries.
+
+RateServer is small asyncio (standard library streams) HTTP/1.1 server with
+keep-alive connections. Rates are answered from RateIndex, hot in-memory
+index of (source, basecur, localcur) series. Missing dates are fetched by
+existing fetch path of ExchangeRateParse (rate cache, rate store, pooled
+client): misses of same series arriving within batch_delay are fetched in
+single batch and concurrent misses of same date share single fetch, so
+upstream is requested once per service instead of once per caller.
+
+Endpoints (query parameters or JSON object keys):
+    GET /rates?source=NBU-json&base=USD&local=UAH&date=2016-12-01
+    GET /rates?source=NBU-json&base=USD&from=2016-12-01&to=2016-12-31
+    GET /convert?base=USD&date=2016-12-01&amount=100
+    POST /rates, POST /convert -- JSON list of queries, list of results
+    GET /stats -- index counters
+
+source defaults to NBU-json, local to UAH. Invalid query is answered with
+status 400, failure to fetch rates from upstream source with status 502.
+Result of query:
+    {"source": ..., "base": ..., "local": ..., "rates": {date: rate},
+     "missing": [dates without rate]}
+conversion result has "amount" and "converted": {date: amount * rate} too.
+
+    asyncio.run(RateServer(port=8080, store=SQLiteRateStore('r.db')).serve())
+'''
+
+import asyncio
+import json
+from datetime import date
+from urllib.parse import parse_qsl, urlsplit
+
+from . import config
+from .exrateparse import ExchangeRateParse
+
+# HTTP reason phrases of statuses used by server
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    502: 'Bad Gateway',
+}
+
+
+class UpstreamError(Exception):
+    '''Rates of batch could not be fetched from upstream source'''
+
+
+class RateIndex:
+    '''Hot in-memory index of exchange rates with batched fetching of misses
+
+    Constructor
+    RateIndex(store, cache, client, batch_delay)
+
+    store -- optional rate store used by fetch path
+    cache -- rate cache used by fetch path (see ExchangeRateParse)
+    client -- client.RateClient used by fetch path
+    batch_delay -- seconds misses of series are collected before fetching
+
+    Rates of past dates are kept in index for process lifetime. Rates of
+    today (and later) are not indexed, they are answered by rate cache of
+    fetch path which expires them.
+
+    Counters are available in attributes:
+        hits, misses, batches
+    '''
+
+    def __init__(self, store=None, cache=True, client=None, batch_delay=0.002):
+        self.store = store
+        self.cache = cache
+        self.client = client
+        self.batch_delay = batch_delay
+        self.hits = self.misses = self.batches = 0
+        # series: {ISO date: rate or None}
+        self._index = {}
+        # series: {ISO date: future} collected for next batch
+        self._pending = {}
+        # (series, ISO date): future of date being fetched
+        self._inflight = {}
+        self._tasks = set()
+
+    def __len__(self):
+        return sum(len(rates) for rates in self._index.values())
+
+    async def get_rates(self, exratesrc, basecur, localcur, dates):
+        '''returns dict with ISO date: rate (None if source has no rate)
+
+        Positional arguments:
+            exratesrc -- exchange rate source code
+            basecur, localcur -- ISO 4217 literal currency codes
+            dates -- ISO dates
+        '''
+        series = (exratesrc, basecur, localcur)
+        rates = self._index.get(series, {})
+        result = {}
+        waiting = {}
+        for d in dates:
+            if d in rates:
+                result[d] = rates[d]
+                self.hits += 1
+            elif d not in waiting:
+                self.misses += 1
+                waiting[d] = self._inflight.get((series, d)) or self._schedule(
+                    series, d
+                )
+        if waiting:
+            # shield keeps shared futures alive if this caller is cancelled
+            fetched = await asyncio.gather(
+                *(asyncio.shield(f) for f in waiting.values())
+            )
+            result.update(zip(waiting, fetched, strict=True))
+        return result
+
+    def _schedule(self, series, exdate):
+        '''adds date to next batch of series and returns its future'''
+        loop = asyncio.get_running_loop()
+        future = self._inflight[series, exdate] = loop.create_future()
+        batch = self._pending.get(series)
+        if batch is None:
+            batch = self._pending[series] = {}
+            loop.call_later(self.batch_delay, self._flush, series)
+        batch[exdate] = future
+        return future
+
+    def _flush(self, series):
+        '''starts fetching batch of series'''
+        batch = self._pending.pop(series)
+        self.batches += 1
+        task = asyncio.ensure_future(self._fetch(series, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, series, batch):
+        '''fetches dates of batch and resolves their futures'''
+        exratesrc, basecur, localcur = series
+        dates = sorted(batch)
+        try:
+            e = ExchangeRateParse(
+                exratesrc,
+                dates,
+                basecur,
+                localcur,
+                store=self.store,
+                cache=self.cache,
+                client=self.client,
+            )
+            rows_by_date = await e._get_rows(dates)
+        except Exception as exc:
+            error = UpstreamError('{} fetch failed: {!r}'.format(exratesrc, exc))
+            error.__cause__ = exc
+            for future in batch.values():
+                future.set_exception(error)
+            return
+        finally:
+            for d in dates:
+                self._inflight.pop((series, d), None)
+
+        key = e._store_key()
+        today = date.today().isoformat()
+        rates = self._index.setdefault(series, {})
+        for d, future in batch.items():
+            rows = rows_by_date.get(d)
+            rate = _find_rate(rows, key)
+            # failed dates and dates which can still change are not indexed
+            if rows is not None and d < today:
+                rates[d] = rate
+            future.set_result(rate)
+
+
+def _find_rate(rows, key):
+    '''returns rate of row with (basecur, localcur) of store key or None'''
+    for r in rows or ():
+        if (r.basecur, r.localcur) == key[1:]:
+            return r.exrate
+    return None
+
+
+class RateServer:
+    '''Async HTTP server answering exchange rate and conversion queries
+
+    Constructor
+    RateServer(host, port, index, max_dates, **kwargs)
+
+    host, port -- address server listens on
+    index -- RateIndex used for queries. If None then new index is created
+        with kwargs (store, cache, client, batch_delay)
+    max_dates -- maximum number of dates in single query
+
+    For running server until cancelled use coroutine:
+        serve()
+
+    For answering request without network (e.g. from other server) use
+    coroutine:
+        handle(method, target, body)
+    '''
+
+    def __init__(
+        self, host='127.0.0.1', port=8080, index=None, max_dates=3660, **kwargs
+    ):
+        self.host = host
+        self.port = port
+        self.index = RateIndex(**kwargs) if index is None else index
+        self.max_dates = max_dates
+
+    async def start(self):
+        '''starts listening and returns asyncio.Server'''
+        return await asyncio.start_server(self._handle_connection, self.host, self.port)
+
+    async def serve(self):
+        '''serves requests until cancelled'''
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, method, target, body=b''):
+        '''answers request
+        Returns: (HTTP status, JSON serializable result)
+
+        Positional arguments:
+            method -- HTTP method
+            target -- request target (path with query string)
+
+        Keyword arguments:
+            body -- request body (JSON list of queries for POST)
+        '''
+        url = urlsplit(target)
+        if url.path not in ('/rates', '/convert', '/stats'):
+            return 404, {'error': 'unknown path {}'.format(url.path)}
+        if url.path == '/stats':
+            return 200, self._get_stats()
+
+        convert = url.path == '/convert'
+        try:
+            if method == 'GET':
+                return 200, await self._answer(dict(parse_qsl(url.query)), convert)
+            if method == 'POST':
+                queries = json.loads(body)
+                if not isinstance(queries, list) or not all(
+                    isinstance(q, dict) for q in queries
+                ):
+                    raise ValueError('body must be JSON list of queries')
+                return 200, await asyncio.gather(
+                    *(self._answer(q, convert) for q in queries)
+                )
+        except UpstreamError as exc:
+            return 502, {'error': str(exc)}
+        except (ValueError, TypeError, KeyError) as exc:
+            return 400, {'error': str(exc)}
+        return 405, {'error': 'method {} is not allowed'.format(method)}
+
+    async def _answer(self, query, convert=False):
+        '''returns result of single rate or conversion query'''
+        exratesrc = query.get('source', 'NBU-json')
+        if not config.get_source_config(exratesrc):
+            raise ValueError('unsupported source {}'.format(exratesrc))
+        basecur, localcur = query['base'], query.get('local', 'UAH')
+        dates = self._get_dates(query)
+
+        rates = await self.index.get_rates(exratesrc, basecur, localcur, dates)
+        result = {
+            'source': exratesrc,
+            'base': basecur,
+            'local': localcur,
+            'rates': {d: rate for d, rate in rates.items() if rate is not None},
+            'missing': [d for d, rate in rates.items() if rate is None],
+        }
+        if convert:
+            amount = float(query['amount'])
+            result['amount'] = amount
+            result['converted'] = {d: amount * r for d, r in result['rates'].items()}
+        return result
+
+    def _get_dates(self, query):
+        '''returns ISO dates of query. Length of date range is checked before
+        it is expanded to dates
+        '''
+        if 'date' in query:
+            dates = list(ExchangeRateParse.split_dates(query['date']))
+        elif _range_length(query['from'], query['to']) > self.max_dates:
+            dates = None
+        else:
+            dates = list(ExchangeRateParse.split_dates((query['from'], query['to'])))
+        if not dates or len(dates) > self.max_dates:
+            raise ValueError('expected 1 to {} valid dates'.format(self.max_dates))
+        return dates
+
+    def _get_stats(self):
+        index = self.index
+        return {
+            'rates': len(index),
+            'hits': index.hits,
+            'misses': index.misses,
+            'batches': index.batches,
+        }
+
+    async def _handle_connection(self, reader, writer):
+        '''answers requests of keep-alive connection until it is closed'''
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, result = await self.handle(method, target, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(_build_response(status, result, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+def _range_length(date_from, date_to):
+    '''returns number of dates in range of ISO dates (0 if range is not valid)'''
+    try:
+        return max(
+            0, (date.fromisoformat(date_to) - date.fromisoformat(date_from)).days + 1
+        )
+    except (ValueError, TypeError):
+        return 0
+
+
+async def _read_request(reader):
+    '''reads HTTP request from stream
+    Returns: (method, target, headers, body) or None if connection is closed
+    '''
+    line = await reader.readline()
+    if not line:
+        return None
+    method, target, _ = line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    return method, target, headers, body
+
+
+def _build_response(status, result, keep_alive=True):
+    '''returns bytes of HTTP response with JSON body'''
+    body = json.dumps(result, separators=(',', ':')).encode()
+    head = (
+        'HTTP/1.1 {} {}\r\n'
+        'Content-Type: application/json\r\n'
+        'Content-Length: {}\r\n'
+        'Connection: {}\r\n\r\n'
+    ).format(
+        status, REASONS[status], len(body), 'keep-alive' if keep_alive else 'close'
+    )
+    return head.encode('latin-1') + body
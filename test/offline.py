@@ -0,0 +1,71 @@
+'''Offline stand-in for exchange rate sources used in tests'''
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from exchrate import exrateparse
+from exchrate.client import RateClient
+
+# NBU rates returned for every date
+NBU_RATES = {840: ('USD', 5.05), 978: ('EUR', 6.60742), 643: ('RUB', 0.19179)}
+
+
+def nbu_payload(url):
+    '''builds NBU like response for url with date (or start and end of
+    period) and optional valcode
+    '''
+    query = parse_qs(urlsplit(url).query)
+    valcode = query.get('valcode', [None])[0]
+    if 'start' in query:
+        start, end = (
+            datetime.strptime(query[k][0], '%Y%m%d') for k in ('start', 'end')
+        )
+        dates = [start + timedelta(i) for i in range((end - start).days + 1)]
+    else:
+        dates = [datetime.strptime(query['date'][0], '%Y%m%d')]
+    return json.dumps(
+        [
+            {'r030': r030, 'cc': cc, 'rate': rate, 'exchangedate': f'{exdate:%d.%m.%Y}'}
+            for exdate in dates
+            for r030, (cc, rate) in NBU_RATES.items()
+            if valcode in (None, cc)
+        ]
+    )
+
+
+def nbu_handler(request):
+    '''httpx.MockTransport handler answering like NBU WS'''
+    return httpx.Response(200, text=nbu_payload(str(request.url)))
+
+
+class OfflineClient(RateClient):
+    '''RateClient answering from handler instead of network
+    Requested urls are collected in `requested` attribute
+    '''
+
+    def __init__(self, handler=nbu_handler, **kwargs):
+        self.requested = []
+
+        async def record(request):
+            self.requested.append(str(request.url))
+            response = handler(request)
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        super().__init__(transport=httpx.MockTransport(record), **kwargs)
+
+
+class OfflineParse(exrateparse.ExchangeRateParse):
+    '''parser answering from generated payloads instead of NBU WS'''
+
+    def __init__(self, *args, client=None, **kwargs):
+        super().__init__(*args, client=client or OfflineClient(), **kwargs)
+
+    @property
+    def requested(self):
+        return self.client.requested
@@ -0,0 +1,158 @@
+'''Test aggregates over rate series'''
+
+import random
+import unittest
+from datetime import date, timedelta
+
+from exchrate.aggregate import Aggregate, AggregateStore, RateAggregates
+from exchrate.rateseries import RateSeries
+from exchrate.ratestore import SQLiteRateStore
+
+from .offline import OfflineParse
+
+START = date(2015, 1, 1)
+
+
+def make_rows(days, seed=1):
+    '''returns rows for random weekdays of period starting on START'''
+    rnd = random.Random(seed)
+    return [
+        (1, (START + timedelta(i)).isoformat(), 980, 840, round(rnd.uniform(10, 30), 4))
+        for i in range(days)
+        if (START + timedelta(i)).weekday() < 5 and rnd.random() < 0.9
+    ]
+
+
+def brute_force(rows, date_from, date_to):
+    '''returns Aggregate computed by looping over rows'''
+    rates = [r[4] for r in rows if date_from <= r[1] <= date_to]
+    first = max(date.fromisoformat(date_from), date.fromisoformat(rows[0][1]))
+    last = min(date.fromisoformat(date_to), date.fromisoformat(rows[-1][1]))
+    in_force = []
+    for i in range((last - first).days + 1):
+        day = (first + timedelta(i)).isoformat()
+        in_force.append([r[4] for r in rows if r[1] <= day][-1])
+    return Aggregate(
+        len(rates),
+        sum(rates) / len(rates) if rates else None,
+        min(rates, default=None),
+        max(rates, default=None),
+        sum(in_force) / len(in_force) if in_force else None,
+    )
+
+
+class TestRateAggregates(unittest.TestCase):
+    def setUp(self):
+        self.rows = make_rows(120)
+        self.agg = RateAggregates(self.rows)
+
+    def assertAggregate(self, agg, date_from, date_to, rows=None):
+        expected = brute_force(rows or self.rows, date_from, date_to)
+        result = agg.aggregate(date_from, date_to)
+        self.assertEqual(result[0], expected[0])
+        for value, exp in zip(result[1:], expected[1:], strict=True):
+            if exp is None:
+                self.assertIsNone(value)
+            else:
+                self.assertAlmostEqual(value, exp, places=9)
+
+    def test_windows(self):
+        rnd = random.Random(2)
+        for _ in range(200):
+            a, b = sorted(rnd.randrange(-5, 130) for _ in range(2))
+            self.assertAggregate(
+                self.agg,
+                (START + timedelta(a)).isoformat(),
+                (START + timedelta(b)).isoformat(),
+            )
+
+    def test_whole_series(self):
+        self.assertEqual(self.agg.count(), len(self.rows))
+        self.assertEqual(self.agg.maximum(), max(r[4] for r in self.rows))
+        self.assertEqual(
+            self.agg.minimum(date(2015, 1, 1), date(2015, 12, 31).toordinal()),
+            self.agg.minimum(),
+        )
+
+    def test_empty(self):
+        agg = RateAggregates()
+        self.assertEqual(agg.aggregate(), Aggregate(0, None, None, None, None))
+        self.assertEqual(list(agg.periods()), [])
+        self.assertEqual(
+            self.agg.aggregate('2014-01-01', '2014-12-31'),
+            Aggregate(0, None, None, None, None),
+        )
+
+    def test_incremental_update(self):
+        agg = RateAggregates(self.rows[:10])
+        for i in range(10, len(self.rows), 7):
+            agg.update(self.rows[i : i + 7])
+        self.assertEqual(agg.ordinals, self.agg.ordinals)
+        self.assertEqual(agg._mins, self.agg._mins)
+        self.assertEqual(agg._maxs, self.agg._maxs)
+        self.assertEqual(agg._day_sum, self.agg._day_sum)
+
+    def test_update_earlier_dates(self):
+        agg = RateAggregates(self.rows[40:])
+        self.assertEqual(agg.update(self.rows), 40)
+        self.assertEqual(agg._mins, self.agg._mins)
+        self.assertEqual(agg._before, self.agg._before)
+        # known rates are not added again, changed rate is replaced
+        self.assertEqual(agg.update(self.rows[:5]), 0)
+        changed = list(self.rows)
+        changed[20] = changed[20][:4] + (100.0,)
+        self.assertEqual(agg.update([changed[20]]), 1)
+        self.assertEqual(agg.maximum(), 100.0)
+        self.assertAggregate(agg, '2015-01-10', '2015-03-01', changed)
+
+    def test_several_series(self):
+        self.assertRaises(
+            ValueError, self.agg.update, [(1, '2016-01-04', 980, 978, 20.0)]
+        )
+
+    def test_series_and_periods(self):
+        agg = RateAggregates(RateSeries.from_rows(self.rows))
+        self.assertEqual(agg.ordinals, self.agg.ordinals)
+        periods = list(agg.periods('month'))
+        self.assertEqual(
+            [p[:2] for p in periods[:2]],
+            [('2015-01-01', '2015-01-31'), ('2015-02-01', '2015-02-28')],
+        )
+        self.assertEqual(len(periods), 4)
+        self.assertEqual(sum(p[2].count for p in periods), len(self.rows))
+        quarters = list(agg.periods('quarter'))
+        self.assertEqual(
+            [p[:2] for p in quarters],
+            [('2015-01-01', '2015-03-31'), ('2015-04-01', '2015-06-30')],
+        )
+        self.assertAggregate(agg, '2015-04-01', '2015-06-30')
+
+
+class TestAggregateStore(unittest.TestCase):
+    def test_fetched_rows_aggregated(self):
+        store = AggregateStore(SQLiteRateStore())
+        e = OfflineParse(
+            'NBU-json',
+            ('2015-01-01', '2015-01-10'),
+            'USD',
+            'UAH',
+            store=store,
+            cache=False,
+        )
+        e.get_exch_rate()
+        agg = store.aggregates(1, 840, 980)
+        self.assertEqual(agg.count(), 10)
+        self.assertAlmostEqual(agg.average('2015-01-02', '2015-01-03'), 5.05)
+
+        # rows read from wrapped store are aggregated too
+        store = AggregateStore(store.store)
+        e = OfflineParse(
+            'NBU-json', '2015-01-05', 'USD', 'UAH', store=store, cache=False
+        )
+        e.get_exch_rate()
+        self.assertEqual(e.requested, [])
+        self.assertEqual(store.aggregates(1, 840, 980).count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+'''Test as-of index'''
+
+import threading
+import unittest
+from datetime import date, timedelta
+
+import httpx
+
+from exchrate.asof import AsOfIndex
+from exchrate.mappers import Exrate
+
+from .offline import OfflineClient, OfflineParse, nbu_handler
+
+
+def rows(*items):
+    return [Exrate(1, d, 980, 840, rate) for d, rate in items]
+
+
+class TestAsOfIndex(unittest.TestCase):
+    def setUp(self):
+        # 2015-01-09 is Friday
+        self.index = AsOfIndex(1, 980, 840, rest_weekdays={5, 6})
+        self.index.add(rows(('2015-01-12', 3.0), ('2015-01-08', 1.0)))
+        self.index.add(rows(('2015-01-09', 2.0)))
+        self.index.add([Exrate(1, '2015-01-10', 980, 978, 9.0)])
+
+    def test_asof(self):
+        self.assertEqual(list(self.index.exdate), sorted(self.index.exdate))
+        self.assertEqual(len(self.index), 3)
+        self.assertIsNone(self.index.get_rate('2015-01-07'))
+        self.assertEqual(self.index.get_rate('2015-01-08'), 1.0)
+        self.assertEqual(self.index.get_rate('2015-01-11'), 2.0)
+        self.assertEqual(self.index.get_rate('2015-02-01'), 3.0)
+        self.assertEqual(
+            self.index.get_row('2015-01-10'), Exrate(1, '2015-01-10', 980, 840, 2.0)
+        )
+
+    def test_covers(self):
+        self.assertTrue(self.index.covers('2015-01-09'))
+        self.assertTrue(self.index.covers('2015-01-11'))
+        self.assertFalse(self.index.covers('2015-01-07'))
+        self.assertFalse(self.index.covers('2015-01-13'))
+        # checked date without row is remembered as holiday
+        self.index.add([], checked=['2015-01-13'])
+        self.assertTrue(self.index.covers('2015-01-13'))
+        self.assertFalse(self.index.covers('2015-01-14'))
+
+    def test_today_not_remembered_as_empty(self):
+        today = date.today()
+        self.index.add([], checked=[today.isoformat(), today + timedelta(1)])
+        self.assertEqual(list(self.index.empty), [])
+        self.assertFalse(self.index.covers(today))
+
+    def test_densify(self):
+        series = self.index.densify('2015-01-01', '2015-01-13')
+        self.assertEqual(len(series), 6)
+        self.assertEqual(series[0].exdate, '2015-01-08')
+        self.assertEqual(list(series.exrate), [1.0, 2.0, 2.0, 2.0, 3.0, 3.0])
+        self.assertEqual(
+            len(AsOfIndex(1, 980, 840).densify('2015-01-01', '2015-01-02')), 0
+        )
+
+    def test_densify_unknown_currency(self):
+        index = AsOfIndex(2, 978, -1)
+        index.add([Exrate(2, '2016-12-01', 978, -1, 1.5)])
+        series = index.densify('2016-12-01', '2016-12-02')
+        self.assertEqual(list(series.basecur), [-1, -1])
+
+    def test_concurrent_add_and_lookup(self):
+        index = AsOfIndex(1, 980, 840)
+        start = date(2015, 1, 1).toordinal()
+        errors = []
+
+        def lookup():
+            try:
+                for _ in range(2000):
+                    found = index.asof(start + 400)
+                    self.assertTrue(found is None or found[1] >= 0)
+                    index.covers(start + 400)
+            except Exception as exc:
+                errors.append(exc)
+
+        reader = threading.Thread(target=lookup)
+        reader.start()
+        # older dates force merge of arrays
+        for day in range(400, 0, -1):
+            index.add(rows((date.fromordinal(start + day), float(day))))
+        reader.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(index), 400)
+        self.assertEqual(list(index.exdate), sorted(index.exdate))
+
+
+class TestAsOfParse(unittest.TestCase):
+    def test_covered_dates_not_requested(self):
+        def handler(request):
+            # 2015-01-07 is holiday
+            if '20150107' in str(request.url):
+                return httpx.Response(200, text='[]')
+            return nbu_handler(request)
+
+        index = AsOfIndex(1, 980, 840, rest_weekdays={5, 6})
+        client = OfflineClient(handler)
+        e = OfflineParse(
+            'NBU-json',
+            '2015-01-06',
+            'USD',
+            'UAH',
+            cache=False,
+            asof=index,
+            client=client,
+        )
+        e.get_exch_rate()
+
+        e.exratedate = ('2015-01-06', '2015-01-11')
+        result = e.get_exch_rate()
+        self.assertEqual([r.exdate for r in result][:2], ['2015-01-06', '2015-01-07'])
+        self.assertEqual(len(result), 6)
+        # weekend is covered by Friday rate
+        self.assertEqual(len(client.requested), 4)
+
+        # holiday learned from empty response is not requested again
+        e.exratedate = ('2015-01-06', '2015-01-11')
+        e.get_exch_rate()
+        self.assertEqual(len(client.requested), 4)
+        client.close()
+
+    def test_windows_span_skipped_rest_days(self):
+        client = OfflineClient()
+        e = OfflineParse(
+            'NBU-json',
+            ('2015-01-01', '2015-01-31'),
+            'USD',
+            'UAH',
+            cache=False,
+            asof=AsOfIndex(1, 980, 840, rest_weekdays={5, 6}),
+            client=client,
+        )
+        result = e.get_exch_rate()
+        # single window up to last Friday, Saturday is as-of value
+        self.assertEqual(len(client.requested), 1)
+        self.assertIn('start=20150101&end=20150130', client.requested[0])
+        self.assertEqual(len(result), 31)
+        self.assertEqual(e._last_failed, [])
+        client.close()
+
+    def test_failed_anchor_not_filled(self):
+        def handler(request):
+            # Friday fails, so weekend has no as-of value
+            if '20150109' in str(request.url):
+                return httpx.Response(503)
+            return nbu_handler(request)
+
+        client = OfflineClient(handler, retries=0)
+        e = OfflineParse(
+            'NBU-json',
+            ('2015-01-08', '2015-01-11'),
+            'USD',
+            'UAH',
+            cache=False,
+            asof=AsOfIndex(1, 980, 840, rest_weekdays={5, 6}),
+            client=client,
+        )
+        result = e.get_exch_rate()
+        self.assertEqual([r.exdate for r in result], ['2015-01-08'])
+        self.assertEqual(e._last_failed, ['2015-01-09', '2015-01-10', '2015-01-11'])
+        client.close()
+
+    def test_today_requested_until_published(self):
+        today = date.today()
+        published = []
+
+        def handler(request):
+            if not published:
+                return httpx.Response(200, text='[]')
+            return nbu_handler(request)
+
+        index = AsOfIndex(1, 980, 840, rest_weekdays=())
+        client = OfflineClient(handler)
+        e = OfflineParse(
+            'NBU-json',
+            today.isoformat(),
+            'USD',
+            'UAH',
+            cache=False,
+            asof=index,
+            client=client,
+        )
+        self.assertEqual(e.get_exch_rate(), [])
+        published.append(True)
+        result = e.get_exch_rate()
+        self.assertEqual(len(client.requested), 2)
+        self.assertEqual(
+            [(r.exdate, r.exrate) for r in result], [(today.isoformat(), 5.05)]
+        )
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
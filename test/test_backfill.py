@@ -0,0 +1,132 @@
+'''Test resumable backfill'''
+
+import json
+import os
+import tempfile
+import unittest
+
+import httpx
+
+from exchrate.backfill import Backfill, Chunk
+from exchrate.ratestore import SQLiteRateStore
+
+from .offline import OfflineClient, nbu_handler
+
+
+class TestBackfill(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.checkpoint_path = os.path.join(self.tmpdir.name, 'checkpoint.json')
+        self.rows = []
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.tmpdir.cleanup()
+
+    def backfill(self, basecurs, handler=nbu_handler, **kwargs):
+        client = OfflineClient(handler, retries=0)
+        self.clients.append(client)
+        kwargs.setdefault('processes', 0)
+        kwargs.setdefault('chunk_days', 4)
+        return Backfill(
+            'NBU-json',
+            basecurs,
+            '2015-01-01',
+            '2015-01-10',
+            checkpoint_path=self.checkpoint_path,
+            sink=self.rows.extend,
+            client=client,
+            **kwargs,
+        )
+
+    def test_chunks(self):
+        self.assertEqual(
+            self.backfill(['USD']).chunks(),
+            [
+                Chunk('USD', '2015-01-01', '2015-01-04'),
+                Chunk('USD', '2015-01-05', '2015-01-08'),
+                Chunk('USD', '2015-01-09', '2015-01-10'),
+            ],
+        )
+        # currencies share all currency requests
+        self.assertEqual(
+            [c.basecur for c in self.backfill(['USD', 'EUR']).chunks()], [None] * 3
+        )
+
+    def test_run(self):
+        progress = []
+        b = self.backfill(['USD', 'EUR'], progress=progress.append)
+        result = b.run()
+        self.assertEqual((result.chunks_done, result.chunks_total), (3, 3))
+        self.assertEqual(result.rows, 20)
+        self.assertEqual(len(progress), 3)
+        self.assertEqual(len(self.clients[0].requested), 10)
+        self.assertEqual({r.basecur for r in self.rows}, {840, 978})
+
+        # finished run is not repeated
+        self.assertEqual(self.backfill(['USD', 'EUR']).run().rows, 0)
+        self.assertEqual(len(self.clients[1].requested), 0)
+
+        # checkpoint of other currencies is not taken as done
+        self.assertEqual(self.backfill(['USD', 'RUB']).run().rows, 20)
+
+    def test_resume_failed_dates(self):
+        def flaky(request):
+            if '20150106' in str(request.url):
+                return httpx.Response(503)
+            return nbu_handler(request)
+
+        result = self.backfill(['USD'], flaky).run()
+        self.assertEqual((result.chunks_done, result.rows), (2, 9))
+        with open(self.checkpoint_path) as f:
+            self.assertEqual(
+                json.load(f)['failed'],
+                {'1:USD/UAH:2015-01-05:2015-01-08': ['2015-01-06']},
+            )
+
+        # only failed date is requested again
+        b = self.backfill(['USD'])
+        result = b.run()
+        self.assertEqual((result.chunks_done, result.rows), (3, 1))
+        self.assertEqual(len(self.clients[1].requested), 1)
+        self.assertEqual(b.checkpoint['failed'], {})
+
+    def test_window_requests(self):
+        b = self.backfill(['USD'], chunk_days=10)
+        result = b.run()
+        self.assertEqual((result.chunks_done, result.rows), (1, 10))
+        self.assertEqual(len(self.clients[0].requested), 1)
+        self.assertIn('start=20150101&end=20150110', self.clients[0].requested[0])
+
+    def test_single_date_window_mapped_by_range_mapper(self):
+        def handler(request):
+            # rate of 10 units, per unit rate is only in window responses
+            rows = json.loads(nbu_handler(request).text)
+            for r in rows:
+                r['rate'], r['units'] = r['rate'] * 10, 10
+                if 'start=' in str(request.url):
+                    r['rate_per_unit'] = r['rate'] / 10
+            return httpx.Response(200, text=json.dumps(rows))
+
+        b = self.backfill(['USD'], handler, chunk_days=10)
+        b._source_config = b._parse._source_config = dict(
+            b._source_config, max_window=9
+        )
+        b.run()
+        # trailing window of single date is mapped as window
+        self.assertEqual(len(self.clients[0].requested), 2)
+        self.assertIn('start=20150110&end=20150110', self.clients[0].requested[1])
+        self.assertEqual({r.exrate for r in self.rows}, {5.05})
+
+    def test_process_pool_and_store(self):
+        store = SQLiteRateStore()
+        self.backfill(['USD'], processes=1, store=store).run()
+        self.assertEqual(len(self.rows), 10)
+        stored = store.get_many(1, 840, 980, ['2015-01-01', '2015-01-10'])
+        self.assertEqual(stored['2015-01-10'][0][4], 5.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+'''Test batch runs of many series'''
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import httpx
+
+from exchrate.batch import BatchRun, Job, StreamSink, parse_jobs
+
+from .offline import OfflineClient, nbu_handler
+
+SPEC = '''
+# NBU series
+NBU-json:USD:UAH 2015-01-01 2015-01-10
+NBU-json:EUR:UAH 2015-01-05
+{"source":"NBU-json","basecur":"RUB","date_from":"2015-01-01","date_to":"2015-01-02"}
+'''
+
+
+class TestParseJobs(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(
+            parse_jobs(SPEC.splitlines()),
+            [
+                Job('NBU-json', 'USD', 'UAH', '2015-01-01', '2015-01-10'),
+                Job('NBU-json', 'EUR', 'UAH', '2015-01-05', '2015-01-05'),
+                Job('NBU-json', 'RUB', 'UAH', '2015-01-01', '2015-01-02'),
+            ],
+        )
+
+    def test_invalid(self):
+        for line in (
+            'NBU-json:USD 2015-01-01',
+            'NBU-json:USD:UAH',
+            'NBU-json:USD:UAH 2015-01-02 2015-01-01',
+            'XXX:USD:UAH 2015-01-01',
+            '{"source": "NBU-json"}',
+        ):
+            with self.assertRaisesRegex(ValueError, 'line 2'):
+                parse_jobs(['', line])
+
+
+class TestBatchRun(unittest.TestCase):
+    def setUp(self):
+        self.client = OfflineClient(retries=0)
+        self.addCleanup(self.client.close)
+        self.received = []
+
+    def sink(self, job, rows):
+        self.received.append((job.basecur, [r.exdate for r in rows]))
+
+    def run_batch(self, jobs, **kwargs):
+        run = BatchRun(jobs, self.sink, client=self.client, cache=False, **kwargs)
+        return asyncio.run(run.run())
+
+    def test_run(self):
+        result = self.run_batch(parse_jobs(SPEC.splitlines()), chunk_days=4)
+        self.assertEqual((result.jobs, result.rows, result.failed), (3, 13, {}))
+        self.assertEqual(result.requests, len(self.client.requested))
+        self.assertGreater(result.bytes, 0)
+        # chunks of series are passed to sink in date order
+        usd = [dates for cur, dates in self.received if cur == 'USD']
+        self.assertEqual(len(usd), 3)
+        self.assertEqual(usd[0][0], '2015-01-01')
+        self.assertEqual(usd[-1][-1], '2015-01-10')
+
+    def test_failed_dates(self):
+        def flaky(request):
+            if '20150102' in str(request.url):
+                return httpx.Response(503)
+            return nbu_handler(request)
+
+        self.client = OfflineClient(flaky, retries=0)
+        self.addCleanup(self.client.close)
+        job = Job('NBU-json', 'EUR', 'UAH', '2015-01-01', '2015-01-03')
+        result = self.run_batch([job])
+        self.assertEqual(result.rows, 2)
+        self.assertEqual(result.failed, {job: ['2015-01-02']})
+
+
+class TestStreamSink(unittest.TestCase):
+    rows = [(1, '2015-01-01', 980, 840, 5.05)]
+    job = Job('NBU-json', 'USD', 'UAH', '2015-01-01', '2015-01-01')
+
+    def test_per_series_files(self):
+        from exchrate.mappers import Exrate
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with StreamSink('jsonl', output_dir=tmpdir) as sink:
+                sink(self.job, [Exrate(*r) for r in self.rows])
+            with open(os.path.join(tmpdir, 'NBU-json_USD_UAH.jsonl')) as f:
+                self.assertEqual(
+                    json.loads(f.read()),
+                    {
+                        'source': 'NBU-json',
+                        'basecur': 'USD',
+                        'localcur': 'UAH',
+                        'date': '2015-01-01',
+                        'rate': 5.05,
+                    },
+                )
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, StreamSink, 'xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
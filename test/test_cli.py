@@ -0,0 +1,118 @@
+'''Test command line interface'''
+
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+
+from click.testing import CliRunner
+
+from exchrate import cli, ratecache
+
+from .offline import OfflineClient
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            'exchrate.client.get_default_client', return_value=OfflineClient()
+        )
+        self.client = patcher.start()()
+        self.addCleanup(patcher.stop)
+
+    def test_rates_csv(self):
+        result = CliRunner().invoke(cli.cli, ['2015-01-12', '2015-01-13'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(
+            result.output.splitlines(),
+            ['date,rate', '2015-01-12,5.05', '2015-01-13,5.05'],
+        )
+
+    def test_rates_command(self):
+        result = CliRunner().invoke(cli.cli, ['rates', '2015-01-12', '2015-01-12'])
+        self.assertEqual(result.output.splitlines(), ['date,rate', '2015-01-12,5.05'])
+
+    def test_rates_store(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            args = ['2015-03-02', '2015-03-03', '--store', os.path.join(tmpdir, 'r.db')]
+            result = CliRunner().invoke(cli.cli, args)
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertEqual(len(self.client.requested), 2)
+
+            # second run is answered from store
+            ratecache.shared_cache.clear()
+            result = CliRunner().invoke(cli.cli, args)
+            self.assertEqual(
+                result.output.splitlines()[1:], ['2015-03-02,5.05', '2015-03-03,5.05']
+            )
+            self.assertEqual(len(self.client.requested), 2)
+
+    def test_stats(self):
+        result = CliRunner().invoke(cli.cli, ['--stats', '2015-02-02', '2015-02-03'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(
+            result.stdout.splitlines()[1:], ['2015-02-02,5.05', '2015-02-03,5.05']
+        )
+        self.assertIn('http.request', result.stderr)
+
+    def test_poll_once(self):
+        start = (date.today() - timedelta(1)).isoformat()
+        result = CliRunner().invoke(
+            cli.cli,
+            ['poll', '--series', 'NBU-json:EUR:UAH', '--once', '--start-date', start],
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(
+            result.output.splitlines()[0], 'NBU-json,EUR,UAH,{},6.60742'.format(start)
+        )
+
+    def test_poll_bad_series(self):
+        result = CliRunner().invoke(cli.cli, ['poll', '--series', 'NBU-json', '--once'])
+        self.assertNotEqual(result.exit_code, 0)
+
+    def test_backfill(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, 'rates.csv')
+            result = CliRunner().invoke(
+                cli.cli,
+                [
+                    'backfill',
+                    'NBU-json',
+                    '2015-01-01',
+                    '2015-01-03',
+                    '--currency',
+                    'USD',
+                    '--output',
+                    output,
+                    '--processes',
+                    '0',
+                ],
+            )
+            self.assertEqual(result.exit_code, 0, result.output)
+            with open(output) as f:
+                lines = f.read().splitlines()
+            self.assertEqual(len(lines), 3)
+            self.assertEqual(lines[0], 'NBU-json,USD,UAH,2015-01-01,5.05')
+
+    def test_batch_stdin(self):
+        result = CliRunner().invoke(
+            cli.cli,
+            ['batch', '--format', 'jsonl'],
+            input='NBU-json:USD:UAH 2015-01-01 2015-01-02\n'
+            'NBU-json:EUR:UAH 2015-01-01\n',
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        lines = result.stdout.splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('"basecur": "EUR"', ''.join(lines))
+        self.assertIn('2 series, 3 rows', result.stderr)
+
+    def test_batch_bad_spec(self):
+        result = CliRunner().invoke(cli.cli, ['batch'], input='NBU-json:USD\n')
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('line 1', result.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+'''Test pooled rate client and async API'''
+
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from exchrate import ratecache
+
+from .offline import OfflineClient, OfflineParse, nbu_handler
+
+params = ('NBU-json', ('2015-01-12', '2015-01-15'), 'USD', 'UAH')
+
+
+class TestAsyncAPI(unittest.TestCase):
+    def test_aget_exch_rate(self):
+        async def main():
+            e = OfflineParse(*params, cache=False)
+            return await e.aget_exch_rate()
+
+        rates = asyncio.run(main())
+        self.assertEqual([t.exrate for t in rates], [5.05] * 4)
+
+    def test_sync_inside_running_loop(self):
+        async def main():
+            return OfflineParse(*params, cache=False).get_exch_rate()
+
+        self.assertEqual(len(asyncio.run(main())), 4)
+
+    def test_sync_wraps_async(self):
+        e = OfflineParse(*params, cache=False)
+        self.assertEqual(e.get_exch_rate(), asyncio.run(e.aget_exch_rate()))
+
+
+class TestRateClient(unittest.TestCase):
+    def test_shared_between_instances(self):
+        client = OfflineClient()
+        for basecur in ('USD', 'EUR'):
+            OfflineParse(
+                params[0], params[1], basecur, 'UAH', client=client, cache=False
+            ).get_exch_rate()
+        self.assertEqual(len(client.requested), 8)
+        self.assertEqual(len(client._pools), 1)
+        client.close()
+
+    def test_per_host_limit(self):
+        active = peak = 0
+
+        async def handler(request):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return httpx.Response(200, text='[]')
+
+        client = OfflineClient(handler, max_per_host=2)
+        e = OfflineParse(*params, client=client, cache=ratecache.RateCache())
+        self.assertEqual(e.get_exch_rate(), [])
+        self.assertEqual((len(client.requested), peak), (4, 2))
+        client.close()
+
+
+class TestCoalescing(unittest.TestCase):
+    def setUp(self):
+        async def handler(request):
+            await asyncio.sleep(0.1)
+            return nbu_handler(request)
+
+        self.client = OfflineClient(handler)
+
+    def tearDown(self):
+        self.client.close()
+
+    def parse(self):
+        return OfflineParse(*params, client=self.client, cache=False)
+
+    def test_async_callers(self):
+        async def main():
+            return await asyncio.gather(
+                *(self.parse().aget_exch_rate() for _ in range(5))
+            )
+
+        results = asyncio.run(main())
+        self.assertTrue(all(r == results[0] for r in results))
+        self.assertEqual(len(self.client.requested), 4)
+        self.assertEqual((self.client.flights, self.client.coalesced), (4, 16))
+
+    def test_sync_and_async_callers(self):
+        with ThreadPoolExecutor(3) as pool:
+            futures = [pool.submit(self.parse().get_exch_rate) for _ in range(3)]
+            rates = asyncio.run(self.parse().aget_exch_rate())
+            self.assertTrue(all(f.result() == rates for f in futures))
+        self.assertEqual(len(self.client.requested), 4)
+        self.assertEqual(self.client.coalesced, 12)
+
+    def test_leader_cancelled(self):
+        async def main():
+            url = 'https://bank.gov.ua/?date=20150112&json'
+            leader = asyncio.ensure_future(
+                self.client.get_coalesced(url, lambda: self.client.get(url))
+            )
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(
+                self.client.get_coalesced(url, lambda: self.client.get(url))
+            )
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await follower
+
+        self.assertEqual(asyncio.run(main()).status_code, 200)
+        self.assertEqual(len(self.client.requested), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
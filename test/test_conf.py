@@ -18,6 +18,26 @@ class TestCurrencyCode(unittest.TestCase):
         self.assertEqual(self.cur.get_ccy_num_code('NA'), -1)
 
 
+class TestCurrencyIndex(unittest.TestCase):
+    def test_lookups(self):
+        index = config.get_ccy_index()
+        self.assertEqual(index.num_codes['USD'], 840)
+        self.assertEqual(index.char_codes[980], 'UAH')
+
+    def test_loaded_once(self):
+        self.assertIs(config.get_ccy_index(), config.get_ccy_index())
+
+    def test_read_only(self):
+        with self.assertRaises(TypeError):
+            config.get_ccy_index().num_codes['XXX'] = 1
+
+    def test_matches_xml(self):
+        self.assertEqual(
+            dict(config.get_ccy_index().num_codes),
+            config.CurrencyCode().get_ccy_codes(),
+        )
+
+
 class TestExchangeRateSource(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -29,6 +49,12 @@ class TestExchangeRateSource(unittest.TestCase):
     def test_get_source_config_bad(self):
         self.assertFalse(self.source_obj.get_source_config('N/a'))
 
+    def test_module_get_source_config(self):
+        self.assertEqual(
+            config.get_source_config('NBU-json'),
+            self.source_obj.get_source_config('NBU-json'),
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,84 @@
+'''Test bulk currency conversion'''
+
+import unittest
+
+from exchrate import ratecache
+
+from .offline import OfflineClient
+
+try:
+    import numpy as np
+
+    from exchrate.convert import RateConverter
+except ImportError:
+    np = None
+
+rows = [
+    (1, '2015-01-12', 980, 840, 15.0),
+    (1, '2015-01-12', 980, 978, 18.0),
+    (1, '2015-01-13', 980, 840, 16.0),
+]
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestRateConverter(unittest.TestCase):
+    def setUp(self):
+        self.conv = RateConverter(rows)
+
+    def test_to_local(self):
+        result = self.conv.convert([1, 2], ['2015-01-12', '2015-01-13'], 'USD', 'UAH')
+        self.assertEqual(result.amounts.tolist(), [15.0, 32.0])
+        self.assertEqual(result.missing.tolist(), [])
+
+    def test_from_local(self):
+        result = self.conv.convert([30.0], '2015-01-12', 980, 840)
+        self.assertEqual(result.amounts.tolist(), [2.0])
+
+    def test_scalar_amount(self):
+        result = self.conv.convert(100, ['2015-01-12', '2015-01-13'], 'USD', 'UAH')
+        self.assertEqual(result.amounts.tolist(), [1500.0, 1600.0])
+
+    def test_triangulation(self):
+        result = self.conv.convert([10.0], ['2015-01-12'], 'EUR', 'USD')
+        self.assertAlmostEqual(result.amounts[0], 12.0)
+        self.assertAlmostEqual(result.rates[0], 1.2)
+
+    def test_mixed_currencies(self):
+        result = self.conv.convert(
+            [1, 1, 1], '2015-01-12', ['USD', 'EUR', 'UAH'], ['EUR', 'UAH', 'USD']
+        )
+        np.testing.assert_allclose(result.rates, [15 / 18, 18.0, 1 / 15])
+
+    def test_missing_reported(self):
+        result = self.conv.convert(
+            [1, 1, 1, 1],
+            np.array(['2015-01-12', '2015-01-13', '2015-02-01', '2015-01-12'], 'M8[D]'),
+            ['USD', 'EUR', 'USD', 'XXX'],
+            'UAH',
+        )
+        self.assertEqual(result.missing.tolist(), [1, 2, 3])
+        self.assertEqual(result.amounts[0], 15.0)
+        self.assertTrue(np.isnan(result.amounts[1:]).all())
+
+    def test_several_local_currencies(self):
+        self.assertRaises(
+            ValueError, RateConverter, rows + [(2, '2015-01-12', 978, 840, 1.1)]
+        )
+
+    def test_fetch(self):
+        client = OfflineClient()
+        conv = RateConverter.fetch(
+            'NBU-json',
+            ('2015-01-12', '2015-01-13'),
+            ['USD', 'EUR', 'UAH'],
+            client=client,
+            cache=ratecache.RateCache(),
+        )
+        self.assertEqual(len(client.requested), 2)
+        result = conv.convert([6.60742], '2015-01-13', 'EUR', 'UAH')
+        self.assertAlmostEqual(result.amounts[0], 6.60742 * 6.60742)
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
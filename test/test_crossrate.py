@@ -0,0 +1,85 @@
+'''Test cross-rate matrices'''
+
+import unittest
+from datetime import date
+
+from exchrate import ratecache
+
+from .offline import OfflineClient
+
+try:
+    import numpy as np
+
+    from exchrate.crossrate import CrossRates
+except ImportError:
+    np = None
+
+rows = [
+    (1, '2015-01-12', 980, 840, 15.0),
+    (1, '2015-01-12', 980, 978, 18.0),
+    (1, '2015-01-13', 980, 840, 16.0),
+    (1, '2015-01-13', 980, 978, 20.0),
+    (1, '2015-01-14', 980, 840, 17.0),
+]
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestCrossRates(unittest.TestCase):
+    def setUp(self):
+        self.cross = CrossRates(rows)
+
+    def test_positions(self):
+        self.assertEqual(self.cross.ccy_codes.tolist(), [840, 978, 980])
+        self.assertEqual(self.cross.position('EUR'), 1)
+        self.assertEqual(self.cross.position(980), 2)
+        self.assertRaises(KeyError, self.cross.position, 'GBP')
+
+    def test_matrix(self):
+        m = self.cross.matrix('2015-01-12')
+        np.testing.assert_allclose(
+            m,
+            [[1, 15 / 18, 15], [18 / 15, 1, 18], [1 / 15, 1 / 18, 1]],
+        )
+        # published rates are kept exactly, diagonal is exactly 1
+        self.assertEqual(m[:, 2].tolist(), [15.0, 18.0, 1.0])
+        self.assertEqual(np.diag(m).tolist(), [1.0] * 3)
+
+    def test_rate(self):
+        self.assertEqual(self.cross.rate('2015-01-13', 'EUR', 'USD'), 1.25)
+        self.assertEqual(self.cross.rate(date(2015, 1, 13), 840, 'UAH'), 16.0)
+        self.assertTrue(np.isnan(self.cross.rate('2015-01-14', 'EUR', 'UAH')))
+        self.assertRaises(KeyError, self.cross.rate, '2015-01-15', 'EUR', 'USD')
+
+    def test_stack(self):
+        matrices, ordinals = self.cross.stack('2015-01-13', '2015-01-20')
+        self.assertEqual(matrices.shape, (2, 3, 3))
+        self.assertEqual(
+            ordinals.tolist(),
+            [date(2015, 1, 13).toordinal(), date(2015, 1, 14).toordinal()],
+        )
+        np.testing.assert_array_equal(matrices[0], self.cross.matrix('2015-01-13'))
+        self.assertEqual(self.cross.stack()[0].shape, (3, 3, 3))
+
+    def test_several_local_currencies(self):
+        self.assertRaises(
+            ValueError, CrossRates, rows + [(2, '2015-01-12', 978, 840, 1.1)]
+        )
+
+    def test_fetch_all_currencies(self):
+        client = OfflineClient()
+        cross = CrossRates.fetch(
+            'NBU-json',
+            ('2015-01-12', '2015-01-13'),
+            client=client,
+            cache=ratecache.RateCache(),
+        )
+        # single all currency request per date
+        self.assertEqual(len(client.requested), 2)
+        self.assertNotIn('valcode', client.requested[0])
+        self.assertEqual(cross.ccy_codes.tolist(), [643, 840, 978, 980])
+        self.assertAlmostEqual(cross.rate('2015-01-13', 'EUR', 'USD'), 6.60742 / 5.05)
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+'''Test incremental polling daemon'''
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+import httpx
+
+from exchrate.daemon import RatePoller, Series, csv_sink
+
+from .offline import OfflineClient, nbu_handler
+
+
+class TestRatePoller(unittest.TestCase):
+    def setUp(self):
+        self.client = OfflineClient()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.tmpdir.name, 'state.json')
+        self.start = (date.today() - timedelta(2)).isoformat()
+        self.received = []
+
+    def tearDown(self):
+        self.client.close()
+        self.tmpdir.cleanup()
+
+    def poller(self, series, sink=None):
+        return RatePoller(
+            series,
+            sink or (lambda s, rows: self.received.append((s.basecur, len(rows)))),
+            state_path=self.state_path,
+            start_date=self.start,
+            client=self.client,
+            cache=False,
+        )
+
+    def test_shared_requests_and_watermarks(self):
+        series = [Series('NBU-json', 'USD', 'UAH'), Series('NBU-json', 'EUR', 'UAH')]
+        self.assertEqual(asyncio.run(self.poller(series).poll()), 6)
+        self.assertEqual(sorted(self.received), [('EUR', 3), ('USD', 3)])
+        self.assertEqual(len(self.client.requested), 3)
+        # watermarks never move past yesterday
+        yesterday = (date.today() - timedelta(1)).isoformat()
+        with open(self.state_path) as f:
+            self.assertEqual(
+                json.load(f),
+                {'NBU-json:EUR:UAH': yesterday, 'NBU-json:USD:UAH': yesterday},
+            )
+
+        # watermarks are loaded by new poller, only today is requested again
+        poller = self.poller(series)
+        self.assertEqual(asyncio.run(poller.poll()), 2)
+        self.assertEqual(len(self.client.requested), 4)
+        # rows passed to sink are not passed again by same poller
+        self.assertEqual(asyncio.run(poller.poll()), 0)
+
+    def test_watermark_before_failed_date(self):
+        failed = (date.today() - timedelta(1)).strftime('%Y%m%d')
+
+        def handler(request):
+            if failed in str(request.url):
+                return httpx.Response(503)
+            return nbu_handler(request)
+
+        self.client.close()
+        self.client = OfflineClient(handler, retries=0)
+        poller = self.poller([('NBU-json', 'USD', 'UAH')])
+        self.assertEqual(asyncio.run(poller.poll()), 2)
+        self.assertEqual(poller.watermarks, {'NBU-json:USD:UAH': self.start})
+
+    def test_only_dates_after_watermark(self):
+        yesterday = (date.today() - timedelta(1)).isoformat()
+        with open(self.state_path, 'w') as f:
+            json.dump({'NBU-json:USD:UAH': yesterday}, f)
+        poller = self.poller([('NBU-json', 'USD', 'UAH')])
+        self.assertEqual(asyncio.run(poller.poll()), 1)
+        self.assertEqual(len(self.client.requested), 1)
+
+    def test_run_until_stopped(self):
+        async def main():
+            stop = asyncio.Event()
+            poller = self.poller([('NBU-json', 'USD', 'UAH')])
+            poller.cadence = {'NBU-json': 0.01}
+            task = asyncio.ensure_future(poller.run(stop))
+            await asyncio.sleep(0.05)
+            stop.set()
+            await task
+
+        asyncio.run(main())
+        self.assertEqual(self.received, [('USD', 3)])
+
+    def test_error_keeps_polling(self):
+        def handler(request):
+            if 'valcode=EUR' in str(request.url):
+                return httpx.Response(200, text='<html>maintenance</html>')
+            return nbu_handler(request)
+
+        self.client.close()
+        self.client = OfflineClient(handler)
+        series = [('NBU-json', 'USD', 'UAH'), ('NBU-json', 'EUR', 'USD')]
+        poller = self.poller(series)
+        with self.assertLogs('exchrate.daemon', 'ERROR'):
+            self.assertEqual(asyncio.run(poller.poll()), 3)
+        self.assertEqual(poller.errors, 1)
+        self.assertEqual(list(poller.watermarks), ['NBU-json:USD:UAH'])
+
+    def test_csv_sink(self):
+        path = os.path.join(self.tmpdir.name, 'rates.csv')
+        asyncio.run(self.poller([('NBU-json', 'USD', 'UAH')], csv_sink(path)).poll())
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'NBU-json,USD,UAH,{},5.05'.format(self.start))
+        self.assertEqual(len(lines), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
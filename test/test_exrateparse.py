@@ -1,8 +1,17 @@
 '''Test exhange rate parsing module'''
 
+import asyncio
+import json
+import random
 import unittest
+from datetime import datetime
 
-from exchrate import exrateparse
+import httpx
+
+from exchrate import exrateparse, ratecache
+from exchrate.asof import AsOfIndex
+
+from .offline import OfflineClient, OfflineParse, nbu_payload
 
 # exchange rate parser class
 exrateparser = exrateparse.ExchangeRateParse
@@ -69,5 +78,215 @@ class ExchRateTestException(unittest.TestCase):
         )
 
 
+class ExchRateTestMultiCurrency(unittest.TestCase):
+    '''Test multi currency requests against offline NBU stand-in'''
+
+    params = ('NBU-json', ('2015-01-12', '2015-01-13'), 'USD', 'UAH')
+
+    def test_one_request_per_date(self):
+        e = OfflineParse(*self.params, cache=ratecache.RateCache())
+        rates = e.get_multi_exch_rate(['EUR', 'USD'])
+        self.assertEqual(len(e.requested), 2)
+        self.assertNotIn('valcode', e.requested[0])
+        self.assertEqual(
+            [(t.exdate, t.basecur) for t in rates],
+            [
+                ('2015-01-12', 978),
+                ('2015-01-12', 840),
+                ('2015-01-13', 978),
+                ('2015-01-13', 840),
+            ],
+        )
+
+    def test_currencies_requested_concurrently(self):
+        in_flight, peaks = [], []
+
+        async def handler(request):
+            in_flight.append(request)
+            peaks.append(len(in_flight))
+            await asyncio.sleep(0.05)
+            in_flight.remove(request)
+            return httpx.Response(200, text=nbu_payload(str(request.url)))
+
+        e = OfflineParse(*self.params, cache=False, client=OfflineClient(handler))
+        # source without all currency url
+        e._source_config = dict(e._source_config, url_all=None)
+        rates = e.get_multi_exch_rate(['EUR', 'USD'])
+        self.assertEqual(len(e.requested), 4)
+        self.assertEqual(len(rates), 4)
+        # requests of both currencies were in flight at once
+        self.assertEqual(max(peaks), 4)
+        e.client.close()
+
+    def test_cached_per_currency(self):
+        cache = ratecache.RateCache()
+        OfflineParse(*self.params, cache=cache).get_multi_exch_rate(['EUR', 'USD'])
+        e = OfflineParse(*self.params, cache=cache)
+        self.assertEqual([t.exrate for t in e.get_exch_rate()], [5.05, 5.05])
+        self.assertEqual(e.requested, [])
+
+
+class ExchRateTestStreaming(unittest.TestCase):
+    '''Test streaming of rows against offline NBU stand-in'''
+
+    params = ('NBU-json', ('2015-01-01', '2015-01-20'), 'USD', 'UAH')
+    dates = ['2015-01-{:02d}'.format(day) for day in range(1, 21)]
+    month = ['2015-01-{:02d}'.format(day) for day in range(1, 32)]
+
+    def setUp(self):
+        self.active = self.peak = 0
+
+        async def handler(request):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(random.random() / 100)
+            self.active -= 1
+            return httpx.Response(200, text=nbu_payload(str(request.url)))
+
+        self.client = OfflineClient(handler)
+
+    def tearDown(self):
+        self.client.close()
+
+    def parse(self, **kwargs):
+        e = OfflineParse(*self.params, client=self.client, **kwargs)
+        # one request per date
+        e._source_config = dict(e._source_config, url_range=None)
+        return e
+
+    def test_ordered(self):
+        e = self.parse(cache=False)
+        rows = list(e.iter_exch_rate(ordered=True, buffer_size=4))
+        self.assertEqual([r.exdate for r in rows], self.dates)
+        self.assertLessEqual(self.peak, 4)
+
+    def test_unordered(self):
+        e = self.parse(cache=False)
+        rows = list(e.iter_exch_rate(buffer_size=3))
+        self.assertEqual(sorted(r.exdate for r in rows), self.dates)
+        self.assertLessEqual(self.peak, 3)
+
+    def test_async_with_cached_dates(self):
+        cache = ratecache.RateCache()
+        e = self.parse(cache=cache)
+        e.exratedate = ('2015-01-05', '2015-01-10')
+        e.get_exch_rate()
+        e.exratedate = self.params[1]
+
+        async def collect():
+            return [r.exdate async for r in e.aiter_exch_rate(ordered=True)]
+
+        self.assertEqual(asyncio.run(collect()), self.dates)
+        self.assertEqual(len(self.client.requested), 20)
+
+    def test_early_stop(self):
+        e = self.parse(cache=False)
+        for _ in e.iter_exch_rate(ordered=True, buffer_size=2):
+            break
+        self.assertLessEqual(len(self.client.requested), 4)
+
+    def test_windows(self):
+        e = OfflineParse(
+            'NBU-json', ('2015-01-01', '2015-03-31'), 'USD', 'UAH', cache=False
+        )
+        e._source_config = dict(e._source_config, max_window=30)
+        rows = list(e.iter_exch_rate(ordered=True, buffer_size=2))
+        self.assertEqual(len(e.requested), 3)
+        self.assertTrue(all('start=' in url for url in e.requested))
+        self.assertEqual(len(rows), 90)
+        self.assertEqual(rows, sorted(rows, key=lambda r: r.exdate))
+        e.client.close()
+
+    def test_asof_windows(self):
+        def handler(request):
+            # no rates are published on 2015-01-07 and weekends
+            rows = [
+                r
+                for r in json.loads(nbu_payload(str(request.url)))
+                if r['exchangedate'] != '07.01.2015'
+                and datetime.strptime(r['exchangedate'], '%d.%m.%Y').weekday() < 5
+            ]
+            return httpx.Response(200, text=json.dumps(rows))
+
+        client = OfflineClient(handler)
+        for ordered in (True, False):
+            e = OfflineParse(
+                'NBU-json',
+                ('2015-01-01', '2015-01-31'),
+                'USD',
+                'UAH',
+                cache=False,
+                asof=AsOfIndex(1, 980, 840, rest_weekdays={5, 6}),
+                client=client,
+            )
+            rows = list(e.iter_exch_rate(ordered=ordered))
+            self.assertEqual(sorted(r.exdate for r in rows), self.month)
+            self.assertEqual(
+                {r.exdate: r.exrate for r in rows}, dict.fromkeys(self.month, 5.05)
+            )
+            self.assertEqual(e._last_failed, [])
+        # single window up to last Friday, Saturday is as-of value
+        self.assertEqual(len(client.requested), 2)
+        self.assertIn('start=20150101&end=20150130', client.requested[0])
+        client.close()
+
+
+class ExchRateTestWindows(unittest.TestCase):
+    def parse(self, dates, **kwargs):
+        return OfflineParse('NBU-json', dates, 'USD', 'UAH', cache=False, **kwargs)
+
+    def test_plan_windows(self):
+        e = self.parse('2015-01-01')
+        dates = list(e.split_dates(('2015-01-01', '2015-01-10')))
+        dates += ['2015-01-20', '2015-01-22']
+        e._source_config = dict(e._source_config, max_window=4, min_window=3)
+        windows, single = e._plan_windows(dates)
+        self.assertEqual(
+            [(w[0], w[-1]) for w in windows],
+            [
+                ('2015-01-01', '2015-01-04'),
+                ('2015-01-05', '2015-01-08'),
+                ('2015-01-09', '2015-01-10'),
+            ],
+        )
+        self.assertEqual(single, ['2015-01-20', '2015-01-22'])
+
+    def test_plan_windows_with_gaps(self):
+        e = self.parse('2015-01-01')
+        e._source_config = dict(e._source_config, min_window=3)
+        dates = ['2015-01-02', '2015-01-05', '2015-01-06', '2015-01-12']
+        gaps = ['2015-01-03', '2015-01-04', '2015-01-07', '2015-01-10', '2015-01-11']
+        windows, single = e._plan_windows(dates, gaps)
+        # gaps join runs, but windows do not start or end with them
+        self.assertEqual(
+            windows,
+            [['2015-01-02', '2015-01-03', '2015-01-04', '2015-01-05', '2015-01-06']],
+        )
+        self.assertEqual(single, ['2015-01-12'])
+
+    def test_window_requests(self):
+        e = self.parse(('2015-01-01', '2015-01-31'))
+        rates = e.get_exch_rate()
+        self.assertEqual(len(e.requested), 1)
+        self.assertIn('start=20150101&end=20150131', e.requested[0])
+        self.assertEqual(len(rates), 31)
+        self.assertEqual(rates[0], (1, '2015-01-01', 980, 840, 5.05))
+        self.assertEqual(
+            rates, self.parse(('2015-01-01', '2015-01-31')).get_exch_rate()
+        )
+
+    def test_failed_window(self):
+        client = OfflineClient(lambda request: httpx.Response(503), retries=0)
+        e = self.parse(('2015-01-01', '2015-01-10'), client=client)
+        self.assertEqual(e.get_exch_rate(), [])
+        self.assertEqual(len(e._last_failed), 10)
+
+    def test_short_runs_per_date(self):
+        e = self.parse(('2015-01-01', '2015-01-03'))
+        e.get_exch_rate()
+        self.assertEqual(len(e.requested), 3)
+        self.assertTrue(all('date=' in url for url in e.requested))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,121 @@
+'''Test hedged multi-source fetching'''
+
+import asyncio
+import json
+import unittest
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from exchrate import config
+from exchrate.hedge import HedgedExchangeRateParse, LatencyTracker
+
+from .offline import OfflineClient, nbu_handler
+
+
+def two_sources(nbu_delay=0.0, fixer_delay=0.0, nbu_status=200):
+    '''returns handler answering like NBU and Fixer with given delays'''
+
+    async def handler(request):
+        url = urlsplit(str(request.url))
+        if url.netloc == 'bank.gov.ua':
+            await asyncio.sleep(nbu_delay)
+            if nbu_status != 200:
+                return httpx.Response(nbu_status)
+            return nbu_handler(request)
+        await asyncio.sleep(fixer_delay)
+        query = parse_qs(url.query)
+        return httpx.Response(
+            200,
+            text=json.dumps(
+                {
+                    'base': query['base'][0],
+                    'date': url.path.strip('/'),
+                    'rates': {query['symbols'][0]: 5.1},
+                }
+            ),
+        )
+
+    return handler
+
+
+class TestHedgedParse(unittest.TestCase):
+    def parse(self, handler, **kwargs):
+        self.client = OfflineClient(handler, retries=0)
+        self.addCleanup(self.client.close)
+        return HedgedExchangeRateParse(
+            None,
+            ('2015-01-12', '2015-01-13'),
+            'USD',
+            'UAH',
+            client=self.client,
+            cache=False,
+            **kwargs,
+        )
+
+    def test_pair_sources(self):
+        self.assertEqual(
+            config.get_pair_sources('USD', 'UAH'), ['NBU-json', 'ECB-Fixer']
+        )
+        self.assertEqual(config.get_pair_sources('USD', 'EUR'), ['ECB-Fixer'])
+
+    def test_primary_in_budget(self):
+        tracker = LatencyTracker()
+        e = self.parse(two_sources(), hedge_after=0.5, tracker=tracker)
+        rows = e.get_exch_rate()
+        self.assertEqual([r.sourceid for r in rows], [1, 1])
+        self.assertEqual(tracker.hedges, 0)
+        self.assertTrue(all('bank.gov.ua' in url for url in self.client.requested))
+
+    def test_slow_primary_hedged(self):
+        tracker = LatencyTracker()
+        e = self.parse(two_sources(nbu_delay=0.5), hedge_after=0.02, tracker=tracker)
+        rows = e.get_exch_rate()
+        self.assertEqual([(r.sourceid, r.exrate) for r in rows], [(2, 5.1)] * 2)
+        self.assertEqual(tracker.hedges, 2)
+        self.assertEqual(tracker.wins, {'ECB-Fixer': 2})
+        # cancelled primary requests are recorded as at least hedge budget
+        self.assertGreaterEqual(tracker.expected('NBU-json'), 0.02)
+        self.assertLess(tracker.expected('NBU-json'), tracker.default_latency)
+        # faster source becomes primary
+        self.assertEqual(tracker.rank(['NBU-json', 'ECB-Fixer'])[0], 'ECB-Fixer')
+
+    def test_failed_primary_hedged_at_once(self):
+        tracker = LatencyTracker()
+        e = self.parse(two_sources(nbu_status=503), hedge_after=10, tracker=tracker)
+        rows = e.get_exch_rate()
+        self.assertEqual([r.sourceid for r in rows], [2, 2])
+        self.assertEqual(e._last_failed, [])
+
+    def test_all_failed(self):
+        e = self.parse(lambda request: httpx.Response(503), hedge_after=0.01)
+        self.assertEqual(e.get_exch_rate(), [])
+        self.assertEqual(e._last_failed, ['2015-01-12', '2015-01-13'])
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_budget_and_rank(self):
+        tracker = LatencyTracker(default_latency=1.0, min_budget=0.05)
+        self.assertEqual(tracker.rank(['a', 'b']), ['a', 'b'])
+        self.assertEqual(tracker.budget('a'), 1.0)
+        for _ in range(20):
+            tracker.record('a', 0.2)
+            tracker.record('b', 0.1)
+        self.assertEqual(tracker.rank(['a', 'b']), ['b', 'a'])
+        self.assertAlmostEqual(tracker.budget('a'), 0.2, places=1)
+        self.assertEqual(LatencyTracker(min_budget=0.05).budget('x'), 1.0)
+        tracker.record('b', 1.0, ok=False)
+        self.assertGreater(tracker.expected('b'), tracker.expected('a'))
+
+    def test_censored_latency(self):
+        tracker = LatencyTracker()
+        tracker.record('a', 0.5)
+        # cancelled request shorter than expected latency tells nothing new
+        tracker.record('a', 0.1, censored=True)
+        self.assertEqual(tracker.expected('a'), 0.5)
+        tracker.record('a', 1.5, censored=True)
+        self.assertGreater(tracker.expected('a'), 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+'''Test import time of package and warm lookups'''
+
+import subprocess
+import sys
+import textwrap
+import unittest
+
+# cumulative import time of package in microseconds. Generous to keep test
+# stable on slow machines, package importing httpx takes several times more
+IMPORT_BUDGET_US = 100000
+
+# modules which must not be imported before first request
+HEAVY_MODULES = ('httpx', 'asyncio', 'click', 'xml.etree.ElementTree', 'urllib.request')
+
+
+def run_python(code, *args):
+    '''runs code in fresh interpreter and returns (stdout, stderr)'''
+    result = subprocess.run(
+        [sys.executable, *args, '-c', textwrap.dedent(code)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout, result.stderr
+
+
+def parse_importtime(stderr):
+    '''returns dict with module: cumulative import time in microseconds'''
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:') :].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    def test_import_budget(self):
+        _, stderr = run_python(
+            'from exchrate import ExchangeRateParse, config', '-X', 'importtime'
+        )
+        times = parse_importtime(stderr)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, times)
+        self.assertLess(
+            times['exchrate'] + times['exchrate.exrateparse'], IMPORT_BUDGET_US
+        )
+
+    def test_lazy_attribute(self):
+        stdout, _ = run_python(
+            '''
+            import sys
+            import exchrate
+            print('exchrate.exrateparse' in sys.modules)
+            print(exchrate.ExchangeRateParse.__name__)
+            '''
+        )
+        self.assertEqual(stdout.split(), ['False', 'ExchangeRateParse'])
+
+    def test_warm_lookup_without_httpx(self):
+        stdout, _ = run_python(
+            '''
+            import sys
+            from exchrate import ExchangeRateParse
+            from exchrate.ratestore import SQLiteRateStore
+
+            store = SQLiteRateStore()
+            row = (1, '2015-01-12', 980, 840, 5.05)
+            store.put_many(1, 840, 980, {'2015-01-12': [row]})
+            e = ExchangeRateParse('NBU-json', '2015-01-12', 'USD', 'UAH', store=store)
+            print(e.get_exch_rate()[0].exrate)
+            print(list(e.iter_exch_rate())[0].exrate)
+            print(e.get_exch_rate()[0].exrate)
+            print('httpx' in sys.modules, 'asyncio' in sys.modules)
+            '''
+        )
+        self.assertEqual(stdout.split(), ['5.05', '5.05', '5.05', 'False', 'False'])
+
+
+if __name__ == '__main__':
+    unittest.main()
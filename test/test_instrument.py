@@ -0,0 +1,92 @@
+'''Test instrumentation hooks'''
+
+import threading
+import unittest
+
+import httpx
+
+from exchrate import instrument
+from exchrate.instrument import StatsCollector
+
+from .offline import OfflineClient, OfflineParse, nbu_handler
+
+
+class TestInstrument(unittest.TestCase):
+    def test_noop_without_hooks(self):
+        self.assertEqual(instrument.hooks, [])
+        self.assertIs(instrument.span('map'), instrument.span('http.request'))
+        instrument.count('requests')
+
+    def test_pipeline_events(self):
+        events = []
+        instrument.add_hook(events.append)
+        try:
+            OfflineParse(
+                'NBU-json', ('2015-01-12', '2015-01-13'), 'USD', 'UAH', cache=False
+            ).get_exch_rate()
+        finally:
+            instrument.remove_hook(events.append)
+
+        names = {(e.kind, e.name) for e in events}
+        for name in ('build_urls', 'scheduler.wait', 'http.request', 'map'):
+            self.assertIn(('span', name), names)
+        requests = [e for e in events if e.name == 'http.request']
+        self.assertEqual([e.attrs['status'] for e in requests], [200, 200])
+        self.assertEqual(sum(e.value for e in events if e.name == 'rows.mapped'), 2)
+
+    def test_collector(self):
+        calls = []
+
+        def flaky(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return httpx.Response(503)
+            return nbu_handler(request)
+
+        with StatsCollector() as collector:
+            OfflineParse(
+                'NBU-json',
+                '2015-01-12',
+                'USD',
+                'UAH',
+                cache=False,
+                client=OfflineClient(flaky, backoff=0),
+            ).get_exch_rate()
+        self.assertEqual(instrument.hooks, [])
+        self.assertEqual(collector.counters['requests'], 2)
+        self.assertEqual(collector.counters['retries'], 1)
+        self.assertEqual(collector.counters['rows.mapped'], 1)
+        self.assertGreater(collector.counters['bytes'], 0)
+        self.assertEqual(collector.totals['http.request'][0], 2)
+        p50 = collector.percentile('http.request', 50)
+        self.assertLessEqual(p50, collector.totals['http.request'][2])
+        self.assertIn('http.request', collector.summary())
+
+    def test_percentile(self):
+        collector = StatsCollector()
+        for value in (0.001, 0.002, 0.003, 1.0):
+            collector(instrument.Event('x', 'span', value, {}))
+        self.assertLess(collector.percentile('x', 50), 0.005)
+        self.assertEqual(collector.percentile('x', 100), 1.0)
+        self.assertIsNone(collector.percentile('y', 50))
+
+    def test_collector_threads(self):
+        collector = StatsCollector()
+
+        def emit():
+            for _ in range(2000):
+                collector(instrument.Event('requests', 'count', 1, {}))
+                collector(instrument.Event('x', 'span', 0.001, {}))
+
+        threads = [threading.Thread(target=emit) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(collector.counters['requests'], 16000)
+        self.assertEqual(collector.totals['x'][0], 16000)
+        self.assertEqual(sum(collector.spans['x']), 16000)
+
+
+if __name__ == '__main__':
+    unittest.main()
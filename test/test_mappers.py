@@ -0,0 +1,76 @@
+'''Test mapping of source responses'''
+
+import json
+import unittest
+
+from exchrate import config, exrateparse, mappers
+
+nbu_payload = json.dumps(
+    [
+        {'r030': 840, 'cc': 'USD', 'rate': 5.05, 'exchangedate': '09.01.2007'},
+        {'r030': 978, 'cc': 'EUR', 'rate': 6.60742, 'exchangedate': '09.01.2007'},
+    ]
+)
+fixer_payload = json.dumps(
+    {'base': 'EUR', 'date': '2016-12-01', 'rates': {'PLN': 4.4, 'USD': 1.06}}
+)
+
+
+class TestMappers(unittest.TestCase):
+    def test_nbu(self):
+        self.assertEqual(
+            mappers.map_nbu_gov_ua(nbu_payload, 1),
+            [(1, '2007-01-09', 980, 840, 5.05), (1, '2007-01-09', 980, 978, 6.60742)],
+        )
+        self.assertEqual(mappers.map_nbu_gov_ua('[]', 1), [])
+
+    def test_fixer(self):
+        self.assertEqual(
+            mappers.map_ecb_fixer(fixer_payload, 2, config.get_ccy_index().num_codes),
+            [(2, '2016-12-01', 985, 978, 4.4), (2, '2016-12-01', 840, 978, 1.06)],
+        )
+
+    def test_nbu_range(self):
+        payload = json.dumps(
+            [
+                {'r030': 392, 'rate': 2.5, 'units': 10, 'exchangedate': '09.01.2007'},
+                {'r030': 840, 'rate_per_unit': 5.05, 'exchangedate': '10.01.2007'},
+            ]
+        )
+        self.assertEqual(
+            mappers.map_nbu_gov_ua_range(payload, 1),
+            [(1, '2007-01-09', 980, 392, 0.25), (1, '2007-01-10', 980, 840, 5.05)],
+        )
+
+    def test_fixer_timeseries(self):
+        payload = json.dumps(
+            {
+                'base': 'EUR',
+                'rates': {'2016-12-01': {'USD': 1.06}, '2016-12-02': {'USD': 1.07}},
+            }
+        )
+        self.assertEqual(
+            mappers.map_ecb_fixer_timeseries(
+                payload, 2, config.get_ccy_index().num_codes
+            ),
+            [(2, '2016-12-01', 840, 978, 1.06), (2, '2016-12-02', 840, 978, 1.07)],
+        )
+        self.assertEqual(mappers.map_ecb_fixer_timeseries('{}', 2, {}), [])
+
+    def test_bytes_payload(self):
+        self.assertEqual(len(mappers.map_nbu_gov_ua(nbu_payload.encode(), 1)), 2)
+
+    def test_date_parsed_once(self):
+        mappers.parse_date.cache_clear()
+        mappers.map_nbu_gov_ua(nbu_payload, 1)
+        self.assertEqual(mappers.parse_date.cache_info().misses, 1)
+
+    def test_parse_method(self):
+        e = exrateparse.ExchangeRateParse('ECB-Fixer', '2016-12-01', 'EUR', 'PLN')
+        self.assertEqual(
+            e._map_response([fixer_payload])[0], (2, '2016-12-01', 985, 978, 4.4)
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
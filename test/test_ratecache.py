@@ -0,0 +1,56 @@
+'''Test in-memory rate cache'''
+
+import unittest
+from datetime import date
+from unittest import mock
+
+from exchrate import ratecache
+
+from .offline import OfflineParse
+
+
+class TestRateCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ratecache.RateCache(maxsize=2, ttl=60)
+
+    def test_hit_miss(self):
+        self.cache.put_many(1, 840, 980, {'2007-01-09': [(1, '2007-01-09')]})
+        self.assertEqual(
+            self.cache.get_many(1, 840, 980, ['2007-01-09', '2007-01-10']),
+            {'2007-01-09': ((1, '2007-01-09'),)},
+        )
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_lru_eviction(self):
+        self.cache.put_many(1, 840, 980, {'2007-01-09': [], '2007-01-10': []})
+        self.cache.get_many(1, 840, 980, ['2007-01-09'])
+        self.cache.put_many(1, 840, 980, {'2007-01-11': []})
+        self.assertEqual(
+            list(self.cache.get_many(1, 840, 980, ['2007-01-09', '2007-01-10'])),
+            ['2007-01-09'],
+        )
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_today_expires(self):
+        today = date.today().isoformat()
+        self.cache.put_many(1, 840, 980, {today: [], '2007-01-09': []})
+        with mock.patch('time.monotonic', return_value=float('inf')):
+            self.assertEqual(
+                list(self.cache.get_many(1, 840, 980, [today, '2007-01-09'])),
+                ['2007-01-09'],
+            )
+
+
+class TestSharedCache(unittest.TestCase):
+    def test_shared_between_instances(self):
+        cache = ratecache.RateCache()
+        params = ('NBU-json', ('2015-01-12', '2015-01-13'), 'USD', 'UAH')
+        e1 = OfflineParse(*params, cache=cache)
+        e2 = OfflineParse(*params, cache=cache)
+        self.assertEqual(e1.get_exch_rate(), e2.get_exch_rate())
+        self.assertEqual((len(e1.requested), len(e2.requested)), (2, 0))
+        self.assertEqual(cache.hits, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+'''Test columnar rate series'''
+
+import sys
+import unittest
+
+from exchrate import ratecache
+from exchrate.rateseries import RateSeries
+
+from .offline import OfflineParse
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+rows = [
+    (1, '2015-01-13', 980, 840, 5.1),
+    (1, '2015-01-12', 980, 840, 5.05),
+    (1, '2015-01-13', 980, 978, 6.6),
+]
+
+
+class TestRateSeries(unittest.TestCase):
+    def setUp(self):
+        self.series = RateSeries.from_rows(rows)
+
+    def test_rows_roundtrip(self):
+        self.assertEqual(self.series.to_rows(), sorted(rows, key=lambda r: r[1]))
+        self.assertEqual(list(self.series), self.series.to_rows())
+
+    def test_indexing(self):
+        self.assertEqual(self.series[0], rows[1])
+        self.assertEqual(self.series[-1], rows[2])
+        self.assertEqual(self.series[1:].to_rows(), [rows[0], rows[2]])
+
+    def test_lookup(self):
+        self.assertEqual(len(self.series.find('2015-01-13')), 2)
+        self.assertEqual(len(self.series.find('2015-01-14')), 0)
+        self.assertEqual(self.series.get_rate('2015-01-13', 978), 6.6)
+        self.assertEqual(self.series.get_rate('2015-01-13'), 5.1)
+        self.assertIsNone(self.series.get_rate('2015-01-14'))
+        self.assertEqual(len(self.series.between('2015-01-01', '2015-01-12')), 1)
+
+    def test_compact(self):
+        self.assertEqual(self.series.nbytes, 18 * len(rows))
+        self.assertLess(self.series.nbytes, sum(sys.getsizeof(r) for r in rows))
+
+    def test_unknown_currency(self):
+        series = RateSeries.from_rows([(2, '2016-12-01', -1, 978, 1.0)])
+        self.assertEqual(series.to_rows(), [(2, '2016-12-01', -1, 978, 1.0)])
+
+    def test_unequal_columns(self):
+        self.assertRaises(ValueError, RateSeries, [1], [1], [1], [1], [])
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_to_numpy(self):
+        columns = self.series.to_numpy()
+        self.assertEqual(columns['exrate'].tolist(), [5.05, 5.1, 6.6])
+        self.assertEqual(str(columns['exdate'][0]), '2015-01-12')
+        self.assertEqual(columns['basecur'].dtype, numpy.int16)
+
+
+class TestSeriesResult(unittest.TestCase):
+    def test_get_exch_rate_as_series(self):
+        e = OfflineParse(
+            'NBU-json',
+            ('2015-01-12', '2015-01-15'),
+            'USD',
+            'UAH',
+            cache=ratecache.RateCache(),
+        )
+        series = e.get_exch_rate(as_series=True)
+        self.assertIsInstance(series, RateSeries)
+        self.assertEqual(series.to_rows(), e.get_exch_rate())
+
+
+if __name__ == '__main__':
+    unittest.main()
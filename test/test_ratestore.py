@@ -0,0 +1,189 @@
+'''Test rate store and store aware exchange rate parsing'''
+
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from exchrate import ratestore
+
+from .offline import OfflineParse
+
+
+class TestSQLiteRateStore(unittest.TestCase):
+    def setUp(self):
+        self.store = ratestore.SQLiteRateStore()
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_roundtrip(self):
+        rows = {'2007-01-09': [(1, '2007-01-09', 980, 840, 5.05)], '2007-01-10': []}
+        self.store.put_many(1, 840, 980, rows)
+        self.assertEqual(
+            self.store.get_many(
+                1, 840, 980, ['2007-01-09', '2007-01-10', '2007-01-11']
+            ),
+            rows,
+        )
+
+    def test_rows_of_other_date(self):
+        # Fixer answers weekend with rates of Friday
+        rows = {'2016-12-03': [(2, '2016-12-02', 840, 978, 1.0588)]}
+        self.store.put_many(2, 978, 840, rows)
+        self.assertEqual(
+            self.store.get_many(2, 978, 840, ['2016-12-02', '2016-12-03']), rows
+        )
+
+    def test_other_key(self):
+        self.store.put_many(1, 840, 980, {'2007-01-09': []})
+        self.assertEqual(self.store.get_many(1, 978, 980, ['2007-01-09']), {})
+
+    def test_today_not_fetched(self):
+        today = date.today().isoformat()
+        self.store.put_many(1, 840, 980, {today: [(1, today, 980, 840, 5.05)]})
+        self.assertEqual(self.store.get_many(1, 840, 980, [today]), {})
+
+
+class TestMmapRateStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'rates.bin')
+        self.store = ratestore.MmapRateStore(self.path, max_tail=4)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_roundtrip(self):
+        rows = {
+            '2007-01-09': [(1, '2007-01-09', 980, 840, 5.05)],
+            '2007-01-10': [],
+            '2007-01-11': [(1, '2007-01-11', 980, -1, 1.5)],
+        }
+        self.store.put_many(1, 840, 980, rows)
+        self.assertEqual(self.store.get_many(1, 840, 980, [*rows, '2007-01-12']), rows)
+        self.assertEqual(self.store.get_many(1, 978, 980, ['2007-01-09']), {})
+
+    def test_rows_of_other_date(self):
+        rows = {
+            '2016-12-03': [(2, '2016-12-02', 840, 978, 1.0588)],
+            '2016-12-04': [(2, '2016-12-02', 840, 978, 1.0588)],
+        }
+        self.store.put_many(2, 978, 840, rows)
+        self.store.compact()
+        self.assertEqual(self.store.get_many(2, 978, 840, ['2016-12-02', *rows]), rows)
+
+    def test_today_not_fetched(self):
+        today = date.today().isoformat()
+        self.store.put_many(1, 840, 980, {today: [(1, today, 980, 840, 5.05)]})
+        self.assertEqual(self.store.get_many(1, 840, 980, [today]), {})
+        self.assertEqual(os.path.getsize(self.path), 16)
+
+    def test_compaction_and_shared_file(self):
+        reader = ratestore.MmapRateStore(self.path)
+        self.addCleanup(reader.close)
+        self.assertEqual(reader.get_many(1, 840, 980, ['2007-01-09']), {})
+
+        for day in range(1, 7):
+            d = '2007-01-{:02}'.format(day)
+            self.store.put_many(1, 840, 980, {d: [(1, d, 980, 840, float(day))]})
+        # tail over max_tail is merged into sorted segment
+        self.assertEqual(self.store._tail_count(), 0)
+        self.assertEqual(self.store._sorted, 12)
+
+        # rows replaced after compaction are found in tail
+        self.store.put_many(
+            1, 840, 980, {'2007-01-02': [(1, '2007-01-02', 980, 840, 9.0)]}
+        )
+        self.assertEqual(self.store._tail_count(), 2)
+
+        # other instance maps replaced and extended file again
+        stored = reader.get_many(1, 840, 980, ['2007-01-01', '2007-01-02'])
+        self.assertEqual(stored['2007-01-01'], [(1, '2007-01-01', 980, 840, 1.0)])
+        self.assertEqual(stored['2007-01-02'], [(1, '2007-01-02', 980, 840, 9.0)])
+
+        self.store.compact()
+        self.assertEqual(self.store._sorted, 12)
+        self.assertEqual(
+            reader.get_many(1, 840, 980, ['2007-01-02'])['2007-01-02'][0][4], 9.0
+        )
+
+    def test_partial_append_not_fetched(self):
+        rows = [(1, '2007-01-09', 980, 840, 5.05), (1, '2007-01-09', 980, 978, 6.0)]
+        self.store.put_many(1, 840, 980, {'2007-01-09': rows})
+        # append interrupted before fetched marker
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - self.store._RECORD.size)
+        reader = ratestore.MmapRateStore(self.path)
+        self.addCleanup(reader.close)
+        self.assertEqual(reader.get_many(1, 840, 980, ['2007-01-09']), {})
+
+    def test_not_store_file(self):
+        path = os.path.join(self.tmpdir.name, 'other.bin')
+        with open(path, 'wb') as f:
+            f.write(b'x' * 16)
+        store = ratestore.MmapRateStore(path)
+        with self.assertRaises(ValueError):
+            store.get_many(1, 840, 980, ['2007-01-09'])
+
+
+class TestStoredParse(unittest.TestCase):
+    def test_only_missing_dates_requested(self):
+        store = ratestore.SQLiteRateStore()
+        e = OfflineParse(
+            'NBU-json',
+            ('2015-01-12', '2015-01-13'),
+            'USD',
+            'UAH',
+            store=store,
+            cache=False,
+        )
+        first = e.get_exch_rate()
+        self.assertEqual(len(e.requested), 2)
+
+        e = OfflineParse(
+            'NBU-json',
+            ('2015-01-11', '2015-01-14'),
+            'USD',
+            'UAH',
+            store=store,
+            cache=False,
+        )
+        second = e.get_exch_rate()
+        self.assertEqual(
+            [url.split('date=')[1][:8] for url in e.requested], ['20150111', '20150114']
+        )
+        self.assertEqual(second[1:3], first)
+        self.assertEqual(
+            [r.exdate for r in second],
+            ['2015-01-11', '2015-01-12', '2015-01-13', '2015-01-14'],
+        )
+
+    def test_mmap_store(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = ratestore.MmapRateStore(os.path.join(tmpdir, 'rates.bin'))
+            e = OfflineParse(
+                'NBU-json',
+                ('2015-01-12', '2015-01-13'),
+                'USD',
+                'UAH',
+                store=store,
+                cache=False,
+            )
+            first = e.get_exch_rate()
+            e = OfflineParse(
+                'NBU-json',
+                ('2015-01-12', '2015-01-13'),
+                'USD',
+                'UAH',
+                store=store,
+                cache=False,
+            )
+            self.assertEqual(e.get_exch_rate(), first)
+            self.assertEqual(e.requested, [])
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
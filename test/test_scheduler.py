@@ -0,0 +1,92 @@
+'''Test adaptive request scheduler'''
+
+import asyncio
+import unittest
+
+import httpx
+
+from exchrate.scheduler import RequestScheduler
+
+from .offline import OfflineClient, OfflineParse, nbu_handler
+
+params = ('NBU-json', ('2015-01-12', '2015-01-15'), 'USD', 'UAH')
+
+
+class TestRequestScheduler(unittest.TestCase):
+    def request(self, scheduler, statuses, deadline=None):
+        '''runs scheduler request against responses with statuses'''
+        statuses = iter(statuses)
+
+        async def get(url, timeout):
+            status = next(statuses)
+            if status is None:
+                raise httpx.ConnectError('refused')
+            return httpx.Response(status)
+
+        async def main():
+            loop_deadline = None
+            if deadline is not None:
+                loop_deadline = asyncio.get_running_loop().time() + deadline
+            return await scheduler.request(get, 'https://bank.gov.ua/', loop_deadline)
+
+        return asyncio.run(main())
+
+    def test_retry_until_success(self):
+        scheduler = RequestScheduler(4, retries=3, backoff=0.001)
+        response = self.request(scheduler, [503, None, 429, 200])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((scheduler.requests, scheduler.retried), (4, 3))
+
+    def test_retries_exhausted(self):
+        scheduler = RequestScheduler(4, retries=2, backoff=0.001)
+        self.assertEqual(self.request(scheduler, [500] * 3).status_code, 500)
+        self.assertEqual(scheduler.failed, 1)
+        self.assertIsNone(self.request(scheduler, [None] * 3))
+
+    def test_not_retried(self):
+        scheduler = RequestScheduler(4, backoff=0.001)
+        self.assertEqual(self.request(scheduler, [404]).status_code, 404)
+        self.assertEqual(scheduler.retried, 0)
+
+    def test_deadline(self):
+        scheduler = RequestScheduler(4, retries=10, backoff=1)
+        self.assertEqual(self.request(scheduler, [503] * 10, 0.01).status_code, 503)
+        self.assertEqual(scheduler.requests, 1)
+
+    def test_adaptive_limit(self):
+        scheduler = RequestScheduler(8, max_limit=10, retries=0)
+        self.request(scheduler, [429])
+        self.assertEqual(scheduler.limit, 4)
+        for _ in range(40):
+            self.request(scheduler, [200])
+        self.assertGreater(scheduler.limit, 8)
+        self.assertLessEqual(scheduler.limit, 10)
+
+
+class TestFailedDates(unittest.TestCase):
+    def test_failed_dates_reported(self):
+        attempts = {}
+
+        def handler(request):
+            url = str(request.url)
+            attempts[url] = attempts.get(url, 0) + 1
+            if '20150113' in url or ('20150114' in url and attempts[url] < 2):
+                return httpx.Response(503)
+            return nbu_handler(request)
+
+        client = OfflineClient(handler, backoff=0.001, retries=2)
+        e = OfflineParse(*params, client=client, cache=False)
+        rates = e.get_exch_rate()
+        self.assertEqual(
+            [r.exdate for r in rates], ['2015-01-12', '2015-01-14', '2015-01-15']
+        )
+        self.assertEqual(e._last_failed, ['2015-01-13'])
+        self.assertEqual(len(client.requested), 7)
+
+        list(e.iter_exch_rate())
+        self.assertEqual(e._last_failed, ['2015-01-13'])
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+'''Test rate serving HTTP service'''
+
+import asyncio
+import json
+import unittest
+
+import httpx
+
+from exchrate.server import RateIndex, RateServer
+
+from .offline import OfflineClient
+
+
+class TestRateServer(unittest.TestCase):
+    def setUp(self):
+        self.client = OfflineClient()
+        self.server = RateServer(port=0, client=self.client, cache=False)
+
+    def tearDown(self):
+        self.client.close()
+
+    def handle(self, *args):
+        return asyncio.run(self.server.handle(*args))
+
+    def test_rates(self):
+        status, result = self.handle('GET', '/rates?base=USD&date=2015-01-12')
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            result,
+            {
+                'source': 'NBU-json',
+                'base': 'USD',
+                'local': 'UAH',
+                'rates': {'2015-01-12': 5.05},
+                'missing': [],
+            },
+        )
+
+    def test_range_and_convert(self):
+        status, result = self.handle(
+            'GET', '/convert?base=EUR&from=2015-01-12&to=2015-01-14&amount=10'
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(len(result['rates']), 3)
+        self.assertAlmostEqual(result['converted']['2015-01-13'], 66.0742)
+
+    def test_bulk_queries_are_batched(self):
+        queries = [{'base': 'USD', 'date': '2015-01-{:02}'.format(d)} for d in (1, 2)]
+        queries.append({'base': 'USD', 'from': '2015-01-01', 'to': '2015-01-03'})
+        status, results = self.handle('POST', '/rates', json.dumps(queries))
+        self.assertEqual(status, 200)
+        self.assertEqual([len(r['rates']) for r in results], [1, 1, 3])
+        # 3 distinct dates in single batch
+        self.assertEqual(len(self.client.requested), 3)
+        self.assertEqual(self.server.index.batches, 1)
+
+        # dates are answered from index afterwards
+        self.handle('POST', '/rates', json.dumps(queries))
+        self.assertEqual(len(self.client.requested), 3)
+        self.assertEqual(self.handle('GET', '/stats')[1]['rates'], 3)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.handle('GET', '/rates?date=2015-01-12')[0], 400)
+        self.assertEqual(self.handle('GET', '/rates?base=USD&date=x')[0], 400)
+        self.assertEqual(
+            self.handle('GET', '/rates?source=X&base=USD&date=2015-01-12')[0], 400
+        )
+        self.assertEqual(self.handle('POST', '/rates', '{}')[0], 400)
+        self.assertEqual(self.handle('POST', '/rates', '[1]')[0], 400)
+        # range is rejected by its endpoints, without expanding it
+        self.assertEqual(
+            self.handle('GET', '/rates?base=USD&from=0001-01-01&to=9999-12-31')[0],
+            400,
+        )
+        self.assertEqual(self.handle('DELETE', '/rates')[0], 405)
+        self.assertEqual(self.handle('GET', '/unknown')[0], 404)
+
+    def test_upstream_error(self):
+        self.client.close()
+        self.client = OfflineClient(
+            lambda request: httpx.Response(200, text='<html>maintenance</html>')
+        )
+        self.server = RateServer(port=0, client=self.client, cache=False)
+        status, result = self.handle('GET', '/rates?base=USD&date=2015-01-12')
+        self.assertEqual(status, 502)
+        self.assertIn('NBU-json', result['error'])
+        # failed date is not indexed
+        self.assertEqual(len(self.server.index), 0)
+
+    def test_http_keep_alive(self):
+        async def main():
+            server = await self.server.start()
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            bodies = []
+            for _ in range(2):
+                writer.write(b'GET /rates?base=USD&date=2015-01-12 HTTP/1.1\r\n\r\n')
+                head = await reader.readuntil(b'\r\n\r\n')
+                self.assertTrue(head.startswith(b'HTTP/1.1 200 OK'))
+                length = int(head.split(b'Content-Length: ')[1].split(b'\r\n')[0])
+                bodies.append(json.loads(await reader.readexactly(length)))
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return bodies
+
+        bodies = asyncio.run(main())
+        self.assertEqual(bodies[0], bodies[1])
+        self.assertEqual(bodies[0]['rates'], {'2015-01-12': 5.05})
+
+
+class TestRateIndex(unittest.TestCase):
+    def test_concurrent_misses_share_fetch(self):
+        client = OfflineClient()
+        index = RateIndex(client=client, cache=False)
+
+        async def main():
+            return await asyncio.gather(
+                *(
+                    index.get_rates('NBU-json', 'USD', 'UAH', ['2015-01-12'])
+                    for _ in range(10)
+                )
+            )
+
+        results = asyncio.run(main())
+        client.close()
+        self.assertEqual(results, [{'2015-01-12': 5.05}] * 10)
+        self.assertEqual(len(client.requested), 1)
+        self.assertEqual((index.misses, index.batches), (10, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()